@@ -1,3 +1,44 @@
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+# Fitted TF-IDF vectorizer (see backend/app/services/fit_tf_idf_vectorizer.py)
+TFIDF_VECTORIZER_PATH = PROJECT_ROOT / "tfidf_vectorizer.pkl"
+
+# Directory for fitted pipeline models (UMAP reducer, HDBSCAN clusterer)
+ARTIFACTS_DIR = PROJECT_ROOT / "artifacts"
+UMAP_MODEL_PATH = ARTIFACTS_DIR / "umap_reducer.pkl"
+HDBSCAN_MODEL_PATH = ARTIFACTS_DIR / "hdbscan_clusterer.pkl"
+# Compact export of the fitted TF-IDF vectorizer (sorted terms + idf .npy), preferred over the pickle
+TFIDF_ARTIFACT_DIR = ARTIFACTS_DIR / "tfidf"
+CLUSTER_KEYWORDS_CACHE_DIR = ARTIFACTS_DIR / "cluster_keywords"
+# Versioned .npy embedding snapshots shared by pipeline steps and evaluators
+SNAPSHOTS_DIR = ARTIFACTS_DIR / "snapshots"
+# Versions kept per snapshot name; older ones are deleted when a new version is saved
+SNAPSHOT_KEEP_VERSIONS = 3
+
+# Parsed resume text keyed by the SHA-256 of the uploaded file
+PARSED_RESUME_CACHE_DIR = ARTIFACTS_DIR / "parsed_resumes"
+# The cache holds personal data: entries expire after this many days, and only the newest N are kept
+PARSED_RESUME_CACHE_MAX_AGE_DAYS = 30
+PARSED_RESUME_CACHE_MAX_FILES = 1000
+# Below this many non-whitespace characters, local PDF/DOCX text is treated as unusable and LlamaParse is used
+MIN_LOCAL_TEXT_CHARS = 200
+# Worker processes for /api/resumes/parse (per API worker) and the largest accepted upload
+RESUME_PARSE_WORKERS = 2
+MAX_RESUME_BYTES = 10 * 1024 * 1024
+
+# Prebuilt PhraseMatcher + skill metadata, one subdirectory per skills table hash
+SKILL_MATCHER_DIR = ARTIFACTS_DIR / "skill_matcher"
+# How often the API checks the skills table for changes and rebuilds the skills registry
+SKILLS_REFRESH_SECONDS = 300
+
+# Memory budget of the per-cluster posting embedding cache used by downstream ranking (per API worker)
+CLUSTER_BLOCK_CACHE_MB = 512
+
+# Skill extractor used by keyword_feedback.extract_skills: "phrase_matcher" (spaCy) or "automaton"
+SKILL_EXTRACTOR = "phrase_matcher"
+
 # SBERT Model for generating job embeddings (clustering)
 EMBEDDING_MODEL = "all-minilm-l6-v2"   
 
@@ -17,9 +58,76 @@ HDBSCAN_PARAMS = {
     "min_samples": 10,
     "metric": "euclidean",
     "cluster_selection_method": "eom",
+    "prediction_data": True,  # Required for approximate_predict on new postings
+    "algorithm": "boruvka_kdtree",
+    "core_dist_n_jobs": -1,  # Use all cores for core distance computation
+}
+
+# For nearest-neighbor reassignment of HDBSCAN outliers
+KNN_PARAMS = {
+    "algorithm": "kd_tree",
+    "n_jobs": -1,
+}
+
+# Grid for the UMAP/HDBSCAN hyperparameter sweep (backend/evaluators/hyperparameter_sweep.py)
+# Values override UMAP_PARAMS / HDBSCAN_PARAMS; every HDBSCAN setting is run on every UMAP output
+SWEEP_GRID = {
+    "umap": {
+        "n_neighbors": [15, 30],
+        "min_dist": [0.0, 0.1],
+        "n_components": [10, 15],
+    },
+    "hdbscan": {
+        "min_cluster_size": [30, 60, 120],
+        "min_samples": [5, 10],
+    },
+}
+SWEEP_DIR = ARTIFACTS_DIR / "sweep"
+
+# Rate limits for cluster description generation, applied to each Gemini API key
+LLM_RATE_LIMITS = {
+    "requests_per_minute": 10,
+    "max_concurrency_per_key": 2,
+    "cooldown_seconds": 60,  # Pause a key after a 429 RESOURCE_EXHAUSTED response
+    "max_retries": 3,  # Attempts per cluster before giving up
 }
 
-from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+# Copy of sklearn's ENGLISH_STOP_WORDS, so importing config (and loading the compact TF-IDF artifact) doesn't import sklearn
+ENGLISH_STOP_WORDS = frozenset({
+    "a", "about", "above", "across", "after", "afterwards", "again", "against", "all", "almost",
+    "alone", "along", "already", "also", "although", "always", "am", "among", "amongst",
+    "amoungst", "amount", "an", "and", "another", "any", "anyhow", "anyone", "anything",
+    "anyway", "anywhere", "are", "around", "as", "at", "back", "be", "became", "because",
+    "become", "becomes", "becoming", "been", "before", "beforehand", "behind", "being", "below",
+    "beside", "besides", "between", "beyond", "bill", "both", "bottom", "but", "by", "call",
+    "can", "cannot", "cant", "co", "con", "could", "couldnt", "cry", "de", "describe", "detail",
+    "do", "done", "down", "due", "during", "each", "eg", "eight", "either", "eleven", "else",
+    "elsewhere", "empty", "enough", "etc", "even", "ever", "every", "everyone", "everything",
+    "everywhere", "except", "few", "fifteen", "fifty", "fill", "find", "fire", "first", "five",
+    "for", "former", "formerly", "forty", "found", "four", "from", "front", "full", "further",
+    "get", "give", "go", "had", "has", "hasnt", "have", "he", "hence", "her", "here",
+    "hereafter", "hereby", "herein", "hereupon", "hers", "herself", "him", "himself", "his",
+    "how", "however", "hundred", "i", "ie", "if", "in", "inc", "indeed", "interest", "into",
+    "is", "it", "its", "itself", "keep", "last", "latter", "latterly", "least", "less", "ltd",
+    "made", "many", "may", "me", "meanwhile", "might", "mill", "mine", "more", "moreover",
+    "most", "mostly", "move", "much", "must", "my", "myself", "name", "namely", "neither",
+    "never", "nevertheless", "next", "nine", "no", "nobody", "none", "noone", "nor", "not",
+    "nothing", "now", "nowhere", "of", "off", "often", "on", "once", "one", "only", "onto",
+    "or", "other", "others", "otherwise", "our", "ours", "ourselves", "out", "over", "own",
+    "part", "per", "perhaps", "please", "put", "rather", "re", "same", "see", "seem", "seemed",
+    "seeming", "seems", "serious", "several", "she", "should", "show", "side", "since",
+    "sincere", "six", "sixty", "so", "some", "somehow", "someone", "something", "sometime",
+    "sometimes", "somewhere", "still", "such", "system", "take", "ten", "than", "that", "the",
+    "their", "them", "themselves", "then", "thence", "there", "thereafter", "thereby",
+    "therefore", "therein", "thereupon", "these", "they", "thick", "thin", "third", "this",
+    "those", "though", "three", "through", "throughout", "thru", "thus", "to", "together",
+    "too", "top", "toward", "towards", "twelve", "twenty", "two", "un", "under", "until", "up",
+    "upon", "us", "very", "via", "was", "we", "well", "were", "what", "whatever", "when",
+    "whence", "whenever", "where", "whereafter", "whereas", "whereby", "wherein", "whereupon",
+    "wherever", "whether", "which", "while", "whither", "who", "whoever", "whole", "whom",
+    "whose", "why", "will", "with", "within", "without", "would", "yet", "you", "your", "yours",
+    "yourself", "yourselves"
+})
 # Define custom stopwords for TF-IDF vectorizer
 CUSTOM_STOPWORDS = ENGLISH_STOP_WORDS | {
     "new", "work", "working", "using", "use", "used",
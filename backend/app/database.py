@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
+from backend.app.services.metrics import instrument_engine
 
 load_dotenv()
 
@@ -18,6 +19,7 @@ def init_db():
         raise RuntimeError("DATABASE_URL is missing")
 
     engine = create_engine(db_url)
+    instrument_engine(engine)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Initialize immediately on import so get_db works before lifespan runs
@@ -1,20 +1,50 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, HTTPException, Depends
+from multiprocessing import get_context
+from pathlib import Path
+from fastapi import FastAPI, HTTPException, Depends, UploadFile
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Annotated, Optional, Dict, Any
-from backend.app import models
-from backend.app.database import init_db, SessionLocal, engine
+from typing import List, Annotated, Optional, Dict, Any, Literal
+from backend.app import models, database
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from backend.app.matcher.hybrid_matcher import hybrid_match, downstream_match
+from backend.app.matcher.cluster_blocks import facet_values
 from backend.app.services.sbert_embedder import get_sbert_service
 from backend.app.services.tf_idf_embedder import load_vectorizer
+from backend.app.services.metrics import span, render_prometheus
+from backend.app.services.file_reader import LOCAL_EXTRACTORS, file_hash, cached_resume_text, parse_resume_bytes, prune_cache
+from backend.app.config import RESUME_PARSE_WORKERS, MAX_RESUME_BYTES
+
+def preload_models():
+    """
+    Load the read-only models once. The gunicorn config calls this in the master before
+    forking so workers share the pages copy-on-write; in each worker it is then a no-op.
+    """
+    get_sbert_service()    # loads SBERT model into memory once
+    load_vectorizer()      # memory-maps the compact TF-IDF artifact once
+    # Load spacy models and skill extractor
+    from backend.app.matcher.keyword_feedback import init_skill_matcher
+    db_session = database.SessionLocal()
+    try:
+        # Loads the prebuilt skills map and PhraseMatcher, rebuilding only if the skills table changed
+        init_skill_matcher(db_session, models)
+    finally:
+        db_session.close()
+
+def new_parse_pool() -> ProcessPoolExecutor:
+    # Spawned rather than forked: the API process already has model, torch and DB threads running.
+    return ProcessPoolExecutor(max_workers=RESUME_PARSE_WORKERS, mp_context=get_context("spawn"))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- Startup Logic ---
-
-    init_db()
+    # The engine and SessionLocal were created when backend.app.database was imported; re-creating them
+    # here would leave get_db and /api/metrics on different engines
 
     # from backend.app.database import engine
 
@@ -35,23 +65,35 @@ async def lifespan(app: FastAPI):
     #         connection.execute(text(f"ALTER TABLE {table} ENABLE ROW LEVEL SECURITY;"))
     #     connection.commit()
 
-    # Load heavy objects once at startup
-    get_sbert_service()    # loads SBERT model into memory once
-    load_vectorizer()      # loads .pkl into memory once
-    # Load spacy models and skill extractor
-    from backend.app.matcher.keyword_feedback import get_phrase_matcher, get_skills_map
-    skills_map = get_skills_map(SessionLocal(), models)  # loads skills from DB into memory once
-    get_phrase_matcher(skills_map)  # initializes the PhraseMatcher and skill extractor
+    # Load heavy objects once at startup (already loaded, and shared, when the gunicorn master preloaded them)
+    preload_models()
+    from backend.app.matcher.keyword_feedback import skills_registry
+    # Pick up skills table changes in the background without a restart
+    skills_registry.start()
+    # Resume parsing (pdfplumber, LlamaParse) runs in its own processes so it never blocks requests.
+    app.state.parse_pool = new_parse_pool()
+    # Drop parsed resumes that expired while the API was down
+    prune_cache()
 
     yield
 
+    skills_registry.stop()
+    app.state.parse_pool.shutdown(wait=False, cancel_futures=True)
+
 app = FastAPI(lifespan=lifespan)
+# Match responses carry full descriptions and insights; compress them for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000)
 
 # Endpoint for health check
 @app.get('/api/ping')
 async def ping():
     return {'message': 'Hello from Python backend!'}
 
+# Endpoint for stage timings, model load times, cache hit rates and DB pool stats
+@app.get('/api/metrics', response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_prometheus(database.engine), media_type="text/plain; version=0.0.4")
+
 # Pydantic models for request and response validation
 class PostingBase(BaseModel):
     job_id: str
@@ -105,7 +147,7 @@ class SkillBase(BaseModel):
 
 # Dependency to get DB session
 def get_db():
-    db = SessionLocal()
+    db = database.SessionLocal()
     try:
         yield db
     finally:
@@ -118,6 +160,11 @@ db_dependency = Annotated[Session, Depends(get_db)]
 async def get_job_postings(db: db_dependency):
     postings = db.query(models.JobPosting).all()
     return postings
+
+# Endpoint listing the values downstream matching can filter on
+@app.get('/api/postings/facets')
+async def get_posting_facets(db: db_dependency):
+    return facet_values(db, models)
     
 # Endpoint to retrieve all job embeddings
 @app.get('/api/embeddings/', response_model=List[SBERTEmbeddingBase])
@@ -148,18 +195,68 @@ async def create_reduced_embedding(ReducedEmbedding: ReducedEmbeddingBase, db: d
     db.refresh(db_reduced_embedding)
     return db_reduced_embedding
 
+# Endpoint to parse an uploaded resume; returns its hash, which the match endpoints accept in place of the text
+@app.post("/api/resumes/parse")
+async def parse_resume_endpoint(file: UploadFile):
+    suffix = Path(file.filename or "").suffix.lower()
+    if suffix not in LOCAL_EXTRACTORS:
+        raise HTTPException(status_code=415, detail="Only PDF and DOCX resumes are supported.")
+    data = await file.read(MAX_RESUME_BYTES + 1)
+    if len(data) > MAX_RESUME_BYTES:
+        raise HTTPException(status_code=413, detail=f"Resume is larger than {MAX_RESUME_BYTES // (1024 * 1024)} MB.")
+
+    with span("resume_parse"):
+        # Already parsed: answer without shipping the file to a worker
+        resume_hash = file_hash(data)
+        resume_text = cached_resume_text(resume_hash)
+        if resume_text is None:
+            loop = asyncio.get_running_loop()
+            pool = app.state.parse_pool
+            try:
+                resume_hash, resume_text = await loop.run_in_executor(pool, parse_resume_bytes, data, file.filename)
+            except BrokenProcessPool:
+                # A parser process died (e.g. OOM on a malformed PDF) and the pool refuses all further work;
+                # replace it once, unless a concurrent request already did
+                if app.state.parse_pool is pool:
+                    app.state.parse_pool = new_parse_pool()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                raise HTTPException(status_code=503, detail="The resume parser crashed; please try again.")
+            except Exception as e:
+                import traceback
+                traceback.print_exc()
+                raise HTTPException(status_code=500, detail=str(e))
+
+    if not resume_text.strip():
+        raise HTTPException(status_code=422, detail="No text could be extracted from the resume.")
+    return {"resume_hash": resume_hash, "resume_text": resume_text}
+
+def resolve_resume_text(resume_text: Optional[str], resume_hash: Optional[str]) -> str:
+    if resume_text:
+        return resume_text
+    if not resume_hash:
+        raise HTTPException(status_code=422, detail="Provide resume_text or resume_hash.")
+    text = cached_resume_text(resume_hash)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Unknown resume_hash; upload the resume to /api/resumes/parse first.")
+    return text
+
 class ResumeMatchRequest(BaseModel):
-    resume_text: str
+    resume_text: Optional[str] = None
+    resume_hash: Optional[str] = None
     job_desc: Optional[str] = None
     llm_model: str
+    # How TF-IDF and SBERT scores are combined: alpha-weighted min-max ("minmax") or reciprocal rank fusion ("rrf")
+    fusion: Literal["minmax", "rrf"] = "minmax"
 
 @app.post("/api/hybrid-match-resume/")
 async def hybrid_match_resume_endpoint(
     request: ResumeMatchRequest,
     db: db_dependency
 ):
+    resume_text = resolve_resume_text(request.resume_text, request.resume_hash)
     try:
-        results = hybrid_match(request.resume_text, request.job_desc, request.llm_model, db)
+        with span("hybrid_match"):
+            results = hybrid_match(resume_text, request.job_desc, request.llm_model, db, fusion=request.fusion)
         return results
     except Exception as e:
         import traceback
@@ -167,17 +264,25 @@ async def hybrid_match_resume_endpoint(
         raise HTTPException(status_code=500, detail=str(e))
 
 class DownstreamMatchRequest(BaseModel):
-    resume_text: str
+    resume_text: Optional[str] = None
+    resume_hash: Optional[str] = None
     hybrid_matches: List[Dict[str, Any]]
     llm_model: str
+    fusion: Literal["minmax", "rrf"] = "minmax"
+    # Keep only postings with one of these values (case-insensitive); None or empty means no filter
+    work_types: Optional[List[str]] = None
+    experience_levels: Optional[List[str]] = None
 
 @app.post("/api/downstream-match-resume/")
 async def downstream_match_resume(
     request: DownstreamMatchRequest,
     db: db_dependency
 ):
+    resume_text = resolve_resume_text(request.resume_text, request.resume_hash)
+    filters = {"work_type": request.work_types, "experience_level": request.experience_levels}
     try:
-        results = downstream_match(request.resume_text, request.hybrid_matches, request.llm_model, db)
+        with span("downstream_match"):
+            results = downstream_match(resume_text, request.hybrid_matches, request.llm_model, db, fusion=request.fusion, filters=filters)
         return results
     except Exception as e:
         import traceback
@@ -0,0 +1,225 @@
+"""
+In-memory LRU cache of per-cluster posting blocks for downstream ranking.
+A block holds a cluster's posting ids (ascending), their L2-normalized SBERT embeddings
+as a float32 matrix and their L2-normalized TF-IDF embeddings as a float32 CSR matrix,
+so scoring a resume against a cluster is two matrix-vector products. It also holds one
+boolean array per facet value (work type, experience level), so filters select rows
+before scoring instead of discarding scored postings afterwards.
+
+Blocks are tagged with a cluster version: (postings, sum of posting ids, sum of squared
+posting ids, max SBERT embedding id, max TF-IDF embedding id) over the postings that have
+both embeddings. The two sums fingerprint the posting set, so reassignments that keep the
+count and max id (e.g. two postings swapping clusters) still change it, as do inserts,
+deletes and re-embedding. A stale block is reloaded on next use.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+import threading
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import BigInteger, cast, func
+
+from backend.app.config import CLUSTER_BLOCK_CACHE_MB
+from backend.app.services.metrics import record_cache, span
+
+# JobPosting columns downstream ranking can filter on, by filter name
+FACET_COLUMNS = {
+    "work_type": "formatted_work_type",
+    "experience_level": "formatted_experience_level",
+}
+
+def build_facet_index(values) -> dict[str, np.ndarray]:
+    """One boolean array per distinct (lowercased) value; postings without a value match none"""
+    values = np.array([(v or "").lower() for v in values])
+    return {str(value): values == value for value in np.unique(values) if value}
+
+@dataclass
+class ClusterBlock:
+    cluster_id: int
+    version: tuple
+    posting_ids: np.ndarray
+    sbert: np.ndarray
+    tfidf: sparse.csr_matrix
+    facets: dict[str, dict[str, np.ndarray]]
+
+    @property
+    def nbytes(self) -> int:
+        facet_bytes = sum(mask.nbytes for index in self.facets.values() for mask in index.values())
+        return self.posting_ids.nbytes + self.sbert.nbytes + self.tfidf.data.nbytes + self.tfidf.indices.nbytes + self.tfidf.indptr.nbytes + facet_bytes
+
+    def filter_mask(self, filters: Optional[dict]) -> Optional[np.ndarray]:
+        """Postings matching every facet filter (any of its listed values), or None if nothing is filtered"""
+        mask = None
+        for facet, wanted in (filters or {}).items():
+            if not wanted:
+                continue
+            index = self.facets[facet]
+            facet_mask = np.zeros(len(self.posting_ids), dtype=bool)
+            for value in wanted:
+                value_mask = index.get(value.lower())
+                if value_mask is not None:
+                    facet_mask |= value_mask
+            mask = facet_mask if mask is None else mask & facet_mask
+        return mask
+
+    def select(self, filters: Optional[dict] = None):
+        """(posting ids, SBERT rows, TF-IDF rows) of the postings passing the filters"""
+        mask = self.filter_mask(filters)
+        if mask is None:
+            return self.posting_ids, self.sbert, self.tfidf
+        return self.posting_ids[mask], self.sbert[mask], self.tfidf[mask]
+
+def l2_normalize(matrix):
+    """Row-normalize a dense or CSR matrix; all-zero rows stay zero"""
+    if sparse.issparse(matrix):
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        matrix = matrix.copy()
+        matrix.data /= np.repeat(norms, np.diff(matrix.indptr)).astype(matrix.dtype)
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def _joined_query(db_session, models, *columns):
+    return (
+        db_session.query(*columns)
+        .join(models.JobEmbeddingSBERT, models.JobEmbeddingSBERT.job_posting_id == models.JobPosting.id)
+        .join(models.JobEmbeddingTFIDF, models.JobEmbeddingTFIDF.job_posting_id == models.JobPosting.id)
+    )
+
+def cluster_versions(db_session, models, cluster_ids) -> dict:
+    """Current version of each cluster that has postings with both embeddings"""
+    # bigint before squaring: posting ids are int4 and id * id would overflow
+    posting_id = cast(models.JobPosting.id, BigInteger)
+    rows = (
+        _joined_query(
+            db_session, models,
+            models.JobPosting.cluster_id,
+            func.count(models.JobPosting.id),
+            func.sum(posting_id),
+            func.sum(posting_id * posting_id),
+            func.max(models.JobEmbeddingSBERT.id),
+            func.max(models.JobEmbeddingTFIDF.id),
+        )
+        .filter(models.JobPosting.cluster_id.in_(cluster_ids))
+        .group_by(models.JobPosting.cluster_id)
+        .all()
+    )
+    return {row[0]: tuple(int(v) for v in row[1:]) for row in rows}
+
+def load_blocks(db_session, models, cluster_ids) -> list[ClusterBlock]:
+    """Load blocks for the given clusters in one query, ordered by cluster and posting id"""
+    facet_columns = [getattr(models.JobPosting, column).label(facet) for facet, column in FACET_COLUMNS.items()]
+    rows = (
+        _joined_query(
+            db_session, models,
+            models.JobPosting.cluster_id,
+            models.JobPosting.id.label("posting_id"),
+            models.JobEmbeddingSBERT.id.label("sbert_id"),
+            models.JobEmbeddingTFIDF.id.label("tfidf_id"),
+            models.JobEmbeddingSBERT.embedding.label("sbert"),
+            models.JobEmbeddingTFIDF.embedding.label("tfidf"),
+            *facet_columns,
+        )
+        .filter(models.JobPosting.cluster_id.in_(cluster_ids))
+        .order_by(models.JobPosting.cluster_id, models.JobPosting.id)
+        .all()
+    )
+
+    blocks = []
+    start = 0
+    while start < len(rows):
+        cluster_id = rows[start].cluster_id
+        end = start
+        while end < len(rows) and rows[end].cluster_id == cluster_id:
+            end += 1
+        cluster_rows = rows[start:end]
+        # Same formula as cluster_versions, computed from the rows actually loaded
+        version = (
+            len(cluster_rows),
+            sum(r.posting_id for r in cluster_rows),
+            sum(r.posting_id * r.posting_id for r in cluster_rows),
+            max(r.sbert_id for r in cluster_rows),
+            max(r.tfidf_id for r in cluster_rows),
+        )
+        blocks.append(ClusterBlock(
+            cluster_id=cluster_id,
+            version=version,
+            posting_ids=np.array([r.posting_id for r in cluster_rows], dtype=np.int64),
+            sbert=l2_normalize(np.array([r.sbert for r in cluster_rows], dtype=np.float32)),
+            tfidf=l2_normalize(sparse.csr_matrix(np.array([r.tfidf for r in cluster_rows], dtype=np.float32))),
+            facets={facet: build_facet_index([getattr(r, facet) for r in cluster_rows]) for facet in FACET_COLUMNS},
+        ))
+        start = end
+    return blocks
+
+def facet_values(db_session, models) -> dict[str, list[str]]:
+    """Distinct values of each filterable facet, for clients building filter options"""
+    return {
+        facet: sorted(
+            value for (value,) in db_session.query(getattr(models.JobPosting, column)).distinct()
+            if value
+        )
+        for facet, column in FACET_COLUMNS.items()
+    }
+
+class ClusterBlockCache:
+    """LRU of ClusterBlocks bounded by total size in bytes"""
+
+    def __init__(self, max_bytes: int = CLUSTER_BLOCK_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._blocks: OrderedDict[int, ClusterBlock] = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def _put(self, block: ClusterBlock):
+        old = self._blocks.pop(block.cluster_id, None)
+        if old is not None:
+            self._nbytes -= old.nbytes
+        self._blocks[block.cluster_id] = block
+        self._nbytes += block.nbytes
+        # Evict least recently used blocks, but always keep the one just added
+        while self._nbytes > self.max_bytes and len(self._blocks) > 1:
+            _, evicted = self._blocks.popitem(last=False)
+            self._nbytes -= evicted.nbytes
+
+    def get_blocks(self, db_session, models, cluster_ids) -> list[ClusterBlock]:
+        """Up-to-date blocks for the given clusters (clusters without embedded postings are omitted)"""
+        versions = cluster_versions(db_session, models, cluster_ids)
+
+        blocks, stale = {}, []
+        with self._lock:
+            for cluster_id, version in versions.items():
+                block = self._blocks.get(cluster_id)
+                hit = block is not None and block.version == version
+                record_cache("cluster_block", hit)
+                if hit:
+                    self._blocks.move_to_end(cluster_id)
+                    blocks[cluster_id] = block
+                else:
+                    stale.append(cluster_id)
+
+        if stale:
+            with span("cluster_block_load"):
+                loaded = load_blocks(db_session, models, stale)
+            with self._lock:
+                for block in loaded:
+                    self._put(block)
+                    blocks[block.cluster_id] = block
+
+        return [blocks[cluster_id] for cluster_id in sorted(blocks)]
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self._nbytes = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+cluster_block_cache = ClusterBlockCache()
@@ -0,0 +1,73 @@
+"""
+Vectorized fusion of TF-IDF and SBERT similarity vectors into one hybrid score.
+Scores are fused over every candidate rather than over truncated top-k lists, so a
+candidate's hybrid score does not depend on how many results each model returned.
+"""
+
+import numpy as np
+
+# Constant from the reciprocal rank fusion paper (Cormack et al., 2009)
+RRF_K = 60
+
+def align_scores(ids_a, scores_a, ids_b, scores_b):
+    """Union of two id arrays with both score arrays aligned to it (0 where a model has no score)"""
+    # Both matchers return every cluster in id order, so this is usually a no-op
+    if len(ids_a) == len(ids_b) and np.array_equal(ids_a, ids_b):
+        return np.asarray(ids_a), np.asarray(scores_a, dtype=float), np.asarray(scores_b, dtype=float)
+    ids = np.union1d(ids_a, ids_b)
+    aligned_a = np.zeros(len(ids))
+    aligned_b = np.zeros(len(ids))
+    aligned_a[np.searchsorted(ids, ids_a)] = scores_a
+    aligned_b[np.searchsorted(ids, ids_b)] = scores_b
+    return ids, aligned_a, aligned_b
+
+def minmax_normalize(scores) -> np.ndarray:
+    scores = np.asarray(scores, dtype=float)
+    if scores.size == 0:
+        return scores
+    min_val, max_val = scores.min(), scores.max()
+    if max_val == min_val:
+        return np.zeros_like(scores)
+    return (scores - min_val) / (max_val - min_val)
+
+def minmax_fusion(tfidf_scores, sbert_scores, alpha=0.75) -> np.ndarray:
+    """alpha-weighted sum of min-max normalized scores (the original hybrid score)"""
+    return alpha * minmax_normalize(sbert_scores) + (1 - alpha) * minmax_normalize(tfidf_scores)
+
+def ranks(scores) -> np.ndarray:
+    """1-based rank of each score, highest first (ties broken by position)"""
+    order = np.argsort(-np.asarray(scores, dtype=float), kind="stable")
+    result = np.empty(len(order), dtype=np.int64)
+    result[order] = np.arange(1, len(order) + 1)
+    return result
+
+def rrf_fusion(tfidf_scores, sbert_scores, alpha=0.75, k=RRF_K) -> np.ndarray:
+    """
+    Weighted reciprocal rank fusion: alpha / (k + SBERT rank) + (1 - alpha) / (k + TF-IDF rank).
+    Uses only rank order, so it is insensitive to the two models' score scales. Scaled so a
+    candidate ranked first by both models scores 1.
+    """
+    fused = alpha / (k + ranks(sbert_scores)) + (1 - alpha) / (k + ranks(tfidf_scores))
+    return fused * (k + 1)
+
+FUSION_METHODS = {
+    "minmax": minmax_fusion,
+    "rrf": rrf_fusion,
+}
+
+def fuse(tfidf_scores, sbert_scores, method="minmax", alpha=0.75) -> np.ndarray:
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unknown fusion method {method!r}, expected one of {sorted(FUSION_METHODS)}")
+    return FUSION_METHODS[method](tfidf_scores, sbert_scores, alpha=alpha)
+
+def top_k(scores, k) -> np.ndarray:
+    """Indices of the k highest scores, best first (stable, so ties keep input order)"""
+    negated = -np.asarray(scores, dtype=float)
+    if k >= len(negated):
+        return np.argsort(negated, kind="stable")
+    # Partition instead of sorting everything, then take tied boundary scores in index order
+    kth = np.partition(negated, k - 1)[k - 1]
+    above = np.flatnonzero(negated < kth)
+    ties = np.flatnonzero(negated == kth)[:k - len(above)]
+    candidates = np.sort(np.concatenate([above, ties]))
+    return candidates[np.argsort(negated[candidates], kind="stable")]
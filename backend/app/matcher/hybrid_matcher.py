@@ -1,10 +1,12 @@
 from typing import Optional, List, Dict, Any
 import json
-from backend.app.matcher.match_resume import find_top_job_matches_tfidf, find_top_job_matches_sbert, create_llm_prompt, generate_resume_insights, normalize_array, rank_jobs_within_clusters
+from backend.app.matcher.match_resume import find_top_job_matches_tfidf, find_top_job_matches_sbert, create_llm_prompt, generate_resume_insights, normalize_array, rank_jobs_within_clusters, score_clusters_tfidf, score_clusters_sbert, build_cluster_matches
+from backend.app.matcher.fusion import align_scores, fuse, top_k
 from backend.app.services.tf_idf_embedder import load_vectorizer
 from backend.app.services.sbert_embedder import get_sbert_service
 from backend.app import models
 from backend.app.services.file_reader import extract_skills
+from backend.app.services.metrics import span
 from data.scripts.preprocessor_tfidf import TFIDFPreprocessor
 from data.scripts.preprocessor_sbert import SBERTPreprocessor
 # import matplotlib.pyplot as plt
@@ -57,7 +59,39 @@ def hybrid_rank_jobs(tfidf_matches, sbert_matches, alpha=0.75):
 
     return hybrid_results
 
-def hybrid_match(resume_text: str, job_desc: Optional[str], llm_model: str, db_session):
+def hybrid_rank_all_clusters(resume_text_tfidf, resume_text_sbert, tfidf_service, sbert_service, db_session, alpha=0.75, fusion="minmax", top_n=10, model_top_n=20):
+    """
+    Score the resume against every cluster with both models and fuse the full similarity
+    vectors. Returns the TF-IDF top model_top_n, SBERT top model_top_n and hybrid top_n matches.
+    """
+    tfidf_ids, tfidf_scores = score_clusters_tfidf(tfidf_service.transform([resume_text_tfidf]).toarray(), db_session, models)
+    sbert_ids, sbert_scores = score_clusters_sbert(sbert_service.embed([resume_text_sbert]), db_session, models)
+
+    with span("hybrid_rank_jobs"):
+        cluster_ids, tfidf_aligned, sbert_aligned = align_scores(tfidf_ids, tfidf_scores, sbert_ids, sbert_scores)
+        hybrid_scores = fuse(tfidf_aligned, sbert_aligned, method=fusion, alpha=alpha)
+        top = top_k(hybrid_scores, top_n)
+
+    # Per-model lists, as returned by find_top_job_matches_tfidf / _sbert
+    tfidf_top = top_k(tfidf_scores, model_top_n)
+    top_jobs_tfidf = build_cluster_matches(tfidf_ids[tfidf_top], tfidf_scores[tfidf_top], resume_text_tfidf, db_session, models)
+    sbert_top = top_k(sbert_scores, model_top_n)
+    top_jobs_sbert = build_cluster_matches(sbert_ids[sbert_top], sbert_scores[sbert_top], resume_text_sbert, db_session, models)
+
+    hybrid_matches = build_cluster_matches(cluster_ids[top], sbert_aligned[top], resume_text_sbert, db_session, models)
+    for match, i in zip(hybrid_matches, top):
+        hybrid_score = float(hybrid_scores[i])
+        match.update({
+            "tfidf_similarity": float(tfidf_aligned[i]),
+            "sbert_similarity": float(sbert_aligned[i]),
+            "similarity": hybrid_score,
+            "hybrid_score": hybrid_score,
+            "hybrid_percent": round(hybrid_score * 100, 1)
+        })
+
+    return top_jobs_tfidf, top_jobs_sbert, hybrid_matches
+
+def hybrid_match(resume_text: str, job_desc: Optional[str], llm_model: str, db_session, fusion: str = "minmax"):
     """Match resumes to LLM-generated job descriptions using hybrid approach -- combining pre-trained SBERT model and trained TF-IDF model."""
 
     # Load embedding services
@@ -76,47 +110,60 @@ def hybrid_match(resume_text: str, job_desc: Optional[str], llm_model: str, db_s
 
     # Preprocess resume text - use skills for TF-IDF and full text for SBERT to leverage strengths of each method
     resume_skills = extract_skills(resume_text)
-    resume_text_tfidf = tfidf_prep.clean_text_tfidf(resume_skills)
-    resume_text_sbert = sbert_prep.clean_text_sbert(resume_text)
+    with span("clean_text_tfidf"):
+        resume_text_tfidf = tfidf_prep.clean_text_tfidf(resume_skills)
+    with span("clean_text_sbert"):
+        resume_text_sbert = sbert_prep.clean_text_sbert(resume_text)
 
     job_desc_tfidf = None
     job_desc_sbert = None
     # Preprocess custom job description (if provided)
     if job_desc:
         job_desc_skills = extract_skills(job_desc)
-        job_desc_tfidf = tfidf_prep.clean_text_tfidf(job_desc_skills)
-        job_desc_sbert = sbert_prep.clean_text_sbert(job_desc)
-
-    # Find matches using TF-IDF
-    top_jobs_tfidf = find_top_job_matches_tfidf(
-        resume_text_tfidf,
-        tfidf_service,
-        db_session,
-        models,
-        top_n=20,
-        job_desc_text=job_desc_tfidf
-    )
-
-    # Find matches using SBERT
-    top_jobs_sbert = find_top_job_matches_sbert(
-        resume_text_sbert,
-        sbert_service,
-        db_session,
-        models,
-        top_n=20,
-        job_desc_text=job_desc_sbert
-    )
-
-    hybrid_matches = hybrid_rank_jobs(
-        top_jobs_tfidf,
-        top_jobs_sbert
-    )
+        with span("clean_text_tfidf"):
+            job_desc_tfidf = tfidf_prep.clean_text_tfidf(job_desc_skills)
+        with span("clean_text_sbert"):
+            job_desc_sbert = sbert_prep.clean_text_sbert(job_desc)
+
+    if job_desc:
+        # Compare against the single custom job description
+        top_jobs_tfidf = find_top_job_matches_tfidf(
+            resume_text_tfidf,
+            tfidf_service,
+            db_session,
+            models,
+            top_n=20,
+            job_desc_text=job_desc_tfidf
+        )
+        top_jobs_sbert = find_top_job_matches_sbert(
+            resume_text_sbert,
+            sbert_service,
+            db_session,
+            models,
+            top_n=20,
+            job_desc_text=job_desc_sbert
+        )
+        with span("hybrid_rank_jobs"):
+            hybrid_matches = hybrid_rank_jobs(
+                top_jobs_tfidf,
+                top_jobs_sbert
+            )
+    else:
+        top_jobs_tfidf, top_jobs_sbert, hybrid_matches = hybrid_rank_all_clusters(
+            resume_text_tfidf,
+            resume_text_sbert,
+            tfidf_service,
+            sbert_service,
+            db_session,
+            fusion=fusion
+        )
 
     # Create LLM prompt
     prompt = create_llm_prompt(resume_text, top_jobs_hybrid=hybrid_matches[:10])
     # Generate insights using LLM
     try:
-        insights_text = generate_resume_insights(prompt, llm_model=llm_model)
+        with span("generate_resume_insights"):
+            insights_text = generate_resume_insights(prompt, llm_model=llm_model)
         insights = json.loads(insights_text)
     except RuntimeError as e:
         print(f"Insights unavailable: {e}")
@@ -154,8 +201,8 @@ def hybrid_match(resume_text: str, job_desc: Optional[str], llm_model: str, db_s
         "insights": insights
     }
 
-def downstream_match(resume_text: str, hybrid_matches: List[Dict[str, Any]], llm_model: str, db_session):
-    """Optional matching of resumes to job postings in database given matched cluster ids."""
+def downstream_match(resume_text: str, hybrid_matches: List[Dict[str, Any]], llm_model: str, db_session, fusion: str = "minmax", filters: Optional[Dict[str, List[str]]] = None):
+    """Optional matching of resumes to job postings in database given matched cluster ids, optionally filtered by facet (see cluster_blocks.FACET_COLUMNS)."""
 
     # Load embedding services
     try:
@@ -173,26 +220,32 @@ def downstream_match(resume_text: str, hybrid_matches: List[Dict[str, Any]], llm
 
     # Preprocess resume text - use skills for TF-IDF and full text for SBERT to leverage strengths of each method
     resume_skills = extract_skills(resume_text)
-    resume_text_tfidf = tfidf_prep.clean_text_tfidf(resume_skills)
-    resume_text_sbert = sbert_prep.clean_text_sbert(resume_text)
+    with span("clean_text_tfidf"):
+        resume_text_tfidf = tfidf_prep.clean_text_tfidf(resume_skills)
+    with span("clean_text_sbert"):
+        resume_text_sbert = sbert_prep.clean_text_sbert(resume_text)
 
     # Rank individual postings within matched clusters
-    posting_matches = rank_jobs_within_clusters(
-            resume_text=resume_text,
-            resume_text_tfidf=resume_text_tfidf,
-            resume_text_sbert=resume_text_sbert,
-            matched_clusters=hybrid_matches,
-            tfidf_service=tfidf_service,
-            sbert_service=sbert_service,
-            db_session=db_session,
-            models=models
-    )
+    with span("rank_jobs_within_clusters"):
+        posting_matches = rank_jobs_within_clusters(
+                resume_text=resume_text,
+                resume_text_tfidf=resume_text_tfidf,
+                resume_text_sbert=resume_text_sbert,
+                matched_clusters=hybrid_matches,
+                tfidf_service=tfidf_service,
+                sbert_service=sbert_service,
+                db_session=db_session,
+                models=models,
+                fusion=fusion,
+                filters=filters
+        )
     
      # Create LLM prompt
     prompt = create_llm_prompt(resume_text, top_jobs_hybrid=posting_matches)
     # Generate insights using LLM
     try:
-        insights_text = generate_resume_insights(prompt, llm_model=llm_model)
+        with span("generate_resume_insights"):
+            insights_text = generate_resume_insights(prompt, llm_model=llm_model)
         insights = json.loads(insights_text)
     except RuntimeError as e:
         print(f"Insights unavailable: {e}")
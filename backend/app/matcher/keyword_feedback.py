@@ -1,36 +1,288 @@
 from spacy.lang.en import English
 from spacy.matcher import PhraseMatcher
+from sqlalchemy import text
+from backend.app.services.metrics import timed, record_cache, record_model_load
+from backend.app.matcher.skill_automaton import SkillAutomaton, extract_batch
+from backend.app.config import SKILL_EXTRACTOR, SKILL_MATCHER_DIR, SKILLS_REFRESH_SECONDS
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
 
-SKILLS_CACHE = None
-_nlp = None
-_matcher = None
-
-def get_skills_map(db_session, models):
-    global SKILLS_CACHE
-    if SKILLS_CACHE is None:
-        skills = db_session.query(models.Skill).all()
-        SKILLS_CACHE = {
-            s.skill.lower(): {
-                "hot": (s.hot_technology or "").lower() == "yes",
-                "in_demand": (s.in_demand or "").lower() == "yes"
-            }
-            for s in skills
+def _query_skills_map(db_session, models) -> dict:
+    skills = db_session.query(models.Skill.skill, models.Skill.hot_technology, models.Skill.in_demand).all()
+    return {
+        s.skill.lower(): {
+            "hot": (s.hot_technology or "").lower() == "yes",
+            "in_demand": (s.in_demand or "").lower() == "yes"
         }
-    return SKILLS_CACHE
-
-def get_phrase_matcher(skills_map: dict) -> tuple:
-    """Build a spaCy PhraseMatcher from DB skills. Cached after first build."""
-    global _nlp, _matcher
-    if _matcher is None:
-        _nlp = English()
-        _matcher = PhraseMatcher(_nlp.vocab, attr="LOWER")
-        patterns = [_nlp.make_doc(skill) for skill in skills_map.keys()]
-        _matcher.add("SKILLS", patterns)
-    return _nlp, _matcher
+        for s in skills
+    }
+
+def _build_phrase_matcher(skills_map: dict) -> tuple:
+    nlp = English()
+    matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
+    patterns = [nlp.make_doc(skill) for skill in skills_map.keys()]
+    matcher.add("SKILLS", patterns)
+    return nlp, matcher
+
+def skills_version(db_session) -> tuple[int, int]:
+    """Cheap change check for the skills table: (row count, max id)"""
+    count, max_id = db_session.execute(text("SELECT count(*), coalesce(max(id), 0) FROM skills")).one()
+    return int(count), int(max_id)
+
+def skills_table_hash(db_session) -> str:
+    """Hash of every skill row, computed in the database so no rows are transferred"""
+    return db_session.execute(text(
+        "SELECT coalesce(md5(string_agg("
+        "id || ':' || skill || ':' || coalesce(hot_technology, '') || ':' || coalesce(in_demand, ''), "
+        "',' ORDER BY id)), 'empty') FROM skills"
+    )).scalar()
+
+def save_skill_matcher(table_hash: str, skills_map: dict, nlp, matcher, path=SKILL_MATCHER_DIR):
+    """
+    Write the pickled PhraseMatcher (which carries its own vocab) and the skill metadata
+    (skills array plus hot / in-demand flags as packed bit arrays) under path/<table_hash>.
+    The files are written to a temporary sibling directory that is renamed into place, so
+    a process loading the artifact never sees a partial one.
+    """
+    artifact_dir = path / table_hash
+    path.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f".{table_hash}.", dir=path))
+    try:
+        with open(tmp_dir / "matcher.pkl", "wb") as f:
+            pickle.dump(matcher, f)
+
+        skills = list(skills_map)
+        np.save(tmp_dir / "skills.npy", np.array(skills, dtype=str))
+        np.save(tmp_dir / "hot.npy", np.packbits([skills_map[s]["hot"] for s in skills]))
+        np.save(tmp_dir / "in_demand.npy", np.packbits([skills_map[s]["in_demand"] for s in skills]))
+        with open(tmp_dir / "meta.json", "w") as f:
+            json.dump({"table_hash": table_hash, "count": len(skills)}, f)
+
+        try:
+            os.rename(tmp_dir, artifact_dir)
+        except OSError:
+            # Another worker or the pipeline built the same hash first
+            if not skill_matcher_exists(table_hash, path):
+                raise
+            print(f"Skill matcher for skills table {table_hash} was already built by another process")
+            return
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"Saved skill matcher for {len(skills)} skills to {artifact_dir}")
+
+SKILL_MATCHER_FILES = ("matcher.pkl", "skills.npy", "hot.npy", "in_demand.npy", "meta.json")
+
+def skill_matcher_exists(table_hash: str, path=SKILL_MATCHER_DIR) -> bool:
+    """Whether a complete artifact exists for this hash, without loading it"""
+    return all((path / table_hash / name).exists() for name in SKILL_MATCHER_FILES)
+
+def load_skill_matcher(table_hash: str, path=SKILL_MATCHER_DIR):
+    """(skills_map, nlp, matcher) from a prebuilt artifact, or None if there is none for this hash"""
+    artifact_dir = path / table_hash
+    if not skill_matcher_exists(table_hash, path):
+        return None
+
+    with open(artifact_dir / "meta.json") as f:
+        count = json.load(f)["count"]
+    skills = np.load(artifact_dir / "skills.npy").tolist()
+    hot = np.unpackbits(np.load(artifact_dir / "hot.npy"), count=count).astype(bool)
+    in_demand = np.unpackbits(np.load(artifact_dir / "in_demand.npy"), count=count).astype(bool)
+    skills_map = {
+        skill: {"hot": bool(h), "in_demand": bool(d)}
+        for skill, h, d in zip(skills, hot, in_demand)
+    }
+
+    # The unpickled matcher has its own vocab (with the LOWER getters); tokenize with that same vocab
+    with open(artifact_dir / "matcher.pkl", "rb") as f:
+        matcher = pickle.load(f)
+    nlp = English(vocab=matcher.vocab)
+    return skills_map, nlp, matcher
+
+def build_skill_matcher(db_session, models, path=SKILL_MATCHER_DIR) -> str:
+    """Build and save the skill matcher artifact for the current skills table. Returns its hash."""
+    table_hash = skills_table_hash(db_session)
+    skills_map = _query_skills_map(db_session, models)
+    nlp, matcher = _build_phrase_matcher(skills_map)
+    save_skill_matcher(table_hash, skills_map, nlp, matcher, path)
+    return table_hash
+
+@dataclass
+class SkillsState:
+    """One build of the skills map and the matchers derived from it"""
+    version: Optional[tuple[int, int]]
+    skills_map: dict
+    nlp: object
+    matcher: object
+    automaton: Optional[SkillAutomaton] = field(default=None)
+
+    @classmethod
+    def from_skills_map(cls, skills_map: dict, version=None):
+        nlp, matcher = _build_phrase_matcher(skills_map)
+        return cls(version, skills_map, nlp, matcher)
+
+    def get_automaton(self) -> SkillAutomaton:
+        if self.automaton is None:
+            self.automaton = SkillAutomaton(self.skills_map.keys())
+        return self.automaton
+
+class SkillsRegistry:
+    """
+    Holds the current SkillsState. A background thread checks the skills table version on a
+    timer and, when it changes, builds a new state and swaps it in with a single assignment,
+    so requests always read a complete state and never wait for a rebuild.
+    """
+
+    def __init__(self, refresh_seconds: float = SKILLS_REFRESH_SECONDS, path=SKILL_MATCHER_DIR):
+        self.refresh_seconds = refresh_seconds
+        self.path = path
+        self._state: Optional[SkillsState] = None
+        # The state swapped out last, for requests still holding its skills map
+        self._previous: Optional[SkillsState] = None
+        # State built for a skills map that did not come from the registry
+        self._adhoc: Optional[SkillsState] = None
+        self._load_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> SkillsState:
+        state = self._state
+        if state is None:
+            # First use outside the API (scripts, pipeline steps): load synchronously once
+            state = self.load()
+        return state
+
+    def swap(self, state: SkillsState):
+        self._previous = self._state
+        self._state = state
+
+    def state_for(self, skills_map: Optional[dict] = None) -> SkillsState:
+        """
+        The state skills_map belongs to (the current one by default), so a caller's map and
+        the matchers it is used with always come from the same version
+        """
+        state = self.state
+        if skills_map is None or skills_map is state.skills_map:
+            return state
+        previous = self._previous
+        if previous is not None and skills_map is previous.skills_map:
+            return previous
+        adhoc = self._adhoc
+        if adhoc is None or adhoc.skills_map is not skills_map:
+            adhoc = self._adhoc = SkillsState.from_skills_map(skills_map)
+        return adhoc
+
+    def _build_state(self, db_session) -> SkillsState:
+        from backend.app import models
+        start = time.perf_counter()
+        version = skills_version(db_session)
+        # Prefer the prebuilt artifact for this exact table contents, rebuilding it if missing
+        table_hash = skills_table_hash(db_session)
+        loaded = load_skill_matcher(table_hash, self.path)
+        if loaded is None:
+            print(f"No skill matcher artifact for skills table {table_hash}, rebuilding...")
+            skills_map = _query_skills_map(db_session, models)
+            nlp, matcher = _build_phrase_matcher(skills_map)
+            save_skill_matcher(table_hash, skills_map, nlp, matcher, self.path)
+        else:
+            skills_map, nlp, matcher = loaded
+
+        state = SkillsState(version, skills_map, nlp, matcher)
+        if SKILL_EXTRACTOR == "automaton":
+            state.get_automaton()
+        record_model_load("phrase_matcher", time.perf_counter() - start)
+        return state
+
+    def _with_session(self, fn, db_session=None):
+        if db_session is not None:
+            return fn(db_session)
+        from backend.app import database
+        db_session = database.SessionLocal()
+        try:
+            return fn(db_session)
+        finally:
+            db_session.close()
+
+    def load(self, db_session=None) -> SkillsState:
+        """Build the initial state (blocking). Concurrent first callers share one build."""
+        with self._load_lock:
+            if self._state is None:
+                self.swap(self._with_session(self._build_state, db_session))
+        return self._state
+
+    def refresh(self, db_session=None) -> bool:
+        """Rebuild and swap the state if the skills table version changed. Returns whether it did."""
+        def check_and_build(session):
+            current = self._state
+            if current is not None and skills_version(session) == current.version:
+                return None
+            return self._build_state(session)
+
+        with self._load_lock:
+            state = self._with_session(check_and_build, db_session)
+            if state is None:
+                return False
+            previous = self._state
+            self.swap(state)
+        print(f"Skills registry updated: {previous.version if previous else None} -> {state.version}")
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                print("Exception refreshing skills registry:", e)
+
+    def start(self):
+        """Start the background version check (no-op if already running)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="skills-registry", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+skills_registry = SkillsRegistry()
+
+def init_skill_matcher(db_session, models=None):
+    """Load the initial skills state at startup and return its skills map"""
+    return skills_registry.load(db_session).skills_map
+
+def get_skills_map(db_session=None, models=None):
+    """Current skills map; db_session is only used if the registry has not loaded yet"""
+    state = skills_registry._state
+    record_cache("skills_map", state is not None)
+    if state is None:
+        state = skills_registry.load(db_session)
+    return state.skills_map
+
+def get_phrase_matcher(skills_map: Optional[dict] = None) -> tuple:
+    """(nlp, PhraseMatcher) of the skills state skills_map belongs to (the current one by default)"""
+    state = skills_registry.state_for(skills_map)
+    return state.nlp, state.matcher
+
+def get_skill_automaton(skills_map: Optional[dict] = None) -> SkillAutomaton:
+    """Token-level Aho-Corasick automaton of the skills state skills_map belongs to, built on first use"""
+    state = skills_registry.state_for(skills_map)
+    record_cache("skill_automaton", state.automaton is not None)
+    return state.get_automaton()
 
 def _extract_phrase_matcher(text: str, skills_map: dict) -> set[str]:
     """Use spaCy PhraseMatcher skill extraction"""
-    nlp, matcher = get_phrase_matcher(skills_map)
+    # Match and filter with one state, even if the registry swaps in a new one meanwhile
+    state = skills_registry.state_for(skills_map)
+    nlp, matcher, skills_map = state.nlp, state.matcher, state.skills_map
     doc = nlp(text.lower())
     found = set()
     for _, start, end in matcher(doc):
@@ -39,8 +291,24 @@ def _extract_phrase_matcher(text: str, skills_map: dict) -> set[str]:
             found.add(span)
     return found
 
-def extract_skills(text: str, skills_map: dict) -> set[str]:
-    return _extract_phrase_matcher(text, skills_map)
+def _extract_automaton(text: str, skills_map: dict) -> set[str]:
+    """Use token-level Aho-Corasick skill extraction"""
+    return get_skill_automaton(skills_map).extract(text, skills_map)
+
+SKILL_EXTRACTORS = {
+    "phrase_matcher": _extract_phrase_matcher,
+    "automaton": _extract_automaton,
+}
+
+@timed("extract_skills")
+def extract_skills(text: str, skills_map: dict, extractor: str = SKILL_EXTRACTOR) -> set[str]:
+    return SKILL_EXTRACTORS[extractor](text, skills_map)
+
+def extract_skills_batch(texts: list[str], skills_map: dict, extractor: str = SKILL_EXTRACTOR, n_jobs: int = 1) -> list[set[str]]:
+    """Extract skills from a bulk corpus; the automaton extractor can use n_jobs worker processes"""
+    if extractor == "automaton":
+        return extract_batch(get_skill_automaton(skills_map), texts, skills_map, n_jobs=n_jobs)
+    return [SKILL_EXTRACTORS[extractor](text or "", skills_map) for text in texts]
 
 def build_missing_skills(missing: set[str], skills_map: dict):
     enriched = []
@@ -3,6 +3,8 @@ from openai import OpenAI
 from backend.app.services.tf_idf_embedder import load_vectorizer
 from backend.app.services.sbert_embedder import get_sbert_service
 from backend.app.matcher.keyword_feedback import get_skills_map, extract_skills, build_missing_skills
+from backend.app.matcher.cluster_blocks import cluster_block_cache, l2_normalize
+from backend.app.matcher.fusion import fuse, top_k
 import json
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
@@ -26,6 +28,64 @@ def normalize_array(scores):
 
     return (scores - min_val) / (max_val - min_val)
 
+def score_clusters_tfidf(resume_vector, db_session, models):
+    """TF-IDF cosine similarity of the resume to every cluster, as (cluster row ids, similarities) in id order"""
+    rows = (
+        db_session.query(models.ClusterEmbeddingTFIDF.cluster_id, models.ClusterEmbeddingTFIDF.embedding)
+        .order_by(models.ClusterEmbeddingTFIDF.cluster_id)
+        .all()
+    )
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([])
+
+    X_jobs = np.vstack([np.array(row.embedding, dtype=float) for row in rows])
+    cluster_ids = np.array([row.cluster_id for row in rows], dtype=np.int64)
+    return cluster_ids, cosine_similarity(resume_vector, X_jobs).flatten()
+
+def score_clusters_sbert(resume_embedding, db_session, models):
+    """SBERT cosine similarity of the resume to every cluster, as (cluster row ids, similarities) in id order"""
+    rows = (
+        db_session.query(models.ClusterEmbeddingSBERT.cluster_id, models.ClusterEmbeddingSBERT.embedding)
+        .order_by(models.ClusterEmbeddingSBERT.cluster_id)
+        .all()
+    )
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([])
+
+    X_jobs = np.vstack([np.array(row.embedding, dtype=float) for row in rows])
+    cluster_ids = np.array([row.cluster_id for row in rows], dtype=np.int64)
+    return cluster_ids, cosine_similarity(resume_embedding, X_jobs).flatten()
+
+def build_cluster_matches(cluster_ids, similarities, resume_text, db_session, models):
+    """Match results (title, description, matched and missing skills) for the given clusters, in the given order"""
+    cluster_ids = [int(cid) for cid in cluster_ids]
+    clusters = db_session.query(models.Cluster).filter(models.Cluster.id.in_(cluster_ids)).all()
+    cluster_map = {c.id: c for c in clusters}
+
+    skills_map = get_skills_map(db_session, models)
+    resume_skills = extract_skills(resume_text, skills_map)
+
+    top_matches = []
+    for cid, similarity in zip(cluster_ids, similarities):
+        cluster = cluster_map[cid]
+
+        # Find top skills and missing skills
+        job_skills = extract_skills(cluster.general_job_desc_raw, skills_map)
+        top_skills = list(job_skills & resume_skills)
+        missing_skills = build_missing_skills(job_skills - resume_skills, skills_map)
+
+        top_matches.append({
+            "cluster_id": cluster.cluster_id,
+            "title": cluster.title,
+            "description": cluster.general_job_desc_raw,
+            "similarity": float(similarity),
+            "similarity_percent": round(float(similarity) * 100, 1),
+            "snippet": cluster.general_job_desc_raw[:200] + "...",
+            "top_keywords": top_skills,
+            "missing_keywords": missing_skills
+        })
+    return top_matches
+
 def find_top_job_matches_tfidf(resume_text, embedding_service, db_session, models, top_n=3, job_desc_text=None):
     # Transform resume
     resume_vector = embedding_service.transform([resume_text]).toarray()
@@ -53,49 +113,13 @@ def find_top_job_matches_tfidf(resume_text, embedding_service, db_session, model
             "missing_keywords": missing_skills
         }]
         
-    # Load all job embeddings from cluster_embeddings table
-    job_embeddings = db_session.query(models.ClusterEmbeddingTFIDF).all()
-    if not job_embeddings:
+    cluster_ids, similarities = score_clusters_tfidf(resume_vector, db_session, models)
+    if len(cluster_ids) == 0:
         return []
 
-    X_jobs = np.vstack([np.array(je.embedding, dtype=float) for je in job_embeddings])
-    cluster_ids = [je.cluster_id for je in job_embeddings]
-
-    # Compute cosine similarity
-    similarities = cosine_similarity(resume_vector, X_jobs).flatten()
-
     # Get top N matches
     top_indices = similarities.argsort()[::-1][:top_n]
-
-    top_matches = []
-    # Fetch all clusters
-    clusters = db_session.query(models.Cluster).filter(
-    models.Cluster.id.in_(cluster_ids)
-    ).all()
-
-    cluster_map = {c.id: c for c in clusters}
-
-    for idx in top_indices:
-        cluster = cluster_map[cluster_ids[idx]]
-
-        # Find top skills and missing skills
-        skills_map = get_skills_map(db_session, models)
-        job_skills = extract_skills(cluster.general_job_desc_raw, skills_map)
-        resume_skills = extract_skills(resume_text, skills_map)
-        top_skills = list(job_skills & resume_skills)
-        missing_skills = build_missing_skills(job_skills - resume_skills, skills_map)
-
-        top_matches.append({
-            "cluster_id": cluster.cluster_id,
-            "title": cluster.title,
-            "description": cluster.general_job_desc_raw,
-            "similarity": float(similarities[idx]),
-            "similarity_percent": round(similarities[idx] * 100, 1),
-            "snippet": cluster.general_job_desc_raw[:200] + "...",
-            "top_keywords": top_skills,
-            "missing_keywords": missing_skills
-        })
-    return top_matches
+    return build_cluster_matches(cluster_ids[top_indices], similarities[top_indices], resume_text, db_session, models)
 
 def find_top_job_matches_sbert(resume_text, sbert_service, db_session, models, top_n=3, job_desc_text=None):
     # Embed resume using SBERT
@@ -123,90 +147,65 @@ def find_top_job_matches_sbert(resume_text, sbert_service, db_session, models, t
             "missing_keywords": missing_skills
         }]
 
-    # Load all cluster embeddings from database
-    cluster_embeddings = db_session.query(models.ClusterEmbeddingSBERT).all()
-    if not cluster_embeddings:
+    cluster_ids, similarities = score_clusters_sbert(resume_embedding, db_session, models)
+    if len(cluster_ids) == 0:
         return []
-    
-    X_jobs = np.vstack([np.array(ce.embedding, dtype=float) for ce in cluster_embeddings])
-    cluster_ids = [ce.cluster_id for ce in cluster_embeddings]
-    
-    # Compute cosine similarity
-    similarities = cosine_similarity(resume_embedding, X_jobs).flatten()
 
     # Get top N matches
     top_indices = similarities.argsort()[::-1][:top_n]
+    return build_cluster_matches(cluster_ids[top_indices], similarities[top_indices], resume_text, db_session, models)
 
-    top_matches = []
-    for idx in top_indices:
-        cluster = db_session.query(models.Cluster).filter(models.Cluster.id == cluster_ids[idx]).first()
-
-        # Find top skills and missing skills
-        skills_map = get_skills_map(db_session, models)
-        job_skills = extract_skills(cluster.general_job_desc_raw, skills_map)
-        resume_skills = extract_skills(resume_text, skills_map)
-        top_skills = list(job_skills & resume_skills)
-        missing_skills = build_missing_skills(job_skills - resume_skills, skills_map)
-        top_matches.append({
-            "cluster_id": cluster.cluster_id,
-            "title": cluster.title,
-            "description": cluster.general_job_desc_raw,
-            "similarity": float(similarities[idx]),
-            "similarity_percent": round(similarities[idx] * 100, 1),
-            "snippet": cluster.general_job_desc_raw[:200] + "...",
-            "top_keywords": top_skills,
-            "missing_keywords": missing_skills 
-        })
-    return top_matches
-
-def rank_jobs_within_clusters(resume_text, resume_text_tfidf, resume_text_sbert, matched_clusters, tfidf_service, sbert_service, db_session, models, alpha=0.75, top_n=10):
+def rank_jobs_within_clusters(resume_text, resume_text_tfidf, resume_text_sbert, matched_clusters, tfidf_service, sbert_service, db_session, models, alpha=0.75, top_n=10, fusion="minmax", filters=None):
     """
-    Given hybrid-matched clusters, fetch individual job postings within them
-    and compute fine-grained similarity against the resume.
+    Given hybrid-matched clusters, score every job posting within them against the resume
+    and return the top_n. Scoring uses the cached cluster embedding blocks; titles, descriptions
+    and skills are fetched for the top_n postings alone. filters maps a facet ("work_type",
+    "experience_level") to accepted values; non-matching postings are dropped before scoring.
     """
     cluster_ids = [c["cluster_id"] for c in matched_clusters]
 
-    # Fetch all job postings in matched clusters
-    postings = db_session.query(models.JobPosting).filter(
-        models.JobPosting.cluster_id.in_(cluster_ids)
-    ).all()
-    posting_ids = [p.id for p in postings]
+    # Cached per-cluster blocks of posting ids and L2-normalized embeddings, reloaded only when a cluster changes
+    blocks = cluster_block_cache.get_blocks(db_session, models, cluster_ids)
+
+    # Apply facet filters first, so only matching postings are scored
+    selected = [block.select(filters) for block in blocks]
+    selected = [(ids, sbert, tfidf) for ids, sbert, tfidf in selected if len(ids)]
 
-    if not postings:
+    if not selected:
         return []
 
-    # Retrieve TF-IDF embeddings from the database
-    posting_tfidf_emb_objs = db_session.query(models.JobEmbeddingTFIDF).filter(
-        models.JobEmbeddingTFIDF.job_posting_id.in_(posting_ids)
-    ).all()
-    posting_tfidf_vecs = [p.embedding for p in posting_tfidf_emb_objs]
+    posting_ids = np.concatenate([ids for ids, _, _ in selected])
 
-    # Compute TF-IDF similarities for all postings
-    resume_tfidf_vec = tfidf_service.transform([resume_text_tfidf])
-    tfidf_scores = cosine_similarity(resume_tfidf_vec, posting_tfidf_vecs)[0]
+    # Cosine similarities are dot products with the normalized resume vectors
+    resume_tfidf_vec = l2_normalize(tfidf_service.transform([resume_text_tfidf]).astype(np.float32))
+    tfidf_scores = np.concatenate([(tfidf @ resume_tfidf_vec.T).toarray().ravel() for _, _, tfidf in selected])
 
-    # Retrieve SBERT embeddings from the database
-    posting_sbert_emb_objs = db_session.query(models.JobEmbeddingSBERT).filter(
-        models.JobEmbeddingSBERT.job_posting_id.in_(posting_ids)
-    ).all()
-    posting_sbert_vecs = [p.embedding for p in posting_sbert_emb_objs]
+    resume_sbert_vec = l2_normalize(np.array(sbert_service.embed([resume_text_sbert]), dtype=np.float32))[0]
+    sbert_scores = np.concatenate([sbert @ resume_sbert_vec for _, sbert, _ in selected])
 
-    # Compute SBERT similarities for all postings
-    resume_sbert_vec = np.array(sbert_service.embed([resume_text_sbert]))
-    sbert_scores = cosine_similarity(resume_sbert_vec, posting_sbert_vecs)[0]
+    # Fuse the two score arrays (min-max weighted by alpha, or reciprocal rank fusion)
+    hybrid_scores = fuse(tfidf_scores, sbert_scores, method=fusion, alpha=alpha)
 
-    # Normalize both score arrays to [0, 1]
-    tfidf_norm = normalize_array(tfidf_scores)
-    sbert_norm = normalize_array(sbert_scores)
-    hybrid_scores = alpha * sbert_norm + (1 - alpha) * tfidf_norm
+    # Highest scores first; stable, so ties keep cluster and posting id order
+    top = top_k(hybrid_scores, top_n)
 
-    results = []
-    for i, posting in enumerate(postings):
+    # Load text only for the selected postings
+    top_ids = posting_ids[top].tolist()
+    postings = {
+        p.id: p
+        for p in db_session.query(
+            models.JobPosting.id, models.JobPosting.cluster_id, models.JobPosting.title, models.JobPosting.desc_raw
+        ).filter(models.JobPosting.id.in_(top_ids))
+    }
 
-        # Find top skills and missing skills
-        skills_map = get_skills_map(db_session, models)
+    # Find top skills and missing skills
+    skills_map = get_skills_map(db_session, models)
+    resume_skills = extract_skills(resume_text, skills_map)
+
+    results = []
+    for i, posting_id in zip(top, top_ids):
+        posting = postings[posting_id]
         job_skills = extract_skills(posting.desc_raw, skills_map)
-        resume_skills = extract_skills(resume_text, skills_map)
         top_skills = list(job_skills & resume_skills)
         missing_skills = build_missing_skills(job_skills - resume_skills, skills_map)
 
@@ -225,8 +224,7 @@ def rank_jobs_within_clusters(resume_text, resume_text_tfidf, resume_text_sbert,
             "missing_keywords": missing_skills 
         })
 
-    results.sort(key=lambda x: x["hybrid_score"], reverse=True)
-    return results[:top_n]
+    return results
 
 def create_llm_prompt(resume_text, top_jobs_tfidf = None, top_jobs_sbert = None, top_jobs_hybrid = None):
     
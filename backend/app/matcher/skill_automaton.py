@@ -0,0 +1,106 @@
+"""
+Token-level Aho-Corasick skill extractor, an alternative to the spaCy PhraseMatcher.
+Text is split with a regex tokenizer that approximates spaCy's English tokenizer,
+then every skill token sequence is found in one pass over the tokens.
+Includes a batch API that spreads bulk corpora over worker processes.
+"""
+
+from collections import deque
+from multiprocessing import get_context
+import re
+
+# Words (keeping internal periods, a leading period and trailing +/#, e.g. node.js, .net, c++, c#) or single punctuation marks
+TOKEN_PATTERN = re.compile(r"(?:(?<!\S)\.)?\w+(?:\.\w+)*[+#]*|[^\w\s]")
+
+def tokenize(text: str) -> list[tuple[str, int, int]]:
+    """(token, start, end) for each token in already-lowercased text"""
+    return [(m.group(), m.start(), m.end()) for m in TOKEN_PATTERN.finditer(text)]
+
+class SkillAutomaton:
+    """Aho-Corasick automaton over skill token sequences"""
+
+    def __init__(self, skills):
+        self.token_ids: dict[str, int] = {}
+        self.goto: list[dict[int, int]] = [{}]
+        self.fail: list[int] = [0]
+        # Lengths (in tokens) of the skills that end at each state
+        self.outputs: list[tuple[int, ...]] = [()]
+
+        for skill in skills:
+            self._add(skill)
+        self._build_failure_links()
+
+    def _add(self, skill: str):
+        tokens = [t for t, _, _ in tokenize(skill.lower())]
+        if not tokens:
+            return
+        state = 0
+        for token in tokens:
+            token_id = self.token_ids.setdefault(token, len(self.token_ids))
+            next_state = self.goto[state].get(token_id)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][token_id] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.outputs.append(())
+            state = next_state
+        if len(tokens) not in self.outputs[state]:
+            self.outputs[state] += (len(tokens),)
+
+    def _build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token_id, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and token_id not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(token_id, 0)
+                # Inherit matches that end here via the failure link (shorter suffix skills)
+                self.outputs[next_state] += tuple(
+                    n for n in self.outputs[self.fail[next_state]] if n not in self.outputs[next_state]
+                )
+
+    def extract(self, text: str, skills_map: dict) -> set[str]:
+        """Skills from skills_map found in text, with the same span check as the PhraseMatcher extractor"""
+        text = text.lower()
+        token_ids, goto, fail, outputs = self.token_ids, self.goto, self.fail, self.outputs
+        found = set()
+        starts = []
+        state = 0
+        for match in TOKEN_PATTERN.finditer(text):
+            starts.append(match.start())
+            token_id = token_ids.get(match.group())
+            if token_id is None:
+                state = 0
+                continue
+            while state and token_id not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token_id, 0)
+            for n_tokens in outputs[state]:
+                span = text[starts[-n_tokens]:match.end()]
+                if span in skills_map:
+                    found.add(span)
+        return found
+
+# Per-worker state for extract_batch
+_worker_automaton = None
+_worker_skills_map = None
+
+def _init_worker(automaton, skills_map):
+    global _worker_automaton, _worker_skills_map
+    _worker_automaton, _worker_skills_map = automaton, skills_map
+
+def _extract_in_worker(text):
+    return _worker_automaton.extract(text or "", _worker_skills_map)
+
+def extract_batch(automaton: SkillAutomaton, texts: list[str], skills_map: dict, n_jobs: int = 1, chunksize: int = 256) -> list[set[str]]:
+    """Extract skills from many texts, in n_jobs worker processes when n_jobs > 1"""
+    if n_jobs <= 1 or len(texts) < chunksize:
+        return [automaton.extract(text or "", skills_map) for text in texts]
+
+    # The automaton is sent to each worker once, not with every chunk
+    with get_context("spawn").Pool(n_jobs, initializer=_init_worker, initargs=(automaton, skills_map)) as pool:
+        return pool.map(_extract_in_worker, texts, chunksize=chunksize)
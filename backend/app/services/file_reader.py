@@ -1,25 +1,77 @@
 """
 This module provides functions to read and extract text from PDF and DOCX files. 
-It uses pdfplumber for PDFs and python-docx for DOCX files. 
-The extracted text is returned as a single string, which can then be processed further by the application.
+It uses pdfplumber for PDFs and python-docx for DOCX files, and falls back to the
+remote LlamaParse service only when the local text looks unusable (e.g. scanned PDFs).
+Parsed text is cached by the SHA-256 of the file bytes, so a resume is never parsed twice.
+The cache holds personal data, so entries expire and only the newest ones are kept.
 """    
 
+import hashlib
+import io
+import json
 import tempfile
 import os
-import nest_asyncio
+import time
+from pathlib import Path
+from backend.app.config import (PARSED_RESUME_CACHE_DIR, PARSED_RESUME_CACHE_MAX_AGE_DAYS,
+                                PARSED_RESUME_CACHE_MAX_FILES, MIN_LOCAL_TEXT_CHARS)
 
 from dotenv import load_dotenv
 load_dotenv()
 LLAMA_API_KEY = os.getenv("LLAMA_API_KEY")
 
-nest_asyncio.apply()
+def file_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
 
-def parse_with_llama(file):
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-        tmp_file.write(file.getvalue())
+def extract_pdf_text(data: bytes) -> str:
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        return "\n\n".join(page.extract_text() or "" for page in pdf.pages)
+
+def extract_docx_text(data: bytes) -> str:
+    from docx import Document
+    document = Document(io.BytesIO(data))
+    lines = [p.text for p in document.paragraphs]
+    # Resume templates often lay out sections in tables
+    for table in document.tables:
+        for row in table.rows:
+            lines.append(" | ".join(cell.text for cell in row.cells))
+    return "\n".join(lines)
+
+LOCAL_EXTRACTORS = {
+    ".pdf": extract_pdf_text,
+    ".docx": extract_docx_text,
+}
+
+def is_usable(text: str) -> bool:
+    """Whether locally extracted text is worth keeping (scanned or font-mangled PDFs are not)"""
+    stripped = "".join(text.split())
+    if len(stripped) < MIN_LOCAL_TEXT_CHARS or "(cid:" in text:
+        return False
+    # Mostly letters and digits; garbled extractions are dominated by symbols
+    return sum(c.isalnum() for c in stripped) / len(stripped) >= 0.6
+
+def parse_locally(data: bytes, suffix: str) -> str | None:
+    extractor = LOCAL_EXTRACTORS.get(suffix)
+    if extractor is None:
+        return None
+    try:
+        text = extractor(data)
+    except Exception as e:
+        print(f"Local {suffix} parsing failed:", e)
+        return None
+    return text if is_usable(text) else None
+
+def parse_with_llama(data: bytes, file_name: str) -> str:
+    suffix = Path(file_name).suffix.lower() or ".pdf"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(data)
         tmp_file_path = tmp_file.name
 
     try:
+        # LlamaParse's sync API runs its own event loop
+        import nest_asyncio
+        nest_asyncio.apply()
         from llama_parse import LlamaParse
         parser = LlamaParse(
             api_key=LLAMA_API_KEY,
@@ -27,7 +79,7 @@ def parse_with_llama(file):
             verbose=True
         )
 
-        documents = parser.load_data(tmp_file_path, extra_info={"file_name": file.name})
+        documents = parser.load_data(tmp_file_path, extra_info={"file_name": file_name})
 
         if documents:
             file_contents = " ".join([doc.get_content() for doc in documents])
@@ -41,12 +93,78 @@ def parse_with_llama(file):
         
     return file_contents
 
+CACHE_MAX_AGE_SECONDS = PARSED_RESUME_CACHE_MAX_AGE_DAYS * 86400
+
+def _read_cache(digest: str, cache_dir: Path) -> dict | None:
+    path = cache_dir / f"{digest}.json"
+    try:
+        if time.time() - path.stat().st_mtime > CACHE_MAX_AGE_SECONDS:
+            return None
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        # Missing, or pruned by another worker between the checks
+        return None
+
+def cached_resume_text(digest: str, cache_dir: Path = PARSED_RESUME_CACHE_DIR) -> str | None:
+    """Text of a previously parsed resume by its SHA-256, or None if it was never parsed"""
+    # Only hex digests, so a client-supplied hash can't point outside the cache dir
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        return None
+    cached = _read_cache(digest, cache_dir)
+    return cached["text"] if cached is not None else None
+
+def _write_cache(digest: str, entry: dict, cache_dir: Path):
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = cache_dir / f"{digest}.json"
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(entry, f)
+    os.replace(tmp_path, path)
+    prune_cache(cache_dir)
+
+def prune_cache(cache_dir: Path = PARSED_RESUME_CACHE_DIR):
+    """Delete expired parsed resumes and all but the newest PARSED_RESUME_CACHE_MAX_FILES"""
+    now = time.time()
+    entries = []
+    for path in cache_dir.glob("*.json"):
+        try:
+            entries.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            continue
+    entries.sort(reverse=True)
+    for i, (mtime, path) in enumerate(entries):
+        if i >= PARSED_RESUME_CACHE_MAX_FILES or now - mtime > CACHE_MAX_AGE_SECONDS:
+            path.unlink(missing_ok=True)
+
+def parse_resume_bytes(data: bytes, file_name: str, cache_dir: Path = PARSED_RESUME_CACHE_DIR) -> tuple[str, str]:
+    """Parse a resume file: cache, then local extraction, then LlamaParse. Returns (sha256, text)."""
+    digest = file_hash(data)
+    cached = _read_cache(digest, cache_dir)
+    if cached is not None:
+        return digest, cached["text"]
+
+    suffix = Path(file_name).suffix.lower()
+    text = parse_locally(data, suffix)
+    method = "local"
+    if text is None:
+        print(f"Local text for {file_name} unusable, parsing with LlamaParse...")
+        text = parse_with_llama(data, file_name)
+        method = "llama_parse"
+
+    # Only cache real results, so a failed remote parse is retried next time
+    if text.strip():
+        _write_cache(digest, {"text": text, "method": method, "file_name": file_name}, cache_dir)
+    return digest, text
+
+def parse_resume(file) -> str:
+    """Parse an uploaded file object (with .name and .getvalue(), e.g. a Streamlit upload)"""
+    return parse_resume_bytes(file.getvalue(), file.name)[1]
+
 def extract_skills(text):
     from backend.app.matcher.keyword_feedback import extract_skills, get_skills_map
-    from backend.app import database, models
 
-    db_session = database.SessionLocal()
-    skills_map = get_skills_map(db_session, models)
+    skills_map = get_skills_map()
     skills = extract_skills(text, skills_map)
     resume_skills = ", ".join(skills)
     return resume_skills
\ No newline at end of file
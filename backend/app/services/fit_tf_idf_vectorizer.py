@@ -2,16 +2,134 @@
 One-time script to fit the TF-IDF vectorizer on the combined corpus
 and save it to disk. Run this during setup, not at runtime.
 
+Texts are streamed from server-side cursors and document frequencies are counted in a
+single pass, so the corpus and its document-term matrix are never held in memory.
+Also exports the compact artifact (sorted terms + idf .npy) that load_vectorizer prefers.
+
 Usage:
-    python -m backend.services.fit_tf_idf_vectorizer
+    python -m backend.app.services.fit_tf_idf_vectorizer
+    python -m backend.app.services.fit_tf_idf_vectorizer --include-postings --mode hashing
+    python -m backend.app.services.fit_tf_idf_vectorizer --export-only   # convert the existing pickle
 """
 
+import argparse
 import pickle
+from collections import Counter
+from numbers import Integral
+import numpy as np
 from backend.app import database
-from backend.app.services.tf_idf_embedder import TFIDFEmbeddingService
+from backend.app.config import TFIDF_VECTORIZER_PATH
+from backend.app.services.tf_idf_embedder import TFIDFEmbeddingService, HashingTfidfVectorizer, export_compact_vectorizer
 from backend.app import models
 
-def fit_and_save_vectorizer():
+def iter_corpus_texts(db_session, include_postings=False, batch_size=1000):
+    """Yield cluster descriptions, resumes and optionally job postings from server-side cursors"""
+    columns = [models.Cluster.general_job_desc_tfidf, models.Resume.content_raw]
+    if include_postings:
+        columns.append(models.JobPosting.desc_tfidf)
+
+    for column in columns:
+        rows = (
+            db_session.query(column)
+            .filter(column.isnot(None))
+            .execution_options(stream_results=True)
+            .yield_per(batch_size)
+        )
+        for (text,) in rows:
+            yield text
+
+def fit_streaming(vectorizer, texts):
+    """
+    Fit a TfidfVectorizer from an iterable in one pass. Equivalent to vectorizer.fit, but only
+    per-term document and corpus frequencies are kept instead of the full document-term matrix.
+    """
+    analyzer = vectorizer.build_analyzer()
+    doc_freq, term_freq = Counter(), Counter()
+    n_docs = 0
+    for text in texts:
+        ngrams = analyzer(text)
+        term_freq.update(ngrams)
+        doc_freq.update(set(ngrams))
+        n_docs += 1
+
+    if n_docs == 0:
+        raise ValueError("No texts to fit the TF-IDF vectorizer on.")
+
+    # Same pruning as CountVectorizer._limit_features, applied to terms in sorted order
+    terms = np.array(sorted(doc_freq))
+    dfs = np.array([doc_freq[t] for t in terms])
+    tfs = np.array([term_freq[t] for t in terms])
+    del doc_freq, term_freq
+
+    max_df, min_df = vectorizer.max_df, vectorizer.min_df
+    max_doc_count = max_df if isinstance(max_df, Integral) else max_df * n_docs
+    min_doc_count = min_df if isinstance(min_df, Integral) else min_df * n_docs
+    if max_doc_count < min_doc_count:
+        raise ValueError("max_df corresponds to < documents than min_df")
+
+    mask = (dfs <= max_doc_count) & (dfs >= min_doc_count)
+    limit = vectorizer.max_features
+    if limit is not None and mask.sum() > limit:
+        mask_inds = (-tfs[mask]).argsort()[:limit]
+        new_mask = np.zeros(len(dfs), dtype=bool)
+        new_mask[np.where(mask)[0][mask_inds]] = True
+        mask = new_mask
+    if not mask.any():
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a higher max_df.")
+
+    kept_dfs = dfs[mask]
+    if vectorizer.smooth_idf:
+        idf = np.log((1 + n_docs) / (1 + kept_dfs)) + 1
+    else:
+        idf = np.log(n_docs / kept_dfs) + 1
+
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(terms[mask].tolist())}
+    vectorizer.fixed_vocabulary_ = False
+    vectorizer.idf_ = idf.astype(np.float64)
+    print(f"Fitted TF-IDF vocabulary of {len(kept_dfs)} terms on {n_docs} documents")
+    return vectorizer
+
+def fit_hashing(texts, n_features=5000, batch_size=1000, reference=None):
+    """
+    Fit a HashingTfidfVectorizer from an iterable. Memory is bounded by n_features and
+    batch_size regardless of corpus size or vocabulary growth.
+    """
+    reference = reference or TFIDFEmbeddingService().vectorizer
+    vectorizer = HashingTfidfVectorizer({
+        "n_features": n_features,
+        "lowercase": reference.lowercase,
+        "token_pattern": reference.token_pattern,
+        "ngram_range": list(reference.ngram_range),
+        "stop_words": sorted(reference.stop_words) if reference.stop_words else None,
+        "norm": "l2",
+    }, idf=None)
+
+    doc_freq = np.zeros(n_features, dtype=np.int64)
+    n_docs = 0
+    batch = []
+
+    def count(batch):
+        # Hashed counts come back with duplicates summed, so each index is one document occurrence
+        return np.bincount(vectorizer.hasher.transform(batch).indices, minlength=n_features)
+
+    for text in texts:
+        batch.append(text)
+        if len(batch) == batch_size:
+            doc_freq += count(batch)
+            n_docs += len(batch)
+            batch = []
+    if batch:
+        doc_freq += count(batch)
+        n_docs += len(batch)
+
+    if n_docs == 0:
+        raise ValueError("No texts to fit the TF-IDF vectorizer on.")
+
+    vectorizer.idf_ = np.log((1 + n_docs) / (1 + doc_freq)) + 1
+    print(f"Fitted hashing TF-IDF with {n_features} features on {n_docs} documents")
+    return vectorizer
+
+def fit_and_save_vectorizer(mode="stream", include_postings=False, n_features=5000, batch_size=1000):
     # Load env
     from dotenv import load_dotenv
     load_dotenv()
@@ -23,25 +141,48 @@ def fit_and_save_vectorizer():
     SessionLocal = database.SessionLocal
     db_session = SessionLocal()
     try:
-        # Fetch all job descriptions and resumes
-        job_descs = db_session.query(models.Cluster).filter(models.Cluster.general_job_desc_tfidf != None).all()
-        resume_texts = db_session.query(models.Resume).filter(models.Resume.content_raw != None).all()
-
-        # Combine texts
-        combined_texts = [jd.general_job_desc_tfidf for jd in job_descs] + [r.content_raw for r in resume_texts]
+        texts = iter_corpus_texts(db_session, include_postings=include_postings, batch_size=batch_size)
 
         # Fit TF-IDF vectorizer
         embedding_service = TFIDFEmbeddingService()
-        embedding_service.fit_transform(combined_texts)
+        if mode == "hashing":
+            embedding_service.vectorizer = fit_hashing(texts, n_features=n_features, batch_size=batch_size)
+        elif mode == "stream":
+            fit_streaming(embedding_service.vectorizer, texts)
+        else:
+            # Previous in-memory behaviour, kept for comparison
+            embedding_service.fit(list(texts))
 
         # Save vectorizer to disk
-        with open("tfidf_vectorizer.pkl", "wb") as f:
+        with open(TFIDF_VECTORIZER_PATH, "wb") as f:
             pickle.dump(embedding_service.vectorizer, f)
 
-        print("TF-IDF vectorizer fitted and saved to tfidf_vectorizer.pkl")
+        print(f"TF-IDF vectorizer fitted and saved to {TFIDF_VECTORIZER_PATH}")
+        export_compact_vectorizer(embedding_service.vectorizer)
 
     finally:
         db_session.close()
 
+def export_existing_vectorizer():
+    with open(TFIDF_VECTORIZER_PATH, "rb") as f:
+        vectorizer = pickle.load(f)
+    export_compact_vectorizer(vectorizer)
+
 if __name__ == "__main__":
-    fit_and_save_vectorizer()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fit and save the TF-IDF vectorizer")
+    parser.add_argument("--mode", choices=["stream", "hashing", "memory"], default="stream", help="Single-pass vocabulary fit, hashing variant, or the in-memory sklearn fit")
+    parser.add_argument("--include-postings", action="store_true", help="Also fit on job posting texts")
+    parser.add_argument("--n-features", type=int, default=5000, help="Hash buckets for --mode hashing (matches the TF-IDF embedding dimension)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows fetched per cursor round trip")
+    parser.add_argument("--export-only", action="store_true", help="Export the existing pickle to the compact artifact without refitting")
+    args = parser.parse_args()
+
+    if args.export_only:
+        export_existing_vectorizer()
+    else:
+        fit_and_save_vectorizer(
+            mode=args.mode,
+            include_postings=args.include_postings,
+            n_features=args.n_features,
+            batch_size=args.batch_size,
+        )
@@ -0,0 +1,155 @@
+"""
+Metrics for the matching hot path, rendered in Prometheus text format.
+Stage timings are histograms; model load times, cache hit rates and database
+pool stats are rendered with them. Database queries are also timed per statement,
+labelled with the span they ran in.
+
+Under gunicorn (backend/gunicorn_conf.py) PROMETHEUS_MULTIPROC_DIR is set, so every
+worker writes its samples to files there and /api/metrics reports the totals across
+all workers, whichever one answers. Pool stats are those of the answering worker.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache, wraps
+import os
+import re
+import time
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_SECONDS = Histogram(
+    "job_match_stage_seconds", "Time spent in each stage of the matching hot path.",
+    ["stage"], buckets=DEFAULT_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram(
+    "job_match_db_query_seconds", "Time spent in each database statement, by enclosing stage.",
+    ["stage", "query"], buckets=DEFAULT_BUCKETS,
+)
+CACHE_REQUESTS = Counter("job_match_cache_requests", "Cache lookups by result.", ["cache", "result"])
+# Across workers, report the slowest load of each model
+MODEL_LOAD_SECONDS = Gauge(
+    "job_match_model_load_seconds", "Time taken to load each model or artifact.",
+    ["model"], multiprocess_mode="max",
+)
+
+# Innermost span active in the current thread or task, used to label database queries
+_current_stage: ContextVar[str] = ContextVar("current_stage", default="none")
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+def observe_query(stage: str, query: str, seconds: float):
+    DB_QUERY_SECONDS.labels(stage, query).observe(seconds)
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block into the stage's histogram"""
+    start = time.perf_counter()
+    token = _current_stage.set(stage)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        observe_stage(stage, time.perf_counter() - start)
+
+def timed(stage: str):
+    """Decorator form of span"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def record_model_load(model: str, seconds: float):
+    MODEL_LOAD_SECONDS.labels(model).set(seconds)
+
+_STATEMENT_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+\"?(\w+)", re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def statement_tag(statement: str) -> str:
+    """Verb and first table of a SQL statement, e.g. "SELECT job_postings" """
+    words = statement.split(None, 1)
+    verb = words[0].upper() if words else "?"
+    match = _STATEMENT_TABLE.search(statement)
+    return f"{verb} {match.group(1)}" if match else verb
+
+def instrument_engine(engine):
+    """
+    Time every statement executed through the engine, both in the db_query stage and
+    per statement tag and enclosing span
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the per-statement context, so a statement that raises leaves nothing behind
+        if context is not None:
+            context._query_start = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_query_start", None)
+        if start is None:
+            return
+        seconds = time.perf_counter() - start
+        observe_stage("db_query", seconds)
+        observe_query(_current_stage.get(), statement_tag(statement), seconds)
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _registry():
+    """Registry to render: one merging every worker's files in multiprocess mode, else this process's"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+def render_prometheus(engine=None) -> str:
+    """All metrics in Prometheus text exposition format"""
+    registry = _registry()
+    lines = [generate_latest(registry).decode().rstrip("\n")]
+
+    cache_counts = {}
+    for metric in registry.collect():
+        if metric.name != "job_match_cache_requests":
+            continue
+        for sample in metric.samples:
+            if sample.name.endswith("_total"):
+                counts = cache_counts.setdefault(sample.labels["cache"], {"hit": 0, "miss": 0})
+                counts[sample.labels["result"]] += int(sample.value)
+
+    lines += [
+        "# HELP job_match_cache_hit_ratio Fraction of cache lookups that were hits.",
+        "# TYPE job_match_cache_hit_ratio gauge",
+    ]
+    for cache, counts in sorted(cache_counts.items()):
+        lookups = counts["hit"] + counts["miss"]
+        ratio = counts["hit"] / lookups if lookups else 0.0
+        lines.append(f'job_match_cache_hit_ratio{{cache="{cache}"}} {_format_value(ratio)}')
+
+    pool = getattr(engine, "pool", None)
+    if pool is not None and hasattr(pool, "checkedout"):
+        lines += [
+            "# HELP job_match_db_pool_connections Database connection pool state.",
+            "# TYPE job_match_db_pool_connections gauge",
+        ]
+        for state, value in (
+            ("size", pool.size()),
+            ("checked_in", pool.checkedin()),
+            ("checked_out", pool.checkedout()),
+            ("overflow", pool.overflow()),
+        ):
+            lines.append(f'job_match_db_pool_connections{{state="{state}"}} {value}')
+
+    return "\n".join(lines) + "\n"
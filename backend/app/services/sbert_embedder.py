@@ -5,7 +5,9 @@ Includes singleton loader
 
 from sentence_transformers import SentenceTransformer
 from backend.app.config import EMBEDDING_MODEL
+from backend.app.services.metrics import timed, record_cache, record_model_load
 import numpy as np
+import time
 
 class SBERTEmbeddingService:
     """
@@ -15,6 +17,7 @@ class SBERTEmbeddingService:
     def __init__(self):
         self.model = SentenceTransformer(EMBEDDING_MODEL)
 
+    @timed("sbert_embed")
     def embed(self, texts: list[str]) -> np.ndarray:
         """
         Embed a list of texts using SBERT.
@@ -27,6 +30,9 @@ _instance = None
 
 def get_sbert_service() -> SBERTEmbeddingService:
     global _instance
+    record_cache("sbert_model", _instance is not None)
     if _instance is None:
+        start = time.perf_counter()
         _instance = SBERTEmbeddingService()
+        record_model_load("sbert", time.perf_counter() - start)
     return _instance
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""
+Versioned local store for embedding snapshots used by the offline pipeline.
+Each snapshot is an id array plus an embedding matrix, saved as .npy files that
+downstream steps and evaluators memory-map instead of re-querying pgvector tables.
+Parquet is supported as an alternative format when pyarrow is installed.
+Includes helpers for filling database tables from snapshots in the background.
+"""
+
+from backend.app.config import SNAPSHOTS_DIR, SNAPSHOT_KEEP_VERSIONS
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Callable, Optional
+import json
+import os
+import shutil
+import threading
+import numpy as np
+
+# Snapshot names used by the pipeline; ids are job posting ids
+SBERT_SNAPSHOT = "sbert"
+REDUCED_SNAPSHOT = "reduced_umap"
+
+@dataclass
+class Snapshot:
+    name: str
+    version: str
+    ids: np.ndarray
+    embeddings: np.ndarray
+    metadata: dict = field(default_factory=dict)
+
+def snapshot_dir(name: str, version: str):
+    return SNAPSHOTS_DIR / name / version
+
+def latest_version(name: str) -> Optional[str]:
+    """Version of the most recently saved snapshot, or None if there is none"""
+    pointer = SNAPSHOTS_DIR / name / "LATEST"
+    if not pointer.exists():
+        return None
+    return pointer.read_text().strip()
+
+def save_snapshot(name: str, ids, embeddings, metadata: Optional[dict] = None, fmt: str = "npy") -> str:
+    """Write a new snapshot version and point LATEST at it. Returns the version."""
+    ids = np.asarray(ids, dtype=np.int64)
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if len(ids) != len(embeddings):
+        raise ValueError("ids and embeddings must have the same length")
+
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    path = snapshot_dir(name, version)
+    path.mkdir(parents=True, exist_ok=True)
+
+    if fmt == "npy":
+        np.save(path / "ids.npy", ids)
+        np.save(path / "embeddings.npy", embeddings)
+    elif fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        dim = embeddings.shape[1]
+        table = pa.table({
+            "id": ids,
+            "embedding": pa.FixedSizeListArray.from_arrays(pa.array(embeddings.ravel()), dim),
+        })
+        pq.write_table(table, path / "snapshot.parquet")
+    else:
+        raise ValueError(f"Unsupported snapshot format: {fmt}")
+
+    with open(path / "meta.json", "w") as f:
+        json.dump({
+            **(metadata or {}),
+            "format": fmt,
+            "count": int(len(ids)),
+            "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        }, f, indent=2)
+
+    # Swap the LATEST pointer atomically so readers never see a half-written snapshot
+    pointer = SNAPSHOTS_DIR / name / "LATEST"
+    tmp_pointer = pointer.with_suffix(".tmp")
+    tmp_pointer.write_text(version)
+    os.replace(tmp_pointer, pointer)
+
+    print(f"Saved {len(ids)} embeddings to snapshot {name}/{version}")
+    prune_snapshots(name)
+    return version
+
+def prune_snapshots(name: str, keep: int = SNAPSHOT_KEEP_VERSIONS):
+    """Delete all but the newest keep versions of a snapshot (versions are timestamps, so they sort by age)"""
+    latest = latest_version(name)
+    versions = sorted(p.name for p in (SNAPSHOTS_DIR / name).iterdir() if p.is_dir())
+    for version in versions[:-keep]:
+        if version != latest:
+            shutil.rmtree(snapshot_dir(name, version), ignore_errors=True)
+
+def load_snapshot(name: str, version: Optional[str] = None, mmap: bool = True) -> Optional[Snapshot]:
+    """
+    Load a snapshot (latest by default), or None if it does not exist.
+    .npy snapshots are memory-mapped read-only, so loading is zero-copy.
+    """
+    version = version or latest_version(name)
+    if version is None:
+        return None
+
+    path = snapshot_dir(name, version)
+    with open(path / "meta.json") as f:
+        metadata = json.load(f)
+
+    if metadata.get("format", "npy") == "npy":
+        mmap_mode = "r" if mmap else None
+        ids = np.load(path / "ids.npy", mmap_mode=mmap_mode)
+        embeddings = np.load(path / "embeddings.npy", mmap_mode=mmap_mode)
+    else:
+        import pyarrow.parquet as pq
+        table = pq.read_table(path / "snapshot.parquet", memory_map=True)
+        ids = table.column("id").to_numpy()
+        embeddings = (
+            table.column("embedding").combine_chunks().flatten().to_numpy()
+            .reshape(len(ids), metadata["dim"])
+        )
+
+    return Snapshot(name=name, version=version, ids=ids, embeddings=embeddings, metadata=metadata)
+
+def append_snapshot(name: str, new_ids, new_embeddings, metadata: Optional[dict] = None) -> str:
+    """Save a new version containing the latest snapshot plus new rows"""
+    previous = load_snapshot(name)
+    if previous is not None and len(previous.ids):
+        ids = np.concatenate([previous.ids, np.asarray(new_ids, dtype=np.int64)])
+        embeddings = np.concatenate([previous.embeddings, np.asarray(new_embeddings, dtype=np.float32)])
+    else:
+        ids, embeddings = new_ids, new_embeddings
+    return save_snapshot(name, ids, embeddings, metadata=metadata)
+
+# Background database fills and their errors, keyed by snapshot name
+_fill_threads: dict[str, threading.Thread] = {}
+_fill_errors: dict[str, Exception] = {}
+_fill_lock = threading.Lock()
+
+def fill_async(name: str, fill_fn: Callable, *args, wait_for: tuple[str, ...] = ()):
+    """
+    Run fill_fn(*args) in a background thread, after any fills named in wait_for finish.
+    Pipeline steps use this to write snapshot rows to the database while later steps
+    already read the snapshot.
+    """
+    with _fill_lock:
+        dependencies = [_fill_threads[d] for d in wait_for if d in _fill_threads]
+
+    def target():
+        for dependency in dependencies:
+            dependency.join()
+        try:
+            fill_fn(*args)
+        except Exception as e:
+            print(f"Exception filling database from snapshot {name}:", e)
+            with _fill_lock:
+                _fill_errors[name] = e
+
+    # Non-daemon so the interpreter waits for pending fills before exiting
+    thread = threading.Thread(target=target, name=f"fill-{name}")
+    with _fill_lock:
+        _fill_threads[name] = thread
+        _fill_errors.pop(name, None)
+    thread.start()
+    return thread
+
+def wait_for_fills(names: Optional[list[str]] = None) -> dict[str, Exception]:
+    """Block until the given background fills (all by default) are done. Returns {name: error} for failed fills."""
+    with _fill_lock:
+        threads = [t for n, t in _fill_threads.items() if names is None or n in names]
+    for thread in threads:
+        thread.join()
+    with _fill_lock:
+        return {n: e for n, e in _fill_errors.items() if names is None or n in names}
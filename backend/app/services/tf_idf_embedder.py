@@ -3,12 +3,16 @@ Service for embedding documents using TF-IDF
 Includes singleton loader and keyword utility functions
 """
 
-from sklearn.feature_extraction.text import TfidfVectorizer
-from backend.app.config import CUSTOM_STOPWORDS
+from backend.app.config import CUSTOM_STOPWORDS, TFIDF_VECTORIZER_PATH, TFIDF_ARTIFACT_DIR
+from backend.app.services.metrics import timed, record_cache, record_model_load
+from scipy import sparse
+import hashlib
+import json
 import pickle
+import re
+import time
 import numpy as np
-from pathlib import Path
-_PKL_PATH = Path(__file__).resolve().parent.parent.parent.parent / "tfidf_vectorizer.pkl"
+_PKL_PATH = TFIDF_VECTORIZER_PATH
 
 
 class TFIDFEmbeddingService:
@@ -16,14 +20,17 @@ class TFIDFEmbeddingService:
     TF-IDF embedding service for resumes and job descriptions.
     """
 
-    def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            stop_words=list(CUSTOM_STOPWORDS),
-            max_df=0.8,
-            min_df=5,
-            ngram_range=(1, 2),
-            max_features=5000
-        )
+    def __init__(self, vectorizer=None):
+        if vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            vectorizer = TfidfVectorizer(
+                stop_words=list(CUSTOM_STOPWORDS),
+                max_df=0.8,
+                min_df=5,
+                ngram_range=(1, 2),
+                max_features=5000
+            )
+        self.vectorizer = vectorizer
 
     def fit(self, texts: list[str]):
         """
@@ -31,6 +38,7 @@ class TFIDFEmbeddingService:
         """
         self.vectorizer.fit(texts)
 
+    @timed("tfidf_transform")
     def transform(self, texts: list[str]):
         """
         Transform new texts using fitted vectorizer.
@@ -43,16 +51,183 @@ class TFIDFEmbeddingService:
         """
         return self.vectorizer.fit_transform(texts)
 
+class CompactTfidfVectorizer:
+    """
+    Transform-only TF-IDF vectorizer loaded from the compact artifact written by
+    export_compact_vectorizer. Reproduces TfidfVectorizer.transform for word
+    n-grams with l2 norm, without importing sklearn or unpickling it.
+    """
+
+    def __init__(self, terms: np.ndarray, idf: np.ndarray, params: dict):
+        self.terms = terms
+        self.idf_ = idf
+        self.params = params
+        self.vocabulary_ = {term: i for i, term in enumerate(terms.tolist())}
+        self.stop_words = frozenset(params["stop_words"] or ())
+        self.ngram_range = tuple(params["ngram_range"])
+        self._token_re = re.compile(params["token_pattern"])
+
+    def get_feature_names_out(self) -> np.ndarray:
+        return np.asarray(self.terms, dtype=object)
+
+    def _ngrams(self, text: str) -> list[str]:
+        # Same order of operations as sklearn's word analyzer: lowercase, tokenize, drop stop words, n-grams
+        if self.params["lowercase"]:
+            text = text.lower()
+        tokens = [t for t in self._token_re.findall(text) if t not in self.stop_words]
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            ngrams.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return ngrams
+
+    def transform(self, texts: list[str]) -> sparse.csr_matrix:
+        vocabulary = self.vocabulary_
+        indices, indptr = [], [0]
+        for text in texts:
+            indices.extend(i for i in (vocabulary.get(g) for g in self._ngrams(text)) if i is not None)
+            indptr.append(len(indices))
+
+        dtype = np.dtype(self.params.get("dtype", "float64"))
+        counts = sparse.csr_matrix(
+            (np.ones(len(indices), dtype=dtype), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int32)),
+            shape=(len(texts), len(self.terms)),
+        )
+        # Duplicate indices are summed into term counts
+        counts.sum_duplicates()
+
+        if self.params["sublinear_tf"]:
+            np.log(counts.data, counts.data)
+            counts.data += 1
+        if self.params["use_idf"]:
+            counts.data *= self.idf_[counts.indices].astype(dtype)
+        if self.params["norm"] == "l2":
+            row_norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1)).ravel())
+            row_norms[row_norms == 0] = 1.0
+            counts.data /= np.repeat(row_norms, np.diff(counts.indptr))
+        elif self.params["norm"] is not None:
+            raise ValueError(f"Unsupported norm in TF-IDF artifact: {self.params['norm']}")
+        return counts
+
+class HashingTfidfVectorizer:
+    """
+    TF-IDF over a fixed number of hashed features. Has no vocabulary, so it can be
+    fitted in bounded memory on any corpus size; idf_ is per hash bucket.
+    """
+
+    def __init__(self, params: dict, idf: np.ndarray):
+        self.params = params
+        self.idf_ = idf
+        self._hasher = None
+
+    @property
+    def hasher(self):
+        if self._hasher is None:
+            from sklearn.feature_extraction.text import HashingVectorizer
+            self._hasher = HashingVectorizer(
+                n_features=self.params["n_features"],
+                lowercase=self.params["lowercase"],
+                token_pattern=self.params["token_pattern"],
+                ngram_range=tuple(self.params["ngram_range"]),
+                stop_words=self.params["stop_words"],
+                alternate_sign=False,
+                norm=None,
+            )
+        return self._hasher
+
+    def __getstate__(self):
+        return {"params": self.params, "idf_": np.asarray(self.idf_), "_hasher": None}
+
+    def transform(self, texts: list[str]) -> sparse.csr_matrix:
+        counts = self.hasher.transform(texts).tocsr()
+        counts.data *= self.idf_[counts.indices]
+        row_norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1)).ravel())
+        row_norms[row_norms == 0] = 1.0
+        counts.data /= np.repeat(row_norms, np.diff(counts.indptr))
+        return counts
+
+def stop_words_hash(stop_words) -> str:
+    return hashlib.sha256("\n".join(sorted(stop_words)).encode()).hexdigest()
+
+def _stop_words_params(stop_words) -> dict:
+    """params.json entries for the stop words: a hash of CUSTOM_STOPWORDS instead of a copy of the list"""
+    if not stop_words:
+        return {"stop_words": None}
+    if frozenset(stop_words) != CUSTOM_STOPWORDS:
+        raise ValueError("Vectorizer stop words differ from CUSTOM_STOPWORDS; refit it before exporting.")
+    return {"stop_words_sha256": stop_words_hash(stop_words)}
+
+def _resolve_stop_words(params: dict) -> dict:
+    """Restore the stop word list from CUSTOM_STOPWORDS, checking it is the one the artifact was fitted with"""
+    if "stop_words_sha256" not in params:
+        return params
+    if stop_words_hash(CUSTOM_STOPWORDS) != params["stop_words_sha256"]:
+        raise ValueError("CUSTOM_STOPWORDS changed since the TF-IDF artifact was exported; refit the vectorizer.")
+    return {**params, "stop_words": sorted(CUSTOM_STOPWORDS)}
+
+def export_compact_vectorizer(vectorizer, path=TFIDF_ARTIFACT_DIR):
+    """Write a fitted TfidfVectorizer as terms.npy, idf.npy (float32) and params.json"""
+    if isinstance(vectorizer, HashingTfidfVectorizer):
+        path.mkdir(parents=True, exist_ok=True)
+        # A vocabulary from an earlier non-hashing export would no longer match the idf
+        (path / "terms.npy").unlink(missing_ok=True)
+        np.save(path / "idf.npy", np.asarray(vectorizer.idf_, dtype=np.float32))
+        params = {k: v for k, v in vectorizer.params.items() if k != "stop_words"}
+        with open(path / "params.json", "w") as f:
+            json.dump({**params, **_stop_words_params(vectorizer.params["stop_words"]), "kind": "hashing"}, f, indent=2)
+        print(f"Exported hashing TF-IDF ({vectorizer.params['n_features']} features) to {path}")
+        return
+
+    params = vectorizer.get_params()
+    if params["analyzer"] != "word" or params["tokenizer"] or params["preprocessor"] or params["strip_accents"] or params["binary"]:
+        raise ValueError("Only word analyzers with the default tokenizer and preprocessor can be exported.")
+
+    # sklearn assigns vocabulary indices in sorted term order, so the sorted array is the index
+    terms = np.array(sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get))
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / "terms.npy", terms)
+    np.save(path / "idf.npy", vectorizer.idf_.astype(np.float32))
+    with open(path / "params.json", "w") as f:
+        json.dump({
+            "lowercase": params["lowercase"],
+            "token_pattern": params["token_pattern"],
+            "ngram_range": list(params["ngram_range"]),
+            **_stop_words_params(params["stop_words"]),
+            "norm": params["norm"],
+            "use_idf": params["use_idf"],
+            "sublinear_tf": params["sublinear_tf"],
+            "dtype": np.dtype(params["dtype"]).name,
+        }, f, indent=2)
+    print(f"Exported {len(terms)} TF-IDF terms to {path}")
+
+def load_compact_vectorizer(path=TFIDF_ARTIFACT_DIR):
+    with open(path / "params.json") as f:
+        params = _resolve_stop_words(json.load(f))
+    if params.get("kind") == "hashing":
+        return HashingTfidfVectorizer(params, np.load(path / "idf.npy", mmap_mode="r"))
+    terms = np.load(path / "terms.npy", mmap_mode="r")
+    idf = np.load(path / "idf.npy", mmap_mode="r")
+    return CompactTfidfVectorizer(terms, idf, params)
+
 # Singleton pattern to ensure only one instance of the embedding service is created
 _instance: TFIDFEmbeddingService | None = None
 
 def load_vectorizer() -> TFIDFEmbeddingService:
-    """Load the fitted vectorizer from disk, caching it for the app lifetime."""
+    """
+    Load the fitted vectorizer from the compact artifact, falling back to the pickle
+    if it has not been exported yet. Cached for the app lifetime.
+    """
     global _instance
+    record_cache("tfidf_vectorizer", _instance is not None)
     if _instance is None:
-        with open(_PKL_PATH, "rb") as f:
-            vectorizer = pickle.load(f)
-        service = TFIDFEmbeddingService()
-        service.vectorizer = vectorizer
-        _instance = service
-    return _instance
\ No newline at end of file
+        start = time.perf_counter()
+        if (TFIDF_ARTIFACT_DIR / "params.json").exists():
+            vectorizer = load_compact_vectorizer()
+        else:
+            with open(_PKL_PATH, "rb") as f:
+                vectorizer = pickle.load(f)
+        _instance = TFIDFEmbeddingService(vectorizer)
+        record_model_load("tfidf_vectorizer", time.perf_counter() - start)
+    return _instance
@@ -0,0 +1,134 @@
+"""
+Scaling benchmark for the clustering step (HDBSCAN + KNN outlier reassignment).
+Runs the step on synthetic 15-d embeddings and reports wall time and peak memory
+for each dataset size. Every size runs in a fresh process so peak RSS is not
+inflated by earlier, smaller runs.
+
+Usage:
+    python -m backend.benchmarks.benchmark_clustering
+    python -m backend.benchmarks.benchmark_clustering --sizes 10000 100000 --n-jobs 1
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import resource
+import sys
+import time
+from queue import Empty
+
+import numpy as np
+from sklearn.datasets import make_blobs
+
+DEFAULT_SIZES = [10_000, 50_000, 100_000, 500_000, 1_000_000]
+
+def make_synthetic_embeddings(n_samples, n_features=15, points_per_cluster=2000, seed=42):
+    """Gaussian blobs shaped like UMAP output: low-dimensional, many dense groups plus noise"""
+    n_centers = max(2, n_samples // points_per_cluster)
+    embeddings, _ = make_blobs(
+        n_samples=n_samples,
+        n_features=n_features,
+        centers=n_centers,
+        cluster_std=0.5,
+        center_box=(-10.0, 10.0),
+        random_state=seed,
+    )
+    return embeddings.astype(np.float64)
+
+def peak_rss_mb():
+    """Peak resident set size of the current process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def _run_single(n_samples, n_jobs, result_queue):
+    from backend.pipelines.steps.cluster_jobs import cluster_jobs_hdbscan, assign_outliers_with_knn
+
+    embeddings = make_synthetic_embeddings(n_samples)
+    baseline_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    labels, _ = cluster_jobs_hdbscan(embeddings, core_dist_n_jobs=n_jobs)
+    hdbscan_seconds = time.perf_counter() - start
+
+    num_outliers = int(np.sum(labels == -1))
+
+    start = time.perf_counter()
+    assign_outliers_with_knn(embeddings, labels, n_jobs=n_jobs)
+    knn_seconds = time.perf_counter() - start
+
+    result_queue.put({
+        "n_samples": n_samples,
+        "n_jobs": n_jobs,
+        "num_clusters": int(len(set(labels)) - (1 if -1 in labels else 0)),
+        "num_outliers": num_outliers,
+        "hdbscan_seconds": round(hdbscan_seconds, 3),
+        "knn_seconds": round(knn_seconds, 3),
+        "total_seconds": round(hdbscan_seconds + knn_seconds, 3),
+        "data_rss_mb": round(baseline_rss, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    })
+
+def wait_for_result(proc, result_queue, poll_seconds=5):
+    """Child's result, or None if it exited without one (e.g. killed by the OOM killer)"""
+    while True:
+        try:
+            return result_queue.get(timeout=poll_seconds)
+        except Empty:
+            if not proc.is_alive():
+                # The result may have been queued just before the child exited
+                try:
+                    return result_queue.get(timeout=1)
+                except Empty:
+                    return None
+
+def run_benchmark(sizes, n_jobs):
+    ctx = mp.get_context("spawn")
+    results = []
+
+    for n_samples in sizes:
+        print(f"Clustering {n_samples} synthetic embeddings (n_jobs={n_jobs})...")
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_run_single, args=(n_samples, n_jobs, queue))
+        proc.start()
+        result = wait_for_result(proc, queue)
+        proc.join()
+        if result is None:
+            print(f"  Failed: benchmark process exited with code {proc.exitcode}")
+            results.append({"n_samples": n_samples, "n_jobs": n_jobs, "error": f"exit code {proc.exitcode}"})
+            continue
+        results.append(result)
+        print(
+            f"  HDBSCAN: {result['hdbscan_seconds']}s, KNN: {result['knn_seconds']}s, "
+            f"peak RSS: {result['peak_rss_mb']} MB"
+        )
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the clustering step on synthetic embeddings")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Dataset sizes to benchmark")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Cores for HDBSCAN core distances and KNN queries")
+    parser.add_argument("--output", type=str, help="Optional path to write results as JSON")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.sizes, args.n_jobs)
+
+    print("\n=== Clustering Scaling Benchmark ===")
+    print(f"{'n_samples':>10} {'clusters':>9} {'outliers':>9} {'hdbscan_s':>10} {'knn_s':>8} {'total_s':>8} {'peak_mb':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['n_samples']:>10} failed ({r['error']})")
+            continue
+        print(
+            f"{r['n_samples']:>10} {r['num_clusters']:>9} {r['num_outliers']:>9} "
+            f"{r['hdbscan_seconds']:>10} {r['knn_seconds']:>8} {r['total_seconds']:>8} {r['peak_rss_mb']:>9}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+if __name__ == "__main__":
+    main()
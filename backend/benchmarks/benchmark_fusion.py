@@ -0,0 +1,74 @@
+"""
+Micro-benchmark of the cluster fusion step: the original list-based hybrid_rank_jobs over
+the TF-IDF and SBERT top-20 lists versus vectorized fusion (min-max and RRF) over the full
+similarity vectors for every cluster.
+
+Similarities are synthetic (correlated TF-IDF / SBERT scores for N clusters). Reports time
+per call and how often each method's top 10 agrees with full-candidate min-max fusion.
+
+Usage:
+    python -m backend.benchmarks.benchmark_fusion
+    python -m backend.benchmarks.benchmark_fusion --n-clusters 100 1000 10000 --repeats 200
+"""
+
+import argparse
+import timeit
+
+import numpy as np
+
+from backend.app.matcher.fusion import align_scores, fuse, top_k
+from backend.app.matcher.hybrid_matcher import hybrid_rank_jobs
+
+def synthetic_scores(n_clusters, rng):
+    """Cluster ids and correlated TF-IDF / SBERT similarities on their typical scales"""
+    shared = rng.normal(size=n_clusters)
+    tfidf = np.clip(0.15 + 0.08 * (shared + rng.normal(size=n_clusters)), 0, 1)
+    sbert = np.clip(0.45 + 0.10 * (shared + rng.normal(size=n_clusters)), -1, 1)
+    return np.arange(n_clusters), tfidf, sbert
+
+def top_list(ids, scores, n=20):
+    """A find_top_job_matches_* style result list"""
+    return [
+        {"cluster_id": int(ids[i]), "title": f"Cluster {ids[i]}", "similarity": float(scores[i]), "similarity_percent": round(float(scores[i]) * 100, 1)}
+        for i in top_k(scores, n)
+    ]
+
+def list_fusion(ids, tfidf, sbert):
+    return [job["cluster_id"] for job in hybrid_rank_jobs(top_list(ids, tfidf), top_list(ids, sbert))[:10]]
+
+def vector_fusion(ids, tfidf, sbert, method):
+    cluster_ids, tfidf_aligned, sbert_aligned = align_scores(ids, tfidf, ids, sbert)
+    return cluster_ids[top_k(fuse(tfidf_aligned, sbert_aligned, method=method), 10)].tolist()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list-based and vectorized hybrid fusion")
+    parser.add_argument("--n-clusters", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeats", type=int, default=100)
+    parser.add_argument("--trials", type=int, default=50, help="Random score sets for the agreement check")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'clusters':>8} {'list (top-20) us':>17} {'minmax us':>10} {'rrf us':>8} {'list top-10 overlap':>20} {'rrf top-10 overlap':>19}")
+    for n_clusters in args.n_clusters:
+        ids, tfidf, sbert = synthetic_scores(n_clusters, rng)
+        # The list-based step also needs its top-20 dict lists built, as the matchers did
+        list_time = timeit.timeit(lambda: list_fusion(ids, tfidf, sbert), number=args.repeats) / args.repeats
+        minmax_time = timeit.timeit(lambda: vector_fusion(ids, tfidf, sbert, "minmax"), number=args.repeats) / args.repeats
+        rrf_time = timeit.timeit(lambda: vector_fusion(ids, tfidf, sbert, "rrf"), number=args.repeats) / args.repeats
+
+        # Agreement with full-candidate min-max fusion, averaged over random score sets
+        list_overlap, rrf_overlap = [], []
+        for _ in range(args.trials):
+            ids, tfidf, sbert = synthetic_scores(n_clusters, rng)
+            reference = set(vector_fusion(ids, tfidf, sbert, "minmax"))
+            list_overlap.append(len(reference & set(list_fusion(ids, tfidf, sbert))) / 10)
+            rrf_overlap.append(len(reference & set(vector_fusion(ids, tfidf, sbert, "rrf"))) / 10)
+
+        print(
+            f"{n_clusters:>8} {list_time * 1e6:>17.1f} {minmax_time * 1e6:>10.1f} {rrf_time * 1e6:>8.1f} "
+            f"{np.mean(list_overlap):>20.1%} {np.mean(rrf_overlap):>19.1%}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Validate and benchmark the token-level Aho-Corasick skill extractor against the
+spaCy PhraseMatcher extractor in keyword_feedback.
+
+Both run on the same corpus sample (job posting descriptions from the database, or a
+file of texts) with the same skills map. Reports how often the extracted skill sets
+agree, the most common disagreements, and docs/sec for each extractor.
+
+Usage:
+    python -m backend.benchmarks.benchmark_skill_extraction --sample 2000
+    python -m backend.benchmarks.benchmark_skill_extraction --texts-file postings.txt --skills-file skills.txt --n-jobs 4
+"""
+
+import argparse
+import time
+from collections import Counter
+
+def load_skills_map(skills_file=None):
+    if skills_file:
+        with open(skills_file) as f:
+            return {line.strip().lower(): {"hot": False, "in_demand": False} for line in f if line.strip()}
+
+    from backend.app.matcher.keyword_feedback import get_skills_map
+    return get_skills_map()
+
+def load_texts(texts_file=None, sample=2000, seed=42):
+    if texts_file:
+        with open(texts_file) as f:
+            return [line.rstrip("\n") for line in f][:sample]
+
+    from sqlalchemy import func, select
+    from backend.app import database, models
+    db_session = database.SessionLocal()
+    try:
+        db_session.execute(select(func.setseed((seed % 1000) / 1000.0)))
+        rows = db_session.query(models.JobPosting.desc_raw).order_by(func.random()).limit(sample).all()
+        return [row.desc_raw for row in rows]
+    finally:
+        db_session.close()
+
+def docs_per_second(fn, texts):
+    start = time.perf_counter()
+    results = fn(texts)
+    return results, len(texts) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the PhraseMatcher and Aho-Corasick skill extractors")
+    parser.add_argument("--sample", type=int, default=2000, help="Number of texts to extract from")
+    parser.add_argument("--texts-file", help="Newline-separated texts (default: random job postings from the database)")
+    parser.add_argument("--skills-file", help="Newline-separated skills (default: the skills table)")
+    parser.add_argument("--n-jobs", type=int, default=4, help="Worker processes for the batch automaton run")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    from backend.app.matcher.keyword_feedback import (
+        SkillsState, skills_registry, _extract_phrase_matcher, extract_skills_batch,
+    )
+
+    skills_map = load_skills_map(args.skills_file)
+    texts = load_texts(args.texts_file, args.sample, args.seed)
+    print(f"Extracting {len(skills_map)} skills from {len(texts)} texts...")
+
+    start = time.perf_counter()
+    state = SkillsState.from_skills_map(skills_map)
+    matcher_build = time.perf_counter() - start
+    start = time.perf_counter()
+    state.get_automaton()
+    automaton_build = time.perf_counter() - start
+    # Both extractors read their matchers from the registry, so use the one just built
+    skills_registry.swap(state)
+
+    expected, matcher_rate = docs_per_second(
+        lambda batch: [_extract_phrase_matcher(t or "", skills_map) for t in batch], texts
+    )
+    actual, automaton_rate = docs_per_second(
+        lambda batch: extract_skills_batch(batch, skills_map, extractor="automaton"), texts
+    )
+    parallel, parallel_rate = docs_per_second(
+        lambda batch: extract_skills_batch(batch, skills_map, extractor="automaton", n_jobs=args.n_jobs), texts
+    )
+
+    exact = sum(a == e for a, e in zip(actual, expected))
+    missed, extra = Counter(), Counter()
+    for a, e in zip(actual, expected):
+        missed.update(e - a)
+        extra.update(a - e)
+    expected_total = sum(len(e) for e in expected)
+    matched_total = sum(len(a & e) for a, e in zip(actual, expected))
+
+    print("\n=== Validation (automaton vs PhraseMatcher) ===")
+    print(f"Identical skill sets:   {exact}/{len(texts)} ({exact / max(len(texts), 1):.1%})")
+    print(f"Skill recall:           {matched_total / max(expected_total, 1):.2%}")
+    print(f"Extra skills found:     {sum(extra.values())}")
+    print(f"Batch results match:    {parallel == actual}")
+    if missed:
+        print(f"Most often missed:      {missed.most_common(10)}")
+    if extra:
+        print(f"Most often extra:       {extra.most_common(10)}")
+
+    print("\n=== Throughput ===")
+    print(f"PhraseMatcher build:    {matcher_build:.2f}s")
+    print(f"Automaton build:        {automaton_build:.2f}s")
+    print(f"PhraseMatcher:          {matcher_rate:,.0f} docs/sec")
+    print(f"Automaton:              {automaton_rate:,.0f} docs/sec")
+    print(f"Automaton ({args.n_jobs} procs):   {parallel_rate:,.0f} docs/sec")
+
+if __name__ == "__main__":
+    main()
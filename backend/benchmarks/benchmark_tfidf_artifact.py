@@ -0,0 +1,103 @@
+"""
+Parity check and startup-time comparison between the pickled TfidfVectorizer and
+the compact TF-IDF artifact (sorted terms + float32 idf .npy).
+
+Parity: transform the same texts with both and compare the sparse outputs.
+Startup: load each in a fresh interpreter, so import cost (sklearn vs numpy/scipy) is included.
+Exits non-zero if the outputs differ beyond float32 idf precision.
+
+Usage:
+    python -m backend.benchmarks.benchmark_tfidf_artifact
+    python -m backend.benchmarks.benchmark_tfidf_artifact --texts-file resumes.txt --runs 10
+"""
+
+import argparse
+import pickle
+import subprocess
+import sys
+
+import numpy as np
+
+from backend.app.config import TFIDF_VECTORIZER_PATH, TFIDF_ARTIFACT_DIR
+from backend.app.services.tf_idf_embedder import export_compact_vectorizer, load_compact_vectorizer
+
+PICKLE_LOAD = f"""
+import time
+start = time.perf_counter()
+import pickle
+with open({str(TFIDF_VECTORIZER_PATH)!r}, "rb") as f:
+    pickle.load(f)
+print(time.perf_counter() - start)
+"""
+
+# The app's own loader, so the import cost of config and the embedder module is included
+ARTIFACT_LOAD = f"""
+import time
+start = time.perf_counter()
+import pathlib, sys
+from backend.app.services.tf_idf_embedder import load_compact_vectorizer
+load_compact_vectorizer(pathlib.Path({str(TFIDF_ARTIFACT_DIR)!r}))
+assert not any(m.startswith("sklearn") for m in sys.modules), "loading the compact artifact imported sklearn"
+print(time.perf_counter() - start)
+"""
+
+def synthetic_texts(vocabulary, n_texts=500, n_words=300, seed=42):
+    """Texts built from vocabulary words plus stop words, punctuation and mixed case"""
+    rng = np.random.default_rng(seed)
+    words = sorted({w for term in vocabulary for w in term.split()}) + ["the", "and", "Python/Django", "C++", "R&D", "a"]
+    return [" ".join(rng.choice(words, n_words)).title() for _ in range(n_texts)] + ["", "the and of"]
+
+def check_parity(vectorizer, compact, texts, atol=1e-6):
+    expected = vectorizer.transform(texts).tocsr()
+    actual = compact.transform(texts).tocsr()
+    expected.sort_indices()
+    actual.sort_indices()
+
+    same_pattern = (
+        expected.shape == actual.shape
+        and np.array_equal(expected.indptr, actual.indptr)
+        and np.array_equal(expected.indices, actual.indices)
+    )
+    max_diff = float(abs(expected - actual).max()) if expected.nnz or actual.nnz else 0.0
+    return same_pattern and max_diff <= atol, same_pattern, max_diff
+
+def time_load(script, runs):
+    timings = [float(subprocess.check_output([sys.executable, "-c", script], text=True).strip()) for _ in range(runs)]
+    return float(np.median(timings))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the pickled TF-IDF vectorizer with the compact artifact")
+    parser.add_argument("--texts-file", help="Newline-separated texts to check parity on (default: synthetic)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh-process loads per format")
+    parser.add_argument("--export", action="store_true", help="Re-export the artifact from the pickle first")
+    args = parser.parse_args()
+
+    with open(TFIDF_VECTORIZER_PATH, "rb") as f:
+        vectorizer = pickle.load(f)
+    if args.export or not (TFIDF_ARTIFACT_DIR / "params.json").exists():
+        export_compact_vectorizer(vectorizer)
+    compact = load_compact_vectorizer()
+
+    if args.texts_file:
+        with open(args.texts_file) as f:
+            texts = [line.rstrip("\n") for line in f]
+    else:
+        texts = synthetic_texts(vectorizer.vocabulary_)
+
+    ok, same_pattern, max_diff = check_parity(vectorizer, compact, texts)
+    print("\n=== Parity ===")
+    print(f"Texts:                {len(texts)}")
+    print(f"Same nonzero pattern: {same_pattern}")
+    print(f"Max abs difference:   {max_diff:.2e}")
+
+    pickle_seconds = time_load(PICKLE_LOAD, args.runs)
+    artifact_seconds = time_load(ARTIFACT_LOAD, args.runs)
+    print("\n=== Startup (median of fresh processes) ===")
+    print(f"Pickle (sklearn):     {pickle_seconds:.3f}s")
+    print(f"Compact artifact:     {artifact_seconds:.3f}s")
+    print(f"Speedup:              {pickle_seconds / artifact_seconds:.1f}x")
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
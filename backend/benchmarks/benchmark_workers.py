@@ -0,0 +1,193 @@
+"""
+Memory and throughput of the API at different gunicorn worker counts, with and without
+preloading the models in the master (backend/gunicorn_conf.py).
+
+For each worker count the server is started, warmed up, and then:
+  - RSS and PSS of the master and every worker are read from /proc/<pid>/smaps_rollup.
+    PSS splits shared pages between the processes sharing them, so total PSS is the real
+    footprint; with preload, per-worker PSS should drop as workers are added.
+  - A fixed number of requests is sent from --concurrency client threads and throughput
+    and p50/p95 latency are reported.
+Linux only (uses /proc). Needs DATABASE_URL for the app's startup.
+
+Usage:
+    python -m backend.benchmarks.benchmark_workers
+    python -m backend.benchmarks.benchmark_workers --workers 1 2 4 8 --compare-no-preload
+    python -m backend.benchmarks.benchmark_workers --path /api/hybrid-match-resume/ --body request.json --requests 200
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import requests
+
+REPO_ROOT = Path(__file__).resolve().parents[2]
+GUNICORN_CONF = REPO_ROOT / "backend" / "gunicorn_conf.py"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def child_pids(pid):
+    """Direct children of pid, found by scanning /proc"""
+    children = []
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        # The ppid follows the parenthesised command name, which may itself contain spaces
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid:
+            children.append(int(entry.name))
+    return children
+
+def memory_mb(pid):
+    """(RSS, PSS) of a process in MB"""
+    values = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+        key, _, rest = line.partition(":")
+        if key in ("Rss", "Pss"):
+            values[key] = int(rest.split()[0]) / 1024
+    return values["Rss"], values["Pss"]
+
+def start_server(app, config, n_workers, port, preload, app_dir):
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(n_workers),
+        "PORT": str(port),
+        "GUNICORN_PRELOAD": "1" if preload else "0",
+    }
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", str(config), "--chdir", str(app_dir), app],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+
+def wait_until_ready(server, base_url, n_workers, timeout):
+    """Wait for the server to answer and for all workers to be forked"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited during startup:\n{server.stderr.read()[-2000:]}")
+        try:
+            if requests.get(f"{base_url}/api/ping", timeout=2).ok and len(child_pids(server.pid)) == n_workers:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server not ready after {timeout}s")
+
+def run_load(base_url, path, body, n_requests, concurrency):
+    """Send n_requests from concurrency threads; returns (requests/sec, latencies, errors)"""
+    per_thread = [n_requests // concurrency + (i < n_requests % concurrency) for i in range(concurrency)]
+
+    def worker(count):
+        latencies, errors = [], 0
+        with requests.Session() as session:
+            for _ in range(count):
+                start = time.perf_counter()
+                try:
+                    if body is None:
+                        response = session.get(base_url + path, timeout=300)
+                    else:
+                        response = session.post(base_url + path, json=body, timeout=300)
+                    errors += not response.ok
+                except requests.RequestException:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(worker, per_thread))
+    elapsed = time.perf_counter() - start
+    latencies = [l for thread_latencies, _ in results for l in thread_latencies]
+    return n_requests / elapsed, latencies, sum(errors for _, errors in results)
+
+def measure(args, n_workers, preload, body):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(args.app, args.config, n_workers, port, preload, args.app_dir)
+    try:
+        wait_until_ready(server, base_url, n_workers, args.startup_timeout)
+        # Warm every worker (first requests pay for lazy imports and connection setup)
+        run_load(base_url, args.path, body, n_workers * args.warmup, n_workers)
+        time.sleep(1)
+
+        master_rss, master_pss = memory_mb(server.pid)
+        workers = [memory_mb(pid) for pid in child_pids(server.pid)]
+        throughput, latencies, errors = run_load(base_url, args.path, body, args.requests, args.concurrency)
+        return {
+            "workers": n_workers,
+            "preload": preload,
+            "master_rss_mb": round(master_rss, 1),
+            "worker_rss_mb": round(float(np.mean([rss for rss, _ in workers])), 1),
+            "worker_pss_mb": round(float(np.mean([pss for _, pss in workers])), 1),
+            "total_pss_mb": round(master_pss + sum(pss for _, pss in workers), 1),
+            "requests_per_sec": round(throughput, 2),
+            "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 1),
+            "p95_ms": round(float(np.percentile(latencies, 95)) * 1000, 1),
+            "errors": errors,
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-worker memory and throughput of the API under gunicorn")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Worker counts to measure")
+    parser.add_argument("--compare-no-preload", action="store_true", help="Also measure with GUNICORN_PRELOAD=0")
+    parser.add_argument("--app", default="backend.app.main:app", help="ASGI app to serve")
+    parser.add_argument("--config", default=str(GUNICORN_CONF), help="Gunicorn config file")
+    parser.add_argument("--app-dir", default=str(REPO_ROOT), help="Directory to run the server from")
+    parser.add_argument("--path", default="/api/ping", help="Endpoint to load")
+    parser.add_argument("--body", help="JSON file to POST to --path (default: GET)")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per measurement")
+    parser.add_argument("--concurrency", type=int, default=16, help="Client threads")
+    parser.add_argument("--warmup", type=int, default=5, help="Warmup requests per worker")
+    parser.add_argument("--startup-timeout", type=float, default=300)
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    body = None
+    if args.body:
+        with open(args.body) as f:
+            body = json.load(f)
+
+    modes = [True, False] if args.compare_no_preload else [True]
+    results = []
+    for preload in modes:
+        for n_workers in args.workers:
+            print(f"Measuring {n_workers} worker(s), preload={preload}...")
+            results.append(measure(args, n_workers, preload, body))
+
+    print("\n=== Workers ===")
+    print(f"{'workers':>7} {'preload':>7} {'master RSS':>10} {'worker RSS':>10} {'worker PSS':>10} {'total PSS':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>6}")
+    for r in results:
+        print(
+            f"{r['workers']:>7} {str(r['preload']):>7} {r['master_rss_mb']:>10.1f} {r['worker_rss_mb']:>10.1f} "
+            f"{r['worker_pss_mb']:>10.1f} {r['total_pss_mb']:>10.1f} {r['requests_per_sec']:>8.1f} "
+            f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['errors']:>6}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"path": args.path, "concurrency": args.concurrency, "results": results}, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+if __name__ == "__main__":
+    main()
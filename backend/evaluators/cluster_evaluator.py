@@ -1,68 +1,127 @@
+import argparse
 import numpy as np 
 from collections import Counter
+from scipy import sparse
 from sklearn.metrics import davies_bouldin_score, silhouette_score, calinski_harabasz_score
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 from backend.app import models
 from backend.app import database
+from backend.app.services.snapshot_store import REDUCED_SNAPSHOT, load_snapshot
 
 def mean_intra_cluster_similarity(embeddings, labels):
     """
     Computes the average cosine similarity between all pairs of points
     within the same cluster.
-    """
-    unique_clusters = [c for c in np.unique(labels)]
-    similarities = []
-
-    for cid in unique_clusters:
-        cluster_points = embeddings[labels == cid]
-
-        # Need at least 2 points to compute similarity
-        if len(cluster_points) < 2:
-            continue
 
-        sim_matrix = cosine_similarity(cluster_points)
+    Uses the identity sum_{i<j} u_i.u_j = (|sum_i u_i|^2 - sum_i |u_i|^2) / 2 on
+    L2-normalized vectors, so only per-cluster sums are needed (O(n*d) time and
+    O(clusters*d) memory) instead of a pairwise similarity matrix per cluster.
+    """
+    normalized = normalize(np.asarray(embeddings, dtype=np.float64))
+    cluster_ids, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+
+    # Sum normalized vectors per cluster with a single sparse indicator product
+    indicator = sparse.csr_matrix(
+        (np.ones(len(inverse)), (inverse, np.arange(len(inverse)))),
+        shape=(len(cluster_ids), len(inverse)),
+    )
+    cluster_sums = indicator @ normalized
+    # Squared norms are 1, or 0 for all-zero vectors (whose cosine similarity is 0)
+    squared_norms = np.bincount(inverse, weights=np.einsum("ij,ij->i", normalized, normalized))
+
+    # Need at least 2 points to compute similarity
+    valid = counts >= 2
+    pair_sums = (np.einsum("ij,ij->i", cluster_sums, cluster_sums) - squared_norms) / 2
+    num_pairs = counts * (counts - 1) / 2
+
+    if not np.any(valid):
+        return float("nan")
 
-        # Take upper triangle without diagonal
-        triu_indices = np.triu_indices_from(sim_matrix, k=1)
-        similarities.extend(sim_matrix[triu_indices])
+    return float(pair_sums[valid].sum() / num_pairs[valid].sum())
 
-    if not similarities:
-        return float("nan")
+def stratified_sample_indices(labels, sample_size, random_state=42):
+    """
+    Sample up to sample_size indices with every cluster represented in proportion
+    to its size (and by at least 2 points when it has them).
+    """
+    labels = np.asarray(labels)
+    if sample_size is None or sample_size >= len(labels):
+        return np.arange(len(labels))
+
+    rng = np.random.default_rng(random_state)
+    fraction = sample_size / len(labels)
+    # Group indices by cluster with one sort instead of a mask per cluster
+    order = np.argsort(labels, kind="stable")
+    _, counts = np.unique(labels, return_counts=True)
+    indices = []
+    for members in np.split(order, np.cumsum(counts)[:-1]):
+        take = min(len(members), max(2, int(round(len(members) * fraction))))
+        indices.append(rng.choice(members, size=take, replace=False))
+
+    return np.sort(np.concatenate(indices))
+
+def sampled_silhouette_score(embeddings, labels, sample_size=50000, random_state=42, n_jobs=-1):
+    """Cosine silhouette score on a stratified sample, with distance chunks computed in parallel"""
+    indices = stratified_sample_indices(labels, sample_size, random_state)
+    return silhouette_score(
+        embeddings[indices], np.asarray(labels)[indices], metric="cosine", n_jobs=n_jobs
+    ), len(indices)
+
+def load_clustered_embeddings(db_session):
+    """
+    Return (reduced embeddings, cluster labels) for clustered postings. Embeddings are read
+    from the reduced-embedding snapshot when one exists; only labels come from the database.
+    """
+    snapshot = load_snapshot(REDUCED_SNAPSHOT)
+    if snapshot is not None:
+        rows = (
+            db_session.query(models.JobPosting.id, models.JobPosting.cluster_id)
+            .filter(models.JobPosting.cluster_id != None)
+            .all()
+        )
+        label_by_id = {r.id: r.cluster_id for r in rows}
+        ids = np.asarray(snapshot.ids)
+        mask = np.isin(ids, list(label_by_id))
+        labels = np.array([label_by_id[int(pid)] for pid in ids[mask]])
+        return np.asarray(snapshot.embeddings[mask], dtype=np.float32), labels
+
+    # Retrieve job postings with their cluster IDs
+    rows = (
+        db_session.query(
+            models.ReducedEmbedding.reduced_embedding,
+            models.JobPosting.cluster_id,
+        )
+        .join(
+            models.JobEmbeddingSBERT,
+            models.JobEmbeddingSBERT.id == models.ReducedEmbedding.job_embedding_id,
+        )
+        .join(
+            models.JobPosting,
+            models.JobPosting.id == models.JobEmbeddingSBERT.job_posting_id,
+        )
+        .filter(models.JobPosting.cluster_id != None)
+        .all()
+    )
+    if not rows:
+        return np.empty((0, 0), dtype=np.float32), np.array([])
 
-    return float(np.mean(similarities))
+    embeddings = np.array([np.asarray(r.reduced_embedding, dtype=np.float32) for r in rows])
+    labels = np.array([r.cluster_id for r in rows])
+    return embeddings, labels
 
-def main():
+def main(silhouette_sample_size=50000, random_state=42, n_jobs=-1):
     # Create new database session instance
     SessionLocal = database.SessionLocal
     db_session = SessionLocal()
 
     # Retrieve job postings and their cluster assignments from database and evaluate cluster quality
     try:
-        # Retrieve job postings with their cluster IDs
-        rows = (
-            db_session.query(
-                models.ReducedEmbedding.reduced_embedding,
-                models.JobPosting.cluster_id,
-            )
-            .join(
-                models.JobEmbeddingSBERT,
-                models.JobEmbeddingSBERT.id == models.ReducedEmbedding.job_embedding_id,
-            )
-            .join(
-                models.JobPosting,
-                models.JobPosting.id == models.JobEmbeddingSBERT.job_posting_id,
-            )
-            .filter(models.JobPosting.cluster_id != None)
-            .all()
-        )
+        embeddings, labels = load_clustered_embeddings(db_session)
 
-        if not rows:
+        if len(labels) == 0:
             print("No clustered job postings found. Nothing to evaluate.")
             return
 
-        embeddings = np.array([np.array(r.reduced_embedding, dtype=float) for r in rows])
-        labels = np.array([r.cluster_id for r in rows])
-
         print(f"Retrieved {len(labels)} clustered job postings for evaluation.")
 
         # Evaluate cluster quality by printing statistical information about clusters
@@ -82,13 +141,15 @@ def main():
             return
         
         dbi = davies_bouldin_score(embeddings, labels)
-        silhouette = silhouette_score(embeddings, labels, metric="cosine")
+        silhouette, silhouette_n = sampled_silhouette_score(
+            embeddings, labels, sample_size=silhouette_sample_size, random_state=random_state, n_jobs=n_jobs
+        )
         chi = calinski_harabasz_score(embeddings, labels)
         intra_sim = mean_intra_cluster_similarity(embeddings, labels)
 
         print("\n=== Clustering Quality Metrics ===")
         print(f"Davies-Bouldin Index: {dbi:.4f}")
-        print(f"Silhouette Score: {silhouette:.4f}")
+        print(f"Silhouette Score: {silhouette:.4f} (stratified sample of {silhouette_n})")
         print(f"Calinski-Harabasz Index: {chi:.2f}")
         print(f"Mean Intra-cluster Cosine Similarity: {intra_sim:.4f}")
 
@@ -98,4 +159,10 @@ def main():
         db_session.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate cluster quality")
+    parser.add_argument("--silhouette-sample-size", type=int, default=50000, help="Stratified sample size for the silhouette score")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for sampling")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Cores for silhouette distance computation")
+    args = parser.parse_args()
+
+    main(silhouette_sample_size=args.silhouette_sample_size, random_state=args.seed, n_jobs=args.n_jobs)
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""
+Hyperparameter sweep for UMAP_PARAMS and HDBSCAN_PARAMS without touching the database tables.
+
+SBERT embeddings are loaded once into a memory-mapped .npy file. Each UMAP configuration
+runs in its own process and its output is reused for every HDBSCAN configuration. Quality
+metrics from the existing evaluators are recorded with runtime and memory in a results table.
+
+Usage:
+    python -m backend.evaluators.hyperparameter_sweep
+    python -m backend.evaluators.hyperparameter_sweep --workers 4 --refresh-embeddings
+"""
+
+import argparse
+import itertools
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from backend.app import database
+from backend.app import models
+from backend.app.config import UMAP_PARAMS, SWEEP_GRID, SWEEP_DIR
+from backend.app.services.snapshot_store import SBERT_SNAPSHOT, load_snapshot, snapshot_dir
+
+EMBEDDINGS_PATH = SWEEP_DIR / "sbert_embeddings.npy"
+
+def expand_grid(grid: dict) -> list[dict]:
+    """Cartesian product of {param: [values]} as a list of override dicts"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+def cache_embeddings(db_session, path=EMBEDDINGS_PATH, refresh=False, batch_size=10000):
+    """
+    Return a memory-mappable .npy of SBERT embeddings: the pipeline's SBERT snapshot when one
+    exists, otherwise a file streamed from the database.
+    """
+    snapshot = load_snapshot(SBERT_SNAPSHOT)
+    if snapshot is not None and snapshot.metadata.get("format") == "npy" and not refresh:
+        print(f"Using SBERT snapshot {snapshot.version}")
+        return snapshot_dir(SBERT_SNAPSHOT, snapshot.version) / "embeddings.npy"
+
+    if path.exists() and not refresh:
+        print(f"Using cached embeddings at {path}")
+        return path
+
+    count = db_session.query(models.JobEmbeddingSBERT).count()
+    if count == 0:
+        raise RuntimeError("No SBERT embeddings found in the database.")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    dim = models.JobEmbeddingSBERT.embedding.type.dim
+    embeddings = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(count, dim))
+
+    rows = (
+        db_session.query(models.JobEmbeddingSBERT.embedding)
+        .order_by(models.JobEmbeddingSBERT.id)
+        .yield_per(batch_size)
+    )
+    for i, row in enumerate(rows):
+        if i >= count:
+            break
+        embeddings[i] = row.embedding
+    embeddings.flush()
+    del embeddings
+
+    print(f"Cached {count} SBERT embeddings to {path}")
+    return path
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_umap_config(embeddings_path, umap_overrides, hdbscan_configs, silhouette_sample_size, random_state, n_jobs=1):
+    """
+    Fit one UMAP configuration and evaluate every HDBSCAN configuration on its output.
+    n_jobs is this process's share of the cores, so parallel configurations don't oversubscribe the CPU.
+    """
+    import umap
+    from sklearn.metrics import davies_bouldin_score, calinski_harabasz_score
+    from backend.evaluators.cluster_evaluator import mean_intra_cluster_similarity, sampled_silhouette_score
+    from backend.evaluators.reduction_evaluator import evaluate_reduction_quality
+    from backend.pipelines.steps.cluster_jobs import cluster_jobs_hdbscan, assign_outliers_with_knn
+
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+
+    start = time.perf_counter()
+    reducer = umap.UMAP(**{**UMAP_PARAMS, **umap_overrides, "verbose": False, "n_jobs": n_jobs})
+    reduced = reducer.fit_transform(embeddings)
+    umap_seconds = time.perf_counter() - start
+    umap_peak_mb = peak_rss_mb()
+
+    trust = evaluate_reduction_quality(embeddings, reduced, f"UMAP {umap_overrides}", sample_size=5000, random_state=random_state)
+
+    results = []
+    for hdbscan_overrides in hdbscan_configs:
+        tracemalloc.start()
+        start = time.perf_counter()
+        labels, _ = cluster_jobs_hdbscan(reduced, **hdbscan_overrides, prediction_data=False, core_dist_n_jobs=n_jobs)
+        num_outliers = int(np.sum(labels == -1))
+        labels = assign_outliers_with_knn(reduced, labels, n_jobs=n_jobs)
+        hdbscan_seconds = time.perf_counter() - start
+        _, hdbscan_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        num_clusters = len(set(labels)) - (1 if -1 in labels else 0)
+        result = {
+            **{f"umap_{k}": v for k, v in umap_overrides.items()},
+            **{f"hdbscan_{k}": v for k, v in hdbscan_overrides.items()},
+            "num_clusters": num_clusters,
+            "outlier_fraction": round(num_outliers / len(labels), 4),
+            "trustworthiness": round(float(trust), 4),
+            "umap_seconds": round(umap_seconds, 2),
+            "hdbscan_seconds": round(hdbscan_seconds, 2),
+            "umap_peak_rss_mb": round(umap_peak_mb, 1),
+            "hdbscan_peak_alloc_mb": round(hdbscan_peak / (1024 * 1024), 1),
+        }
+
+        if num_clusters >= 2:
+            silhouette, _ = sampled_silhouette_score(
+                reduced, labels, sample_size=silhouette_sample_size, random_state=random_state, n_jobs=1
+            )
+            result.update(
+                davies_bouldin=round(float(davies_bouldin_score(reduced, labels)), 4),
+                silhouette=round(float(silhouette), 4),
+                calinski_harabasz=round(float(calinski_harabasz_score(reduced, labels)), 2),
+                mean_intra_similarity=round(mean_intra_cluster_similarity(reduced, labels), 4),
+            )
+        results.append(result)
+
+    return results
+
+def run_sweep(grid=SWEEP_GRID, max_workers=None, refresh_embeddings=False, silhouette_sample_size=20000, random_state=42):
+    SessionLocal = database.SessionLocal
+    db_session = SessionLocal()
+    try:
+        embeddings_path = cache_embeddings(db_session, refresh=refresh_embeddings)
+    finally:
+        db_session.close()
+
+    umap_configs = expand_grid(grid["umap"])
+    hdbscan_configs = expand_grid(grid["hdbscan"])
+    print(f"Sweeping {len(umap_configs)} UMAP x {len(hdbscan_configs)} HDBSCAN configurations...")
+
+    # Split the cores between the configurations that run at the same time
+    cpu_count = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers or cpu_count, len(umap_configs)))
+    n_jobs = max(1, cpu_count // max_workers)
+
+    results = []
+    # One process per UMAP configuration so peak RSS is measured per configuration
+    with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=1) as executor:
+        futures = {
+            executor.submit(
+                run_umap_config, embeddings_path, umap_overrides, hdbscan_configs,
+                silhouette_sample_size, random_state, n_jobs,
+            ): umap_overrides
+            for umap_overrides in umap_configs
+        }
+        for future in as_completed(futures):
+            try:
+                results.extend(future.result())
+                print(f"Finished UMAP config {futures[future]}")
+            except Exception as e:
+                print(f"UMAP config {futures[future]} failed: {e}")
+
+    results_df = pd.DataFrame(results)
+    if not results_df.empty and "silhouette" in results_df:
+        results_df = results_df.sort_values("silhouette", ascending=False)
+
+    SWEEP_DIR.mkdir(parents=True, exist_ok=True)
+    results_path = SWEEP_DIR / f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    results_df.to_csv(results_path, index=False)
+
+    print("\n=== Sweep Results ===")
+    print(results_df.to_string(index=False))
+    print(f"\nResults written to {results_path}")
+    return results_df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep UMAP and HDBSCAN hyperparameters")
+    parser.add_argument("--workers", type=int, help="Parallel UMAP configurations (default: CPU count)")
+    parser.add_argument("--refresh-embeddings", action="store_true", help="Re-export SBERT embeddings from the database")
+    parser.add_argument("--silhouette-sample-size", type=int, default=20000, help="Stratified sample size for the silhouette score")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for sampling")
+    args = parser.parse_args()
+
+    run_sweep(
+        max_workers=args.workers,
+        refresh_embeddings=args.refresh_embeddings,
+        silhouette_sample_size=args.silhouette_sample_size,
+        random_state=args.seed,
+    )
@@ -1,72 +1,155 @@
 from backend.app import models
 from sklearn.manifold import trustworthiness as calc_trustworthiness
+from sqlalchemy import func, select
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import numpy as np
 
 from backend.app import database
+from backend.app.services.snapshot_store import SBERT_SNAPSHOT, REDUCED_SNAPSHOT, load_snapshot
 
-def evaluate_reduction_quality(original_embeddings, reduced_embeddings, method_name, sample_size=5000):
+def evaluate_reduction_quality(original_embeddings, reduced_embeddings, method_name, sample_size=5000, random_state=None):
     """
-    Evaluate on a random sample to avoid memory issues
+    Evaluate on a random sample to avoid memory issues (seeded by random_state for reproducible scores)
     """
     # Convert to numpy arrays
-    original_embeddings = np.array(original_embeddings)
-    reduced_embeddings = np.array(reduced_embeddings)
+    original_embeddings = np.asarray(original_embeddings)
+    reduced_embeddings = np.asarray(reduced_embeddings)
 
     if len(original_embeddings) > sample_size:
         print(f"Sampling {sample_size} embeddings for trustworthiness calculation...")
-        indices = np.random.choice(len(original_embeddings), sample_size, replace=False)
+        indices = np.random.default_rng(random_state).choice(len(original_embeddings), sample_size, replace=False)
         original_sample = original_embeddings[indices]
         reduced_sample = reduced_embeddings[indices]
     else:
         original_sample = original_embeddings
         reduced_sample = reduced_embeddings
-    
+
     trust_score = calc_trustworthiness(original_sample, reduced_sample)
     print(f"Trustworthiness of {method_name}: {trust_score:.4f} (evaluated on {len(original_sample)} samples)")
+    return trust_score
+
+def _trustworthiness_for_size(args):
+    original_embeddings, reduced_embeddings, size = args
+    return size, calc_trustworthiness(original_embeddings[:size], reduced_embeddings[:size])
+
+def trustworthiness_at_sizes(original_embeddings, reduced_embeddings, sample_sizes, max_workers=None):
+    """
+    Compute trustworthiness on nested prefixes of an already shuffled sample,
+    one process per sample size. Returns {sample_size: score}.
+    """
+    sizes = sorted({min(size, len(original_embeddings)) for size in sample_sizes})
+    tasks = [(original_embeddings, reduced_embeddings, size) for size in sizes]
+
+    with ProcessPoolExecutor(max_workers=max_workers or len(sizes)) as executor:
+        return dict(executor.map(_trustworthiness_for_size, tasks))
+
+def fetch_sampled_pairs(db_session, sample_size, reduction_method="UMAP", random_state=None):
+    """
+    Sample job embedding ids in the database, then fetch only the (original, reduced)
+    pairs for that sample in one joined query, decoded straight into float32 arrays.
+    """
+    if random_state is not None:
+        # Make ORDER BY random() reproducible for this session
+        db_session.execute(select(func.setseed((random_state % 1000) / 1000.0)))
+
+    sample_ids = [
+        row.job_embedding_id
+        for row in db_session.query(models.ReducedEmbedding.job_embedding_id)
+        .filter(models.ReducedEmbedding.reduction_method == reduction_method)
+        .order_by(func.random())
+        .limit(sample_size)
+        .all()
+    ]
+    if not sample_ids:
+        return np.empty((0, 0), dtype=np.float32), np.empty((0, 0), dtype=np.float32)
+
+    rows = (
+        db_session.query(
+            models.JobEmbeddingSBERT.embedding,
+            models.ReducedEmbedding.reduced_embedding,
+        )
+        .join(
+            models.ReducedEmbedding,
+            models.ReducedEmbedding.job_embedding_id == models.JobEmbeddingSBERT.id,
+        )
+        .filter(
+            models.ReducedEmbedding.reduction_method == reduction_method,
+            models.ReducedEmbedding.job_embedding_id.in_(sample_ids),
+        )
+        .all()
+    )
 
-def main():
+    original = np.empty((len(rows), len(rows[0].embedding)), dtype=np.float32)
+    reduced = np.empty((len(rows), len(rows[0].reduced_embedding)), dtype=np.float32)
+    for i, row in enumerate(rows):
+        original[i] = row.embedding
+        reduced[i] = row.reduced_embedding
+
+    # Rows come back in index order; shuffle so every prefix is a random subsample
+    order = np.random.default_rng(random_state).permutation(len(rows))
+    return original[order], reduced[order]
+
+def sample_pairs_from_snapshots(sample_size, random_state=None):
+    """
+    Sample aligned (original, reduced) pairs from the memory-mapped SBERT and reduced
+    snapshots. Returns None when either snapshot is missing.
+    """
+    sbert = load_snapshot(SBERT_SNAPSHOT)
+    reduced = load_snapshot(REDUCED_SNAPSHOT)
+    if sbert is None or reduced is None:
+        return None
+
+    rng = np.random.default_rng(random_state)
+    reduced_ids = np.asarray(reduced.ids)
+    sample = rng.choice(len(reduced_ids), size=min(sample_size, len(reduced_ids)), replace=False)
+
+    # Locate each sampled posting in the SBERT snapshot
+    sbert_ids = np.asarray(sbert.ids)
+    order = np.argsort(sbert_ids)
+    positions = np.searchsorted(sbert_ids, reduced_ids[sample], sorter=order)
+    positions = np.clip(positions, 0, len(order) - 1)
+    sbert_rows = order[positions]
+    found = sbert_ids[sbert_rows] == reduced_ids[sample]
+
+    original = np.asarray(sbert.embeddings[sbert_rows[found]], dtype=np.float32)
+    reduced_sample = np.asarray(reduced.embeddings[sample[found]], dtype=np.float32)
+    return original, reduced_sample
+
+def main(sample_sizes=(10000,), random_state=42, max_workers=None):
     # Create new database session instance
     SessionLocal = database.SessionLocal
     db_session = SessionLocal()
 
-    # Retrieve reduced embeddings from database and evaluate quality
+    # Retrieve a sample of aligned original/reduced embeddings from database and evaluate quality
     try:
-        # First retrieve id and embedding for all job embeddings in database (nonreduced)
-        job_embeddings = db_session.query(models.JobEmbeddingSBERT).all()
-        job_embedding_ids = [je.id for je in job_embeddings]
-        job_embeddings_embeddings = [je.embedding for je in job_embeddings]
-
-        # Retrieve reduced embeddings for UMAP, ordered by job_embedding_id
-        umap_reduced = db_session.query(models.ReducedEmbedding)\
-            .filter(models.ReducedEmbedding.reduction_method == "UMAP")\
-            .order_by(models.ReducedEmbedding.job_embedding_id)\
-            .all()
-        print(f"Retrieved {len(umap_reduced)} UMAP reduced embeddings")
-        
-
-        # Create dictionaries for alignment
-        umap_dict = {ur.job_embedding_id: ur.reduced_embedding for ur in umap_reduced}
-
-        # Align reduced embeddings with original embeddings
-        umap_aligned = []
-        original_aligned = []
-        
-        for je_id, orig_emb in zip(job_embedding_ids, job_embeddings_embeddings):
-            if je_id in umap_dict:
-                original_aligned.append(orig_emb)
-                umap_aligned.append(umap_dict[je_id])
-        
-        original_aligned = np.array(original_aligned)
-        umap_aligned = np.array(umap_aligned)
-        
-        print(f"\nAligned {len(original_aligned)} embeddings for evaluation")
-
-        # Evaluate reduction quality of each method
-        evaluate_reduction_quality(original_aligned, umap_aligned, "UMAP", sample_size=10000)
+        # Prefer the local snapshots; fall back to sampling in the database
+        pairs = sample_pairs_from_snapshots(max(sample_sizes), random_state=random_state)
+        if pairs is None:
+            pairs = fetch_sampled_pairs(
+                db_session, max(sample_sizes), reduction_method="UMAP", random_state=random_state
+            )
+        original_sample, umap_sample = pairs
+        print(f"\nFetched {len(original_sample)} aligned UMAP embedding pairs for evaluation")
+
+        if len(original_sample) == 0:
+            print("No reduced embeddings found. Nothing to evaluate.")
+            return
+
+        # Evaluate reduction quality at each sample size
+        scores = trustworthiness_at_sizes(original_sample, umap_sample, sample_sizes, max_workers=max_workers)
+        for size, score in scores.items():
+            print(f"Trustworthiness of UMAP: {score:.4f} (evaluated on {size} samples)")
     except Exception as e:
         print("Exception evaluating reduction quality:", e)
     finally:
         db_session.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Evaluate dimensionality reduction quality")
+    parser.add_argument("--sample-sizes", type=int, nargs="+", default=[10000], help="Sample sizes to compute trustworthiness at")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for sampling")
+    parser.add_argument("--workers", type=int, help="Processes for computing sample sizes in parallel")
+    args = parser.parse_args()
+
+    main(sample_sizes=args.sample_sizes, random_state=args.seed, max_workers=args.workers)
@@ -0,0 +1,62 @@
+"""
+Gunicorn config for running the API with several uvicorn workers that share one copy of
+the read-only models (SBERT, TF-IDF artifact, skills map and PhraseMatcher).
+
+The app and its models are loaded in the master before forking, so workers share those
+pages copy-on-write. GC is kept off the preloaded objects so collections in the workers
+don't write to (and copy) the shared pages.
+
+Metrics use prometheus_client multiprocess mode: every worker writes its samples to
+PROMETHEUS_MULTIPROC_DIR, so /api/metrics reports totals across all workers.
+
+Usage:
+    WEB_CONCURRENCY=4 gunicorn -c backend/gunicorn_conf.py backend.app.main:app
+"""
+
+import gc
+import os
+import shutil
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+# Set GUNICORN_PRELOAD=0 to load the models separately in every worker (for comparison)
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+# LLM calls in the match endpoints can take well over the 30s default
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+# Must be set before the app (and prometheus_client) is imported. Emptied at startup so
+# samples from a previous server are not counted.
+metrics_dir = os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/job_match_metrics")
+shutil.rmtree(metrics_dir, ignore_errors=True)
+os.makedirs(metrics_dir, exist_ok=True)
+
+if preload_app:
+    # Avoid freed holes in the pages the workers will share (see the gc.freeze docs)
+    gc.disable()
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before the first fork
+    if not preload_app:
+        return
+    from backend.app.main import preload_models
+    preload_models()
+    gc.freeze()
+    server.log.info(f"Preloaded models, froze {gc.get_freeze_count()} objects")
+
+def post_fork(server, worker):
+    gc.enable()
+
+    # Connections opened in the master while preloading must not be shared with workers
+    from backend.app import database
+    database.engine.dispose(close=False)
+
+    # Split the CPU between workers instead of every worker's torch using every core
+    threads = int(os.getenv("TORCH_THREADS_PER_WORKER", "0")) or max(1, (os.cpu_count() or 1) // workers)
+    import torch
+    torch.set_num_threads(threads)
+
+def child_exit(server, worker):
+    # Drop the dead worker's live gauges; its counters and histograms stay in the totals
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
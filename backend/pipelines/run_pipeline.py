@@ -3,60 +3,357 @@ from backend.pipelines.steps import (
     reduce_dimension_jobs,
     cluster_jobs,
     generate_job_descriptions,
-    embed_clusters
+    embed_clusters,
+    build_skill_matcher,
 )
 import backend.app.database as database
-from typing import Optional
+import backend.app.models as models
+from backend.app.config import (
+    ARTIFACTS_DIR,
+    EMBEDDING_MODEL,
+    UMAP_PARAMS,
+    UMAP_MODEL_PATH,
+    HDBSCAN_PARAMS,
+    HDBSCAN_MODEL_PATH,
+    TFIDF_VECTORIZER_PATH,
+    TFIDF_ARTIFACT_DIR,
+    SNAPSHOTS_DIR,
+)
+from backend.app.matcher.keyword_feedback import skills_table_hash, skill_matcher_exists
+from backend.app.services.snapshot_store import SBERT_SNAPSHOT, REDUCED_SNAPSHOT, wait_for_fills
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from sqlalchemy import func, select
+from typing import Callable, Optional
 import argparse
+import hashlib
+import json
+import resource
+import sys
+import threading
+import time
+
+PIPELINE_STATE_PATH = ARTIFACTS_DIR / "pipeline_state.json"
+PIPELINE_REPORTS_DIR = ARTIFACTS_DIR / "pipeline_runs"
+SBERT_SNAPSHOT_POINTER = SNAPSHOTS_DIR / SBERT_SNAPSHOT / "LATEST"
+REDUCED_SNAPSHOT_POINTER = SNAPSHOTS_DIR / REDUCED_SNAPSHOT / "LATEST"
+# load_vectorizer prefers the compact artifact (terms.npy is absent for the hashing variant) over the pickle
+TFIDF_ARTIFACTS = [TFIDF_ARTIFACT_DIR / "params.json", TFIDF_ARTIFACT_DIR / "idf.npy", TFIDF_ARTIFACT_DIR / "terms.npy", TFIDF_VECTORIZER_PATH]
+
+@dataclass
+class TableInput:
+    """A table a step reads or writes, fingerprinted by row count, max id and optional non-null column counts"""
+    model: type
+    non_null: tuple[str, ...] = ()
+
+@dataclass
+class PipelineStep:
+    name: str
+    func: Callable
+    depends_on: list[str] = field(default_factory=list)
+    input_tables: list[TableInput] = field(default_factory=list)
+    output_tables: list[TableInput] = field(default_factory=list)
+    input_artifacts: list[Path] = field(default_factory=list)
+    output_artifacts: list[Path] = field(default_factory=list)
+    params: dict = field(default_factory=dict)  # Model versions and hyperparameters
+    pending: Optional[Callable] = None  # Returns the amount of outstanding work; never skipped while > 0
+    fills: tuple[str, ...] = ()  # Snapshots whose background database fill must succeed for the step to count
 
 PIPELINE_STEPS = [
-    ("Embed Jobs", embed_jobs.run),
-    ("Reduce Dimensions", reduce_dimension_jobs.run),
-    ("Cluster Jobs", cluster_jobs.run),
-    ("Generate Job Descriptions", generate_job_descriptions.run),
-    ("Embed Clusters", embed_clusters.run)
+    PipelineStep(
+        "Embed Jobs (SBERT)", embed_jobs.run_sbert,
+        input_tables=[TableInput(models.JobPosting, non_null=("desc_sbert",))],
+        output_tables=[TableInput(models.JobEmbeddingSBERT)],
+        output_artifacts=[SBERT_SNAPSHOT_POINTER],
+        params={"embedding_model": EMBEDDING_MODEL},
+        fills=(SBERT_SNAPSHOT,),
+    ),
+    PipelineStep(
+        "Embed Jobs (TF-IDF)", embed_jobs.run_tfidf,
+        input_tables=[TableInput(models.JobPosting, non_null=("desc_tfidf",))],
+        output_tables=[TableInput(models.JobEmbeddingTFIDF)],
+        input_artifacts=TFIDF_ARTIFACTS,
+    ),
+    PipelineStep(
+        "Reduce Dimensions", reduce_dimension_jobs.run,
+        depends_on=["Embed Jobs (SBERT)"],
+        input_tables=[TableInput(models.JobEmbeddingSBERT)],
+        output_tables=[TableInput(models.ReducedEmbedding)],
+        input_artifacts=[SBERT_SNAPSHOT_POINTER, UMAP_MODEL_PATH],
+        output_artifacts=[REDUCED_SNAPSHOT_POINTER, UMAP_MODEL_PATH],
+        params={"umap_params": UMAP_PARAMS},
+        fills=(REDUCED_SNAPSHOT,),
+    ),
+    PipelineStep(
+        "Cluster Jobs", cluster_jobs.run,
+        depends_on=["Reduce Dimensions"],
+        output_tables=[TableInput(models.Cluster), TableInput(models.JobPosting, non_null=("cluster_id",))],
+        input_artifacts=[REDUCED_SNAPSHOT_POINTER, HDBSCAN_MODEL_PATH],
+        output_artifacts=[HDBSCAN_MODEL_PATH],
+        params={"hdbscan_params": HDBSCAN_PARAMS},
+    ),
+    PipelineStep(
+        "Generate Job Descriptions", generate_job_descriptions.run,
+        depends_on=["Cluster Jobs"],
+        input_tables=[TableInput(models.JobPosting, non_null=("cluster_id",)), TableInput(models.Cluster)],
+        output_tables=[TableInput(models.Cluster, non_null=("title", "general_job_desc_tfidf", "general_job_desc_sbert"))],
+        pending=lambda db_session: db_session.query(models.Cluster).filter(models.Cluster.title.is_(None)).count(),
+    ),
+    PipelineStep(
+        "Embed Clusters", embed_clusters.run,
+        depends_on=["Generate Job Descriptions", "Embed Jobs (TF-IDF)"],
+        input_tables=[TableInput(models.Cluster, non_null=("general_job_desc_tfidf", "general_job_desc_sbert"))],
+        output_tables=[TableInput(models.ClusterEmbeddingTFIDF), TableInput(models.ClusterEmbeddingSBERT)],
+        input_artifacts=TFIDF_ARTIFACTS,
+        params={"embedding_model": EMBEDDING_MODEL},
+    ),
+    PipelineStep(
+        "Build Skill Matcher", build_skill_matcher.run,
+        input_tables=[TableInput(models.Skill)],
+        # Artifacts are keyed by skills table hash; rebuild whenever the current one is missing
+        pending=lambda db_session: 0 if skill_matcher_exists(skills_table_hash(db_session)) else 1,
+    ),
 ]
 
-def run_pipeline(step_name: Optional[str] = None):
-    # Create new database session instance
+# Names accepted by --step that expand to several steps
+STEP_ALIASES = {
+    "Embed Jobs": ["Embed Jobs (SBERT)", "Embed Jobs (TF-IDF)"],
+}
+
+def fingerprint_table(db_session, table_input: TableInput) -> dict:
+    table = table_input.model.__table__
+    columns = [func.count(), func.max(table.c.id)]
+    columns += [func.count(table.c[col]) for col in table_input.non_null]
+    row = db_session.execute(select(*columns).select_from(table)).one()
+
+    fingerprint = {"row_count": row[0], "max_id": row[1]}
+    for col, count in zip(table_input.non_null, row[2:]):
+        fingerprint[f"{col}_count"] = count
+    return fingerprint
+
+def fingerprint_artifact(path: Path) -> Optional[dict]:
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def fingerprint_step(db_session, step: PipelineStep) -> dict:
+    """Fingerprint everything a step reads and writes, so an unchanged step can be skipped"""
+    tables = {}
+    for table_input in step.input_tables + step.output_tables:
+        key = table_input.model.__tablename__
+        if table_input.non_null:
+            key += ":" + ",".join(table_input.non_null)
+        tables[key] = fingerprint_table(db_session, table_input)
+
+    # Keyed by path, not file name: several artifacts are called LATEST
+    artifacts = {
+        str(path): fingerprint_artifact(path)
+        for path in step.input_artifacts + step.output_artifacts
+    }
+    params_hash = hashlib.sha256(json.dumps(step.params, sort_keys=True, default=str).encode()).hexdigest()
+
+    return {"tables": tables, "artifacts": artifacts, "params": params_hash}
+
+def rows_processed(before: dict, after: dict, step: PipelineStep) -> int:
+    """
+    Rows added or newly populated by a step: the largest row count or non-null count delta
+    over its output tables. Not the sum, since one processed record usually fills several
+    columns or tables (a described cluster gets a title and both descriptions).
+    """
+    processed = 0
+    for table_input in step.output_tables:
+        key = table_input.model.__tablename__
+        if table_input.non_null:
+            key += ":" + ",".join(table_input.non_null)
+        for metric, value in after["tables"][key].items():
+            if metric == "max_id":
+                continue
+            processed = max(processed, (value or 0) - (before["tables"][key].get(metric) or 0))
+    return processed
+
+def load_state() -> dict:
+    if not PIPELINE_STATE_PATH.exists():
+        return {}
+    with open(PIPELINE_STATE_PATH) as f:
+        return json.load(f)
+
+def save_state(state: dict):
+    PIPELINE_STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(PIPELINE_STATE_PATH, "w") as f:
+        json.dump(state, f, indent=2, default=str)
+
+def current_rss_mb() -> float:
+    """Current resident set size in MB (Linux), falling back to the process peak elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class RSSSampler:
+    """Samples process RSS in the background to find the peak while a step runs"""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+def run_step(step: PipelineStep, state: dict, force: bool) -> dict:
+    """Run one step in its own session, skipping it when its fingerprint matches the last successful run"""
     SessionLocal = database.SessionLocal
     db_session = SessionLocal()
+    result = {"step": step.name}
+
+    try:
+        before = fingerprint_step(db_session, step)
+        pending = step.pending(db_session) if step.pending else 0
+
+        if not force and not pending and state.get(step.name) == before:
+            print(f"Skipping step (inputs unchanged): {step.name}")
+            result.update(status="skipped", wall_seconds=0.0, rows_processed=0)
+            return result
+
+        print(f"Running step: {step.name}")
+        with RSSSampler() as sampler:
+            start = time.perf_counter()
+            # Steps close the session they are given, so pass a dedicated one
+            step.func(SessionLocal())
+            wall_seconds = time.perf_counter() - start
+
+        db_session.expire_all()
+        after = fingerprint_step(db_session, step)
+        result.update(
+            status="completed",
+            wall_seconds=round(wall_seconds, 3),
+            rows_processed=rows_processed(before, after, step),
+            peak_rss_mb=round(sampler.peak_mb, 1),
+            fingerprint=after,
+        )
+        print(f"Completed: {step.name} ({wall_seconds:.1f}s)")
+    except Exception as e:
+        print(f"Pipeline failed at step: {step.name}")
+        print(f"Error: {e}")
+        result.update(status="failed", error=str(e))
+    finally:
+        db_session.close()
+
+    return result
+
+def resolve_steps(step_name: Optional[str]) -> list[PipelineStep]:
+    if not step_name:
+        return PIPELINE_STEPS
 
-    # If a specific step is provided, run only that step
-    if step_name:
-        step_func = dict(PIPELINE_STEPS).get(step_name)
-        if not step_func:
-            print(f"Step '{step_name}' not found in pipeline.")
-            return
-        
-        # Try to run the specified step and catch any exceptions
-        try:
-            step_func(db_session)
-        except Exception as e:
-            print(f"Pipeline failed at step: {step_name}")
-            print(f"Error: {e}")
-        else:
-            print(f"Completed: {step_name}")
+    names = STEP_ALIASES.get(step_name, [step_name])
+    steps = [s for s in PIPELINE_STEPS if s.name in names]
+    if len(steps) != len(names):
+        return []
+    return steps
+
+def run_pipeline(step_name: Optional[str] = None, force: bool = False, max_workers: int = 2, report_path: Optional[str] = None):
+    steps = resolve_steps(step_name)
+    if not steps:
+        print(f"Step '{step_name}' not found in pipeline.")
         return
 
-    # Run all steps in sequence if no specific step is provided
-    for step_name, step_func in PIPELINE_STEPS:
-        print(f"Running step: {step_name}")
+    state = load_state()
+    selected = {s.name for s in steps}
+    # Dependencies outside the selection are assumed satisfied
+    remaining = {s.name: [d for d in s.depends_on if d in selected] for s in steps}
+    step_map = {s.name: s for s in steps}
+    results = {}
+    run_started = datetime.now(timezone.utc)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while remaining or running:
+            # Submit every step whose dependencies have finished
+            for name in list(remaining):
+                deps = remaining[name]
+                if any(results.get(d, {}).get("status") in ("failed", "blocked") for d in deps):
+                    results[name] = {"step": name, "status": "blocked"}
+                    print(f"Not running {name}: an upstream step failed.")
+                    del remaining[name]
+                elif all(d in results for d in deps):
+                    running[executor.submit(run_step, step_map[name], state, force)] = name
+                    del remaining[name]
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                result = future.result()
+                results[name] = result
+                if result["status"] == "completed":
+                    state[name] = result.pop("fingerprint")
+                    save_state(state)
+
+    # Steps write snapshots first and fill their tables in the background; once the fills
+    # finish, refresh the saved fingerprints so the next run sees the filled tables.
+    # A step whose fill failed is marked failed and forgets its state, so it runs again.
+    fill_errors = wait_for_fills()
+    for step in steps:
+        errors = [f"{name} fill: {fill_errors[name]}" for name in step.fills if name in fill_errors]
+        if errors and results[step.name]["status"] == "completed":
+            results[step.name].update(status="failed", error="; ".join(errors))
+            state.pop(step.name, None)
+            print(f"Database fill failed for step: {step.name}")
+
+    completed = [s for s in steps if results[s.name]["status"] == "completed"]
+    db_session = database.SessionLocal()
+    try:
+        for step in completed:
+            state[step.name] = fingerprint_step(db_session, step)
+        save_state(state)
+    finally:
+        db_session.close()
+
+    report = {
+        "started_at": run_started.isoformat(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "forced": force,
+        "steps": [results[s.name] for s in steps],
+    }
+
+    if report_path:
+        report_file = Path(report_path)
+    else:
+        report_file = PIPELINE_REPORTS_DIR / f"run_{run_started.strftime('%Y%m%dT%H%M%SZ')}.json"
+    report_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_file, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Run report written to {report_file}")
 
-        # Run the step and catch any exceptions to prevent the entire pipeline from crashing
-        try:
-            step_func(db_session)
-        except Exception as e:
-            print(f"Pipeline failed at step: {step_name}")
-            print(f"Error: {e}")
-            break
-        else:
-            print(f"Completed: {step_name}")
+    return report
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run CareerAlign pipeline")
     parser.add_argument("--step", type=str, help="Run a specific pipeline step")
+    parser.add_argument("--force", action="store_true", help="Run steps even if their inputs are unchanged")
+    parser.add_argument("--workers", type=int, default=2, help="Maximum number of independent steps to run in parallel")
+    parser.add_argument("--report", type=str, help="Path for the JSON run report (default: artifacts/pipeline_runs/)")
 
     args = parser.parse_args()
 
-    run_pipeline(step_name=args.step)
\ No newline at end of file
+    run_pipeline(step_name=args.step, force=args.force, max_workers=args.workers, report_path=args.report)
@@ -0,0 +1,18 @@
+from backend.app.matcher.keyword_feedback import build_skill_matcher, skills_table_hash, skill_matcher_exists
+from backend.app import models
+
+def run(db_session):
+    # Prebuild the PhraseMatcher and skill metadata so API workers load them instead of rebuilding
+    try:
+        table_hash = skills_table_hash(db_session)
+        if skill_matcher_exists(table_hash):
+            print(f"Skill matcher artifact for skills table {table_hash} already exists.")
+        else:
+            build_skill_matcher(db_session, models)
+
+    except Exception as e:
+        print("Exception building skill matcher artifact:", e)
+        raise
+
+    finally:
+        db_session.close()
@@ -1,23 +1,36 @@
 from git import db
+import pickle
 import hdbscan 
-from backend.app.config import HDBSCAN_PARAMS 
+from backend.app.config import HDBSCAN_PARAMS, HDBSCAN_MODEL_PATH, KNN_PARAMS
 import backend.app.database as database
 import backend.app.models as models
+from backend.pipelines.steps.reduce_dimension_jobs import ensure_reduced_snapshot
 from collections import Counter
 from sklearn.neighbors import NearestNeighbors
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np 
 
-def cluster_jobs_hdbscan(reduced_embeddings): 
+def cluster_jobs_hdbscan(reduced_embeddings, **param_overrides): 
     if len(reduced_embeddings) == 0: 
-        return np.array([]) 
+        return np.array([]), None
 
     # Cluster the reduced embeddings using HDBSCAN 
-    clusterer = hdbscan.HDBSCAN(**HDBSCAN_PARAMS) 
+    clusterer = hdbscan.HDBSCAN(**{**HDBSCAN_PARAMS, **param_overrides}) 
     clusterer.fit(reduced_embeddings) 
-    return clusterer.labels_  # Return the cluster labels assigned to each job 
+    return clusterer.labels_, clusterer  # Return the cluster labels assigned to each job and the fitted model
 
-def assign_outliers_with_knn(embeddings, labels):
+def nearest_cluster_labels(reference_embeddings, reference_labels, query_embeddings, **param_overrides):
+    """
+    Return the label of the nearest reference embedding for each query embedding.
+    Uses a KD-tree queried in parallel (see KNN_PARAMS).
+    """
+    nn = NearestNeighbors(n_neighbors=1, metric="euclidean", **{**KNN_PARAMS, **param_overrides})
+    nn.fit(reference_embeddings)
+
+    distances, indices = nn.kneighbors(query_embeddings)
+    return reference_labels[indices.flatten()]
+
+def assign_outliers_with_knn(embeddings, labels, **param_overrides):
     """
     Replace HDBSCAN outlier labels (-1) with the label of the nearest
     non-outlier embedding.
@@ -33,15 +46,10 @@ def assign_outliers_with_knn(embeddings, labels):
     if not np.any(outlier_mask) or not np.any(clustered_mask):
         return labels
 
-    # Fit nearest neighbors on clustered points only
-    nn = NearestNeighbors(n_neighbors=1, metric="euclidean")
-    nn.fit(embeddings[clustered_mask])
-
     # Find nearest clustered point for each outlier
-    distances, indices = nn.kneighbors(embeddings[outlier_mask])
-
-    # Map indices back to cluster labels
-    nearest_labels = labels[clustered_mask][indices.flatten()]
+    nearest_labels = nearest_cluster_labels(
+        embeddings[clustered_mask], labels[clustered_mask], embeddings[outlier_mask], **param_overrides
+    )
 
     # Replace -1 labels
     new_labels = labels.copy()
@@ -49,8 +57,49 @@ def assign_outliers_with_knn(embeddings, labels):
 
     return new_labels
 
-def update_cluster_counts(db_session, cluster_labels):
+def save_clusterer(clusterer, labels, path=HDBSCAN_MODEL_PATH):
+    """
+    Persist the fitted HDBSCAN model together with the final (outlier-reassigned)
+    labels of its training points, which back the KNN fallback for new postings.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump({"clusterer": clusterer, "labels": np.asarray(labels)}, f)
+    print(f"Saved HDBSCAN clusterer to {path}")
+
+def load_clusterer(path=HDBSCAN_MODEL_PATH):
+    """Load the persisted HDBSCAN model bundle, or None if it has not been fitted yet"""
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def predict_new_clusters(clusterer_bundle, embeddings):
+    """
+    Label new reduced embeddings with the persisted HDBSCAN model.
+    Points predicted as noise fall back to the label of the nearest training point.
+    """
+    clusterer = clusterer_bundle["clusterer"]
+    train_labels = clusterer_bundle["labels"]
+    embeddings = np.asarray(embeddings)
+
+    labels, _ = hdbscan.approximate_predict(clusterer, embeddings)
+    labels = np.asarray(labels)
+
+    outlier_mask = labels == -1
+    clustered_mask = train_labels != -1
+    if np.any(outlier_mask) and np.any(clustered_mask):
+        train_embeddings = np.asarray(clusterer._raw_data)
+        labels = labels.copy()
+        labels[outlier_mask] = nearest_cluster_labels(
+            train_embeddings[clustered_mask], train_labels[clustered_mask], embeddings[outlier_mask]
+        )
+
+    return labels
+
+def update_cluster_counts(db_session, cluster_labels, incremental=False):
     # Update DB with cluster information
+    # When incremental, counts are added to the existing totals instead of replacing them
     # Count postings by cluster
     cluster_counts = Counter(
         label for label in cluster_labels if label != -1
@@ -64,7 +113,10 @@ def update_cluster_counts(db_session, cluster_labels):
     try:
         for cid, count in cluster_counts.items():
             if cid in existing_clusters:
-                existing_clusters[cid].num_postings = count
+                if incremental:
+                    existing_clusters[cid].num_postings += count
+                else:
+                    existing_clusters[cid].num_postings = count
             else:
                 db_session.add(models.Cluster(
                     cluster_id=int(cid),
@@ -76,59 +128,85 @@ def update_cluster_counts(db_session, cluster_labels):
     except Exception as e:
         db_session.rollback()
         print("Exception updating cluster counts:", e)
+        raise
 
-def update_posting_clusters(db_session, rows, cluster_labels):
+def update_posting_clusters(db_session, job_posting_ids, cluster_labels):
     try:
         updates = [
                 {
-                    "id": row.job_posting_id,
+                    "id": int(job_posting_id),
                     "cluster_id": None if label == -1 else int(label),
                 }
-                for row, label in zip(rows, cluster_labels)
+                for job_posting_id, label in zip(job_posting_ids, cluster_labels)
         ]
         db_session.bulk_update_mappings(models.JobPosting, updates)
         db_session.commit()
     except Exception as e:
         db_session.rollback()
         print("Exception updating job posting clusters:", e)
+        raise
+
+def load_reduced_embeddings(db_session, unclustered_only=False):
+    """
+    Return (job_posting_ids, reduced embeddings) from the reduced-embedding snapshot,
+    optionally limited to postings without a cluster.
+    """
+    snapshot = ensure_reduced_snapshot(db_session)
+    if snapshot is None:
+        return np.array([], dtype=np.int64), np.empty((0, 0))
+
+    ids = np.asarray(snapshot.ids)
+    if unclustered_only:
+        unclustered = [
+            r.id for r in db_session.query(models.JobPosting.id)
+            .filter(models.JobPosting.cluster_id.is_(None))
+            .all()
+        ]
+        mask = np.isin(ids, unclustered)
+        return ids[mask], np.asarray(snapshot.embeddings[mask], dtype=np.float64)
+
+    return ids, np.asarray(snapshot.embeddings, dtype=np.float64)
+
+def assign_new_postings(db_session):
+    """Label postings without a cluster using the persisted HDBSCAN model"""
+    clusterer_bundle = load_clusterer()
+    if clusterer_bundle is None:
+        print("Clusters exist but no saved HDBSCAN model was found. Skipping clustering step.")
+        return
+
+    job_posting_ids, embeddings = load_reduced_embeddings(db_session, unclustered_only=True)
+    if len(job_posting_ids) == 0:
+        print("No new job postings to assign to clusters.")
+        return
+
+    cluster_labels = predict_new_clusters(clusterer_bundle, embeddings)
+    print(f"Assigned {len(cluster_labels)} new job postings to {len(set(cluster_labels))} existing clusters.")
+
+    # Add new postings to existing cluster counts
+    update_cluster_counts(db_session, cluster_labels, incremental=True)
+
+    # Bulk update cluster IDs for new job postings
+    update_posting_clusters(db_session, job_posting_ids, cluster_labels)
 
 def run(db_session):
     # Retrieve reduced embeddings from database and cluster them 
     try: 
-        # Retrieve current cluster assignments for all job postings
-        clusters = db_session.query(models.Cluster).all()
+        # If clusters already exist, only assign new postings to them
+        clusters = db_session.query(models.Cluster).first()
         if clusters:
-            print("Clusters already exist in the database. Skipping clustering step.")
+            print("Clusters already exist in the database. Assigning new postings incrementally.")
+            assign_new_postings(db_session)
             return
 
-        # Retrieve reduced embeddings along with their job posting IDs 
-        rows = ( 
-            db_session.query( 
-                models.ReducedEmbedding.reduced_embedding, 
-                models.JobPosting.id.label("job_posting_id"), 
-                models.JobPosting.desc_sbert
-            ) 
-            .join( 
-                models.JobEmbeddingSBERT, 
-                models.JobEmbeddingSBERT.id == models.ReducedEmbedding.job_embedding_id, 
-            ) 
-            .join( 
-                models.JobPosting, 
-                models.JobPosting.id == models.JobEmbeddingSBERT.job_posting_id, 
-            ) 
-            .order_by(models.ReducedEmbedding.job_embedding_id) 
-            .all() 
-        ) 
-
-        if not rows: 
+        # Read reduced embeddings from the snapshot instead of the database
+        job_posting_ids, embeddings = load_reduced_embeddings(db_session)
+
+        if len(job_posting_ids) == 0: 
             print("No embeddings found. Nothing to cluster.") 
             return 
 
-        # Convert embeddings to numpy array 
-        embeddings = np.array([np.array(r.reduced_embedding, dtype=float) for r in rows]) 
-
         # Run clustering 
-        cluster_labels = cluster_jobs_hdbscan(embeddings) 
+        cluster_labels, clusterer = cluster_jobs_hdbscan(embeddings) 
         
         num_clusters = len(set(cluster_labels)) - (1 if -1 in cluster_labels else 0)
         num_outliers = np.sum(cluster_labels == -1)
@@ -140,15 +218,19 @@ def run(db_session):
         num_clusters = len(set(cluster_labels)) - (1 if -1 in cluster_labels else 0)
         print("Number of clusters after merging similar ones:", num_clusters)
 
+        # Persist the model so later runs can assign new postings without refitting
+        save_clusterer(clusterer, cluster_labels)
+
         # Update cluster counts in the database
         update_cluster_counts(db_session, cluster_labels)
 
         # Bulk update cluster IDs for job postings 
-        update_posting_clusters(db_session, rows, cluster_labels)
+        update_posting_clusters(db_session, job_posting_ids, cluster_labels)
 
 
     except Exception as e: 
         db_session.rollback() 
         print("Exception during clustering:", e) 
+        raise
     finally: 
         db_session.close() 
\ No newline at end of file
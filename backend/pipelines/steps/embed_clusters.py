@@ -2,78 +2,82 @@ from backend.app.services.tf_idf_embedder import load_vectorizer
 from backend.app.services.sbert_embedder import get_sbert_service
 from backend.app import models
 
+def fetch_clusters_without_embedding(db_session, embedding_model):
+    """Load every described cluster that has no row in the given embedding table, in one query"""
+    return (
+        db_session.query(
+            models.Cluster.id,
+            models.Cluster.general_job_desc_tfidf,
+            models.Cluster.general_job_desc_sbert,
+        )
+        .outerjoin(embedding_model, embedding_model.cluster_id == models.Cluster.id)
+        .filter(
+            models.Cluster.general_job_desc_tfidf.isnot(None),
+            embedding_model.cluster_id.is_(None),
+        )
+        .order_by(models.Cluster.id)
+        .all()
+    )
+
 def run(db_session):
-    try:
-        # Fetch all job descriptions
-        job_descs = db_session.query(models.Cluster).filter(
-            models.Cluster.general_job_desc_tfidf.isnot(None)
-        ).all()
-    except Exception as e:
-        print("Exception during database retrieval:", e)
-        db_session.close()
-        return
+    # The TF-IDF and SBERT branches are independent, so a failure in one still lets the other run
+    errors = []
 
     # Load the fitted TF-IDF vectorizer and transform job descriptions, then save embeddings to DB
     try:
-        # Load the fitted TF-IDF vectorizer
-        embedding_service = load_vectorizer()
-        print("Loaded TF-IDF vectorizer from disk.")
-
-        # Check for existing cluster embeddings to avoid duplicates
-        existing_cluster_ids = {
-            e.cluster_id
-            for e in db_session.query(models.ClusterEmbeddingTFIDF.cluster_id).all()
-        }
-
-        # Transform job descriptions and save embeddings to DB
-        for cluster in job_descs:
-            if cluster.id in existing_cluster_ids:
-                continue  # Skip if embedding already exists
+        clusters = fetch_clusters_without_embedding(db_session, models.ClusterEmbeddingTFIDF)
 
-            tfidf_vector = embedding_service.transform([cluster.general_job_desc_tfidf])
-            embedding_vector = tfidf_vector.toarray()[0].tolist()
+        if not clusters:
+            print("No clusters found that need TF-IDF embeddings.")
+        else:
+            # Load the fitted TF-IDF vectorizer
+            embedding_service = load_vectorizer()
+            print("Loaded TF-IDF vectorizer from disk.")
 
-            embedding_obj = models.ClusterEmbeddingTFIDF(
-                embedding=embedding_vector,
-                cluster_id=cluster.id
-            )
-            db_session.add(embedding_obj)
+            # Transform all descriptions in one call and insert all embeddings at once
+            tfidf_vectors = embedding_service.transform([c.general_job_desc_tfidf for c in clusters]).toarray()
+            db_session.bulk_insert_mappings(models.ClusterEmbeddingTFIDF, [
+                {"embedding": vector.tolist(), "cluster_id": cluster.id}
+                for cluster, vector in zip(clusters, tfidf_vectors)
+            ])
 
-        db_session.commit()
-        print(f"Inserted/updated {len(job_descs)} TF-IDF cluster embeddings.")
+            db_session.commit()
+            print(f"Inserted {len(clusters)} TF-IDF cluster embeddings.")
 
     except Exception as e:
         print("Exception during TF-IDF transformation or DB insertion:", e)
         db_session.rollback()
-    
+        errors.append(e)
+
     # Embed job descriptions using SBERT and save to DB
     try:
-        embedding_service = get_sbert_service()
-
-        # Check for existing cluster embeddings to avoid duplicates
-        existing_cluster_ids = {
-            e.cluster_id
-            for e in db_session.query(models.ClusterEmbeddingSBERT.cluster_id).all()
-        }
-
-        for cluster in job_descs:
-            if cluster.id in existing_cluster_ids:
-                continue  # Skip if embedding already exists
+        clusters = [
+            c for c in fetch_clusters_without_embedding(db_session, models.ClusterEmbeddingSBERT)
+            if c.general_job_desc_sbert
+        ]
 
-            sbert_embedding = embedding_service.embed([cluster.general_job_desc_sbert])[0].tolist()
+        if not clusters:
+            print("No clusters found that need SBERT embeddings.")
+        else:
+            embedding_service = get_sbert_service()
 
-            embedding_obj = models.ClusterEmbeddingSBERT(
-                embedding=sbert_embedding,
-                cluster_id=cluster.id
-            )
-            db_session.add(embedding_obj)
+            # Embed all descriptions in one batched call and insert all embeddings at once
+            sbert_embeddings = embedding_service.embed([c.general_job_desc_sbert for c in clusters])
+            db_session.bulk_insert_mappings(models.ClusterEmbeddingSBERT, [
+                {"embedding": embedding.tolist(), "cluster_id": cluster.id}
+                for cluster, embedding in zip(clusters, sbert_embeddings)
+            ])
 
-        db_session.commit()
-        print(f"Inserted/updated {len(job_descs)} SBERT cluster embeddings.")
+            db_session.commit()
+            print(f"Inserted {len(clusters)} SBERT cluster embeddings.")
 
     except Exception as e:
         print("Exception during SBERT embedding or DB insertion:", e)
         db_session.rollback()
+        errors.append(e)
 
     finally:
-        db_session.close()
\ No newline at end of file
+        db_session.close()
+
+    if errors:
+        raise errors[0]
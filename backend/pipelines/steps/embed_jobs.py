@@ -2,8 +2,10 @@
 # Dimensionality reduction must be ran after this step since it reduces the dimensionality of the generated SBERT embeddings which are used for clustering
 
 import numpy as np
+import backend.app.database as database
 import backend.app.models as models
 from backend.app.config import EMBEDDING_MODEL
+from backend.app.services.snapshot_store import SBERT_SNAPSHOT, load_snapshot, save_snapshot, append_snapshot, fill_async
 from backend.app.services.sbert_embedder import get_sbert_service
 from backend.app.services.tf_idf_embedder import load_vectorizer
 from typing import Optional
@@ -30,6 +32,7 @@ def save_embeddings(job_ids: list[int], embeddings: np.ndarray, model: str, db_s
         except Exception as e:
             db_session.rollback()
             print("Exception during SBERT embedding DB insertion:", e)
+            raise
 
     elif model == "TF-IDF":
         try:
@@ -49,12 +52,46 @@ def save_embeddings(job_ids: list[int], embeddings: np.ndarray, model: str, db_s
         except Exception as e:
             db_session.rollback()
             print("Exception during TF-IDF embedding DB insertion:", e)
+            raise
+
+def ensure_sbert_snapshot(db_session):
+    """Load the SBERT snapshot, exporting existing database embeddings into one if none exists yet"""
+    snapshot = load_snapshot(SBERT_SNAPSHOT)
+    if snapshot is not None:
+        return snapshot
+
+    rows = (
+        db_session.query(models.JobEmbeddingSBERT.job_posting_id, models.JobEmbeddingSBERT.embedding)
+        .order_by(models.JobEmbeddingSBERT.job_posting_id)
+        .all()
+    )
+    if not rows:
+        return None
+
+    print(f"Exporting {len(rows)} existing SBERT embeddings to a snapshot...")
+    save_snapshot(
+        SBERT_SNAPSHOT,
+        [r.job_posting_id for r in rows],
+        np.array([r.embedding for r in rows], dtype=np.float32),
+        metadata={"model_version": EMBEDDING_MODEL},
+    )
+    return load_snapshot(SBERT_SNAPSHOT)
+
+def _fill_sbert_embeddings(job_ids, embeddings):
+    # Runs in a background thread, so it needs its own session
+    db_session = database.SessionLocal()
+    try:
+        save_embeddings(job_ids, embeddings, "SBERT", db_session, model_version=EMBEDDING_MODEL)
+    finally:
+        db_session.close()
 
-def run(db_session):
+def run_sbert(db_session):
     try:
-        # Fetch all job postings with SBERT descriptions that haven't been embedded yet
+        snapshot = ensure_sbert_snapshot(db_session)
+
+        # Fetch all job postings with SBERT descriptions that haven't been embedded in the database yet
         job_postings = (
-            db_session.query(models.JobPosting)
+            db_session.query(models.JobPosting.id, models.JobPosting.desc_sbert)
             .outerjoin(
                 models.JobEmbeddingSBERT,
                 models.JobPosting.id == models.JobEmbeddingSBERT.job_posting_id
@@ -63,27 +100,54 @@ def run(db_session):
                 models.JobPosting.desc_sbert.isnot(None),
                 models.JobEmbeddingSBERT.job_posting_id.is_(None)
             )
+            .order_by(models.JobPosting.id)
             .all()
         )
 
         if not job_postings:
             print("No job postings found with SBERT descriptions that need embedding.")
-        
+            return
+
+        job_ids = np.array([jp.id for jp in job_postings], dtype=np.int64)
+
+        # Postings already in the snapshot only need their database rows written
+        snapshot_ids = snapshot.ids if snapshot is not None else np.array([], dtype=np.int64)
+        in_snapshot = np.isin(job_ids, snapshot_ids)
+        if np.any(in_snapshot):
+            positions = {int(pid): i for i, pid in enumerate(snapshot_ids)}
+            pending_ids = job_ids[in_snapshot]
+            pending_embeddings = np.asarray(snapshot.embeddings)[[positions[int(pid)] for pid in pending_ids]]
         else:
-        
-            job_ids = [jp.id for jp in job_postings]
-            job_descriptions = [jp.desc_sbert for jp in job_postings]
+            pending_ids = np.array([], dtype=np.int64)
+            pending_embeddings = np.empty((0, 0), dtype=np.float32)
+
+        new_ids = job_ids[~in_snapshot]
+        if len(new_ids):
+            job_descriptions = [jp.desc_sbert for jp, done in zip(job_postings, in_snapshot) if not done]
 
             print(f"Embedding {len(job_descriptions)} job descriptions using SBERT...")
             embedding_service = get_sbert_service()
-            embeddings = embedding_service.embed(job_descriptions)
+            new_embeddings = embedding_service.embed(job_descriptions).astype(np.float32)
+
+            # Downstream steps read the snapshot, so it is written before the database
+            append_snapshot(SBERT_SNAPSHOT, new_ids, new_embeddings, metadata={"model_version": EMBEDDING_MODEL})
+        else:
+            new_embeddings = np.empty((0, 0), dtype=np.float32)
 
-            print("Saving SBERT embeddings to database...")
-            save_embeddings(job_ids, embeddings, EMBEDDING_MODEL, db_session)
+        fill_ids = np.concatenate([pending_ids, new_ids])
+        fill_embeddings = np.concatenate([e for e in (pending_embeddings, new_embeddings) if e.size]) if len(fill_ids) else None
+        if fill_embeddings is not None:
+            print(f"Saving {len(fill_ids)} SBERT embeddings to database in the background...")
+            fill_async(SBERT_SNAPSHOT, _fill_sbert_embeddings, fill_ids.tolist(), fill_embeddings)
 
     except Exception as e:
+        db_session.rollback()
         print("Exception during SBERT embedding:", e)
-    
+        raise
+    finally:
+        db_session.close()
+
+def run_tfidf(db_session):
     try:
         # Fetch all job postings with TF-IDF descriptions that haven't been embedded yet
         job_postings = (
@@ -103,12 +167,13 @@ def run(db_session):
             print("No job postings found with TF-IDF descriptions that need embedding.")
 
         else:
+            job_ids = [job.id for job in job_postings]
             job_descriptions = [job.desc_tfidf for job in job_postings]
 
             print(f"Embedding {len(job_descriptions)} job descriptions using TF-IDF...")
 
             # Load the fitted TF-IDF vectorizer
-            embedding_service = load_vectorizer("tfidf_vectorizer.pkl")
+            embedding_service = load_vectorizer()
 
             # Transform job descriptions and save embeddings to DB
             tfidf_vectors = embedding_service.transform(job_descriptions).toarray()
@@ -117,4 +182,13 @@ def run(db_session):
             save_embeddings(job_ids, tfidf_vectors, "TF-IDF", db_session)
         
     except Exception as e:
-        print("Exception during TF-IDF transformation:", e)
\ No newline at end of file
+        db_session.rollback()
+        print("Exception during TF-IDF transformation:", e)
+        raise
+    finally:
+        db_session.close()
+
+def run(db_session):
+    # SBERT and TF-IDF branches are independent; the pipeline runner schedules them in parallel
+    run_sbert(db_session)
+    run_tfidf(db_session)
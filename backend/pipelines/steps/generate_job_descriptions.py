@@ -1,12 +1,19 @@
 import re
+import asyncio
+import argparse
+import hashlib
+import json
+import random
 from google import genai
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.feature_extraction import text
 from backend.app import models
 from backend.app import database
+from backend.app.config import LLM_RATE_LIMITS, CLUSTER_KEYWORDS_CACHE_DIR
 from data.scripts.preprocessor_sbert import SBERTPreprocessor
 from data.scripts.preprocessor_tfidf import TFIDFPreprocessor
 from collections import defaultdict
+from scipy import sparse
 import numpy as np 
 import time
 
@@ -14,8 +21,53 @@ import time
 from dotenv import load_dotenv
 import os
 load_dotenv()
-API_KEYS = os.getenv("GEMINI_API_KEYS").split(",")
-API_KEY = API_KEYS[0]
+API_KEYS = [k for k in os.getenv("GEMINI_API_KEYS", "").split(",") if k]
+
+# Set FAKE_LLM=1 to benchmark the step offline with a simulated LLM
+FAKE_LLM = os.getenv("FAKE_LLM", "").lower() in ("1", "true", "yes")
+
+def cluster_mean_term_weights(tfidf_matrix, labels):
+    """
+    Mean TF-IDF weight of every term per cluster (class-based TF-IDF), computed with a
+    single sparse product between a cluster indicator matrix and the document-term matrix.
+
+    Returns:
+        (cluster_ids, sparse matrix of shape (n_clusters, n_terms))
+    """
+    cluster_ids, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    n_docs = len(labels)
+
+    # Row i selects the documents of cluster i, scaled by 1/size so the product is a mean
+    indicator = sparse.csr_matrix(
+        (1.0 / counts[inverse], (inverse, np.arange(n_docs))),
+        shape=(len(cluster_ids), n_docs),
+    )
+    return cluster_ids, (indicator @ tfidf_matrix).tocsr()
+
+def top_cluster_terms(tfidf_matrix, terms, labels, top_k=20):
+    """
+    Returns:
+        dict {cluster_id: [top keywords]}
+    """
+    cluster_ids, mean_weights = cluster_mean_term_weights(tfidf_matrix, labels)
+
+    cluster_keywords = {}
+    for row, cluster_id in enumerate(cluster_ids):
+        # Only the non-zero weights of each row can be among the top terms
+        start, end = mean_weights.indptr[row], mean_weights.indptr[row + 1]
+        weights = mean_weights.data[start:end]
+        term_indices = mean_weights.indices[start:end]
+
+        k = min(top_k, len(weights))
+        if k == 0:
+            cluster_keywords[cluster_id] = []
+            continue
+
+        top = np.argpartition(weights, -k)[-k:]
+        top = top[np.argsort(weights[top])[::-1]]
+        cluster_keywords[cluster_id] = terms[term_indices[top]].tolist()
+
+    return cluster_keywords
 
 def compute_cluster_keywords(texts, labels, top_k=20):
     """
@@ -36,19 +88,31 @@ def compute_cluster_keywords(texts, labels, top_k=20):
     tfidf_matrix = vectorizer.fit_transform(texts)
     terms = np.array(vectorizer.get_feature_names_out())
 
-    cluster_keywords = {}
+    return top_cluster_terms(tfidf_matrix, terms, labels, top_k=top_k)
 
-    for cluster_id in np.unique(labels):
-        if cluster_id is None:
-            continue
+def clustering_version(posting_ids, labels):
+    """Hash of the posting -> cluster assignment, used to key cached cluster keywords"""
+    digest = hashlib.sha256()
+    digest.update(np.asarray(posting_ids, dtype=np.int64).tobytes())
+    digest.update(np.asarray(labels, dtype=np.int64).tobytes())
+    return digest.hexdigest()[:16]
 
-        cluster_docs = tfidf_matrix[labels == cluster_id]
-        mean_scores = np.asarray(cluster_docs.mean(axis=0)).ravel()
+def load_or_compute_cluster_keywords(texts, labels, version, top_k=20):
+    """Return cluster keywords from the artifact cache, computing and saving them on a miss"""
+    cache_path = CLUSTER_KEYWORDS_CACHE_DIR / f"keywords_{version}_top{top_k}.json"
+    if cache_path.exists():
+        with open(cache_path) as f:
+            cached = json.load(f)
+        print(f"Loaded cluster keywords from {cache_path}")
+        return {int(cid): kws for cid, kws in cached.items()}
 
-        top_indices = mean_scores.argsort()[::-1][:top_k]
-        cluster_keywords[cluster_id] = terms[top_indices].tolist()
+    keywords = compute_cluster_keywords(texts, labels, top_k=top_k)
 
-    return cluster_keywords
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump({str(int(cid)): kws for cid, kws in keywords.items()}, f)
+
+    return keywords
 
 def create_llm_prompt(keywords, sample_titles, sample_descriptions):
     """
@@ -88,46 +152,183 @@ def create_llm_prompt(keywords, sample_titles, sample_descriptions):
 
     return prompt.strip()
 
-def generate_job_description(keywords, sample_titles, sample_descriptions):
+class GeminiClient:
+    """Async Gemini client bound to a single API key"""
+
+    def __init__(self, api_key):
+        self.client = genai.Client(api_key=api_key)
+
+    async def generate(self, prompt):
+        response = await self.client.aio.models.generate_content(
+            model="gemini-2.5-flash-lite",
+            contents=prompt,
+        )
+        return response.text.strip()
+
+class FakeLLMClient:
     """
-    Call LLM to generate a generalized job description.
-    Rotates through API keys on 429 RESOURCE_EXHAUSTED errors.
+    Offline stand-in for GeminiClient. Sleeps for a simulated latency and returns
+    a description in the format the real prompt asks for.
     """
 
-    if not sample_titles and not sample_descriptions:
-        return "Insufficient data to generate description."
+    def __init__(self, latency=1.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+
+    async def generate(self, prompt):
+        await asyncio.sleep(self.random.uniform(0.5, 1.5) * self.latency)
+        if self.random.random() < self.failure_rate:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED (simulated)")
+
+        title_match = re.search(r"SAMPLE JOB TITLES:\s*-\s*(.+)", prompt)
+        title = title_match.group(1).strip() if title_match else "General Role"
+        return (
+            f"**Role Title:** {title}\n"
+            f"**Professional Summary:** Simulated summary for {title}. "
+            "Responsible for the core duties shared by these postings."
+        )
 
-    prompt = create_llm_prompt(keywords, sample_titles, sample_descriptions)
+class KeyRateLimiter:
+    """Request pacing and concurrency limit for one API key"""
 
-    for i, key in enumerate(API_KEYS):
-        try:
-            current_client = genai.Client(api_key=key)
+    def __init__(self, client, requests_per_minute, max_concurrency):
+        self.client = client
+        self.interval = 60.0 / requests_per_minute
+        self.next_slot = 0.0
+        self.cooldown_until = 0.0
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
 
-            response = current_client.models.generate_content(
-                model="gemini-2.5-flash-lite",
-                contents=prompt,
-            )
-            return response.text.strip()
-        except Exception as e:
-            error_str = str(e)
-            if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                print(f"API key {i+1}/{len(API_KEYS)} exhausted, trying next key...")
-                if i == len(API_KEYS) - 1:
-                    return "All API keys exhausted."
-            else:
-                print("LLM generation failed:", e)
-                return "Description unavailable."
+class KeyPool:
+    """
+    Hands out API keys so that every key stays within its own rate limit.
+    Each request reserves the earliest free slot across all keys.
+    """
+
+    def __init__(self, clients, requests_per_minute, max_concurrency_per_key, cooldown_seconds):
+        self.limiters = [
+            KeyRateLimiter(client, requests_per_minute, max_concurrency_per_key)
+            for client in clients
+        ]
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = asyncio.Lock()
+
+    @property
+    def max_concurrency(self):
+        return sum(limiter.max_concurrency for limiter in self.limiters)
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            limiter = min(self.limiters, key=lambda l: max(l.next_slot, l.cooldown_until))
+            start = max(now, limiter.next_slot, limiter.cooldown_until)
+            limiter.next_slot = start + limiter.interval
+
+        await asyncio.sleep(start - now)
+        await limiter.semaphore.acquire()
+        return limiter
+
+    def release(self, limiter, exhausted=False):
+        if exhausted:
+            limiter.cooldown_until = asyncio.get_running_loop().time() + self.cooldown_seconds
+        limiter.semaphore.release()
+
+def parse_generated_description(description):
+    """Extract (title, summary) from an LLM response, either of which may be None"""
+    title = None
+    title_match = re.search(r"\*\*Role Title:\*\*\s*(.+)", description)
+    if title_match:
+        title = title_match.group(1).strip()
+
+    summary = None
+    desc_match = re.search(r"\*\*Professional Summary:\*\*\s*(.+)", description, re.DOTALL)
+    if desc_match:
+        summary = desc_match.group(1).strip()
+
+    return title, summary
+
+async def generate_descriptions_concurrently(jobs, key_pool, on_success, max_retries):
+    """
+    Generate descriptions for jobs ({cluster_id: prompt}) with a worker pool bounded by key_pool.
+    on_success(cluster_id, title, summary) is called as each description completes; run()
+    buffers the results and commits them every checkpoint_every completions and at the end.
+    Failed clusters are retried up to max_retries times.
 
-def run(db_session):
+    Returns the list of cluster ids that could not be generated.
+    """
+    queue = asyncio.Queue()
+    for cid in jobs:
+        queue.put_nowait((cid, 1))
+    failed = []
+
+    async def worker():
+        while True:
+            cid, attempt = await queue.get()
+            limiter = await key_pool.acquire()
+            exhausted = False
+            error = None
+            try:
+                description = await limiter.client.generate(jobs[cid])
+                title, summary = parse_generated_description(description)
+                if not title or not summary:
+                    error = "could not extract title or description"
+                else:
+                    on_success(cid, title, summary)
+            except Exception as e:
+                error_str = str(e)
+                exhausted = "429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+                error = error_str
+            finally:
+                key_pool.release(limiter, exhausted=exhausted)
+
+            if error:
+                if attempt < max_retries:
+                    print(f"Attempt {attempt} failed for cid {cid} ({error}). Retrying...")
+                    queue.put_nowait((cid, attempt + 1))
+                else:
+                    print(f"Giving up on cid {cid} after {attempt} attempts: {error}")
+                    failed.append(cid)
+            queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, key_pool.max_concurrency))]
+    await queue.join()
+    for w in workers:
+        w.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+    return failed
+
+def build_key_pool(fake_llm=False, fake_latency=1.0):
+    limits = LLM_RATE_LIMITS
+    if fake_llm:
+        # Simulate one client per configured key (at least one) so pacing matches production
+        clients = [FakeLLMClient(latency=fake_latency, seed=i) for i in range(max(1, len(API_KEYS)))]
+    else:
+        if not API_KEYS:
+            raise RuntimeError("GEMINI_API_KEYS is missing")
+        clients = [GeminiClient(key) for key in API_KEYS]
+
+    return KeyPool(
+        clients,
+        requests_per_minute=limits["requests_per_minute"],
+        max_concurrency_per_key=limits["max_concurrency_per_key"],
+        cooldown_seconds=limits["cooldown_seconds"],
+    )
+
+def run(db_session, fake_llm=FAKE_LLM, fake_latency=1.0, dry_run=False, checkpoint_every=10):
     try:
         # Retrieve descriptions + cluster IDs
         rows = (
             db_session.query(
+                models.JobPosting.id,
                 models.JobPosting.title,
                 models.JobPosting.desc_sbert,
                 models.JobPosting.cluster_id,
             )
             .filter(models.JobPosting.cluster_id != None)
+            .order_by(models.JobPosting.id)
             .all()
         )
 
@@ -142,78 +343,126 @@ def run(db_session):
         texts = [r.desc_sbert or "" for r in rows]
         labels = np.array([r.cluster_id for r in rows])
 
-        keywords = compute_cluster_keywords(texts, labels, top_k=20)
+        version = clustering_version([r.id for r in rows], labels)
+        keywords = load_or_compute_cluster_keywords(texts, labels, version, top_k=20)
 
         cluster_map = defaultdict(list)
 
         for r in rows:
             cluster_map[r.cluster_id].append(r)
 
-        # Generate descriptions for clusters
+        # Load every target cluster in one query
+        clusters = {
+            c.cluster_id: c
+            for c in db_session.query(
+                models.Cluster.id,
+                models.Cluster.cluster_id,
+                models.Cluster.title,
+                models.Cluster.general_job_desc_raw,
+                models.Cluster.general_job_desc_tfidf,
+                models.Cluster.general_job_desc_sbert,
+            )
+            .filter(models.Cluster.cluster_id.in_([int(cid) for cid in keywords]))
+            .all()
+        }
+
+        pending_updates = []
+
+        def flush_updates():
+            # Write buffered cluster updates with a single bulk UPDATE; returns False if the write failed
+            if not pending_updates or dry_run:
+                pending_updates.clear()
+                return True
+            try:
+                db_session.bulk_update_mappings(models.Cluster, pending_updates)
+                db_session.commit()
+            except Exception as e:
+                # Keep the buffer for the next checkpoint; the descriptions themselves are fine
+                db_session.rollback()
+                print(f"Failed to save {len(pending_updates)} cluster updates: {e}")
+                return False
+            pending_updates.clear()
+            return True
+
+        # Collect prompts for clusters that still need a description
+        jobs = {}
         for cid in sorted(keywords.keys()):
-            cluster_rows = cluster_map[cid]
+            existing = clusters.get(int(cid))
+            if not existing:
+                continue
+
+            # Check if general job description and title already exist
+            if existing.general_job_desc_raw and existing.title:
+                # If it already exists, make sure it has been preprocessed for models
+                if not existing.general_job_desc_tfidf or not existing.general_job_desc_sbert:
+                    pending_updates.append({
+                        "id": existing.id,
+                        "general_job_desc_tfidf": tfidf_prep.clean_text_tfidf(existing.general_job_desc_raw),
+                        "general_job_desc_sbert": sbert_prep.clean_text_sbert(existing.general_job_desc_raw),
+                    })
+                continue
 
+            cluster_rows = cluster_map[cid]
             sample_titles = [r.title for r in cluster_rows if r.title]
             sample_descs = [r.desc_sbert for r in cluster_rows if r.desc_sbert]
 
-            existing = (
-                db_session.query(models.Cluster)
-                .filter(models.Cluster.cluster_id == int(cid))
-                .one_or_none()
-            )
-            if existing:
-                # Check if general job description and title already exist
-                if existing.general_job_desc_raw and existing.title:
-                    # If it already exists, make sure it has been preprocessed for models
-                    if not existing.general_job_desc_tfidf or not existing.general_job_desc_sbert:
-                        existing.general_job_desc_tfidf = tfidf_prep.clean_text_tfidf(existing.general_job_desc_raw)
-                        existing.general_job_desc_sbert = sbert_prep.clean_text_sbert(existing.general_job_desc_raw)
-                        db_session.commit()
-                    else:
-                        pass
-                else:
-                    # Generate description for cluster
-                    description = generate_job_description(
-                        keywords[cid],
-                        sample_titles,
-                        sample_descs,
-                    )
-
-                    # Extract information from generated description using regex
-                    # Extract title from cluster_desc using regex
-                    title = None 
-                    title_match = re.search(r"\*\*Role Title:\*\*\s*(.+)", description) 
-                    if title_match: 
-                        title = title_match.group(1).strip() 
-                    # Extract general job description from cluster_desc using regex 
-                    desc_match = re.search(r"\*\*Professional Summary:\*\*\s*(.+)", description, re.DOTALL) 
-                    if desc_match: 
-                        description = desc_match.group(1).strip() 
-                        # Preprocess description for TF-IDF and SBERT
-                        tfidf_description = tfidf_prep.clean_text_tfidf(description)
-                        sbert_description = sbert_prep.clean_text_sbert(description)
-                    else: 
-                        print(f"Warning: Could not extract description for cluster_id {cid}") 
-
-                    if description == "All API keys exhausted.":
-                        print("All API keys exhausted. Breaking...")
-                        break
-                    elif description == "Description unavailable.":
-                        print("Description unavailable. Not saving to database.")
-                    elif not title:
-                        print("Title could not be extracted. Not saving to database.")
-                    else:
-                        # Save description to database
-                        existing.general_job_desc_raw = description
-                        existing.general_job_desc_tfidf = tfidf_description
-                        existing.general_job_desc_sbert = sbert_description
-                        existing.title = title
-                        db_session.commit()
-                        print(f"Description for cid {cid} successfully saved to the database")
-                        # Sleep before next iteration
-                        time.sleep(30)
+            if not sample_titles and not sample_descs:
+                print(f"Insufficient data to generate description for cid {cid}")
+            else:
+                jobs[cid] = create_llm_prompt(keywords[cid], sample_titles, sample_descs)
+
+        if not flush_updates():
+            raise RuntimeError("Could not save preprocessed cluster descriptions")
+
+        if not jobs:
+            print("All cluster descriptions already exist.")
+            return
+
+        def save_description(cid, title, description):
+            # Buffer completed descriptions and checkpoint them in bulk every few completions.
+            # A failed write is not raised, so the worker never regenerates a finished description.
+            pending_updates.append({
+                "id": clusters[int(cid)].id,
+                "general_job_desc_raw": description,
+                "general_job_desc_tfidf": tfidf_prep.clean_text_tfidf(description),
+                "general_job_desc_sbert": sbert_prep.clean_text_sbert(description),
+                "title": title,
+            })
+            if len(pending_updates) >= checkpoint_every and flush_updates():
+                print(f"Checkpointed descriptions up to cid {cid}")
+
+        key_pool = build_key_pool(fake_llm=fake_llm, fake_latency=fake_latency)
+        print(f"Generating {len(jobs)} cluster descriptions with {len(key_pool.limiters)} key(s)"
+              f"{' (fake LLM)' if fake_llm else ''}...")
+
+        start = time.perf_counter()
+        try:
+            failed = asyncio.run(generate_descriptions_concurrently(
+                jobs, key_pool, save_description, max_retries=LLM_RATE_LIMITS["max_retries"]
+            ))
+        finally:
+            # Save whatever completed, even if generation was interrupted
+            saved = flush_updates()
+        if not saved:
+            raise RuntimeError(f"Could not save {len(pending_updates)} generated cluster descriptions")
+        elapsed = time.perf_counter() - start
+
+        print(f"Generated {len(jobs) - len(failed)}/{len(jobs)} descriptions in {elapsed:.1f}s")
+        if failed:
+            print(f"Failed clusters (will be retried on the next run): {sorted(int(c) for c in failed)}")
 
     except Exception as e:
+        db_session.rollback()
         print("Exception:", e)
+        raise
     finally:
-        db_session.close()
\ No newline at end of file
+        db_session.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate cluster job descriptions")
+    parser.add_argument("--fake-llm", action="store_true", help="Use a simulated LLM instead of Gemini (offline benchmarking)")
+    parser.add_argument("--fake-latency", type=float, default=1.0, help="Mean simulated LLM latency in seconds")
+    parser.add_argument("--dry-run", action="store_true", help="Generate descriptions without saving them")
+    args = parser.parse_args()
+
+    run(database.SessionLocal(), fake_llm=args.fake_llm or FAKE_LLM, fake_latency=args.fake_latency, dry_run=args.dry_run)
@@ -1,23 +1,38 @@
+import pickle
 import umap
 import numpy as np
 from backend.app.config import EMBEDDING_MODEL
-from backend.app.config import UMAP_PARAMS
+from backend.app.config import UMAP_PARAMS, UMAP_MODEL_PATH
 import backend.app.database as database
 import backend.app.models as models
+from backend.app.services.snapshot_store import (
+    SBERT_SNAPSHOT, REDUCED_SNAPSHOT, load_snapshot, save_snapshot, append_snapshot, fill_async
+)
+from backend.pipelines.steps.embed_jobs import ensure_sbert_snapshot
 
 def reduce_dimensions_umap(embeddings):
     reducer = umap.UMAP(**UMAP_PARAMS)
     reduced = reducer.fit_transform(embeddings)
-    return reduced
+    return reduced, reducer
+
+def save_reducer(reducer, path=UMAP_MODEL_PATH):
+    """Persist the fitted UMAP reducer so new embeddings can be projected later"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(reducer, f)
+    print(f"Saved UMAP reducer to {path}")
+
+def load_reducer(path=UMAP_MODEL_PATH):
+    """Load the persisted UMAP reducer, or None if it has not been fitted yet"""
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
 
 def save_reduced_embeddings(embedding_ids: list[int], reduced_embeddings: np.ndarray, model_version: str, reduction_method: str, db_session):
     """Save reduced embeddings directly to database"""
 
-    # Check that table is empty before trying to save
-    if db_session.query(models.ReducedEmbedding).first():
-        print("ReducedEmbedding table is not empty. Skipping save to avoid duplicates.")
-        return
-    
+    # Only embeddings without a reduced counterpart are passed in (see run), so appending is safe
     try:
         reduced_embeddings = [
             models.ReducedEmbedding(
@@ -36,37 +51,132 @@ def save_reduced_embeddings(embedding_ids: list[int], reduced_embeddings: np.nda
     except Exception as e:
         db_session.rollback()
         print("Exception during reduced embedding DB insertion:", e)
+        raise
 
-def run(db_session):
-    # Reduce job embeddings with UMAP and save to database
+def ensure_reduced_snapshot(db_session):
+    """Load the reduced-embedding snapshot, exporting existing database rows into one if none exists yet"""
+    snapshot = load_snapshot(REDUCED_SNAPSHOT)
+    if snapshot is not None:
+        return snapshot
+
+    rows = (
+        db_session.query(models.JobEmbeddingSBERT.job_posting_id, models.ReducedEmbedding.reduced_embedding)
+        .join(models.JobEmbeddingSBERT, models.JobEmbeddingSBERT.id == models.ReducedEmbedding.job_embedding_id)
+        .filter(models.ReducedEmbedding.reduction_method == "UMAP")
+        .order_by(models.JobEmbeddingSBERT.job_posting_id)
+        .all()
+    )
+    if not rows:
+        return None
+
+    print(f"Exporting {len(rows)} existing reduced embeddings to a snapshot...")
+    save_snapshot(
+        REDUCED_SNAPSHOT,
+        [r.job_posting_id for r in rows],
+        np.array([r.reduced_embedding for r in rows], dtype=np.float32),
+        metadata={"model_version": EMBEDDING_MODEL, "reduction_method": "UMAP"},
+    )
+    return load_snapshot(REDUCED_SNAPSHOT)
+
+def _fill_reduced_embeddings(job_posting_ids, reduced_embeddings):
+    # Runs in a background thread after the SBERT fill, so SBERT rows exist to reference
+    db_session = database.SessionLocal()
     try:
-        # Fetch all SBERT embeddings from the database that have not yet been reduced
-        job_embeddings = (
-            db_session.query(models.JobEmbeddingSBERT)
-            .outerjoin(
-                models.ReducedEmbedding,
-                models.JobEmbeddingSBERT.id == models.ReducedEmbedding.job_embedding_id
-            )
+        rows = (
+            db_session.query(models.JobEmbeddingSBERT.id, models.JobEmbeddingSBERT.job_posting_id)
+            .outerjoin(models.ReducedEmbedding, models.ReducedEmbedding.job_embedding_id == models.JobEmbeddingSBERT.id)
             .filter(
-                models.ReducedEmbedding.job_embedding_id.is_(None)
+                models.JobEmbeddingSBERT.job_posting_id.in_(job_posting_ids),
+                models.ReducedEmbedding.job_embedding_id.is_(None),
             )
             .all()
         )
+        embedding_id_by_posting = {r.job_posting_id: r.id for r in rows}
+        positions = [i for i, pid in enumerate(job_posting_ids) if pid in embedding_id_by_posting]
+
+        save_reduced_embeddings(
+            [embedding_id_by_posting[job_posting_ids[i]] for i in positions],
+            reduced_embeddings[positions],
+            EMBEDDING_MODEL, "UMAP", db_session,
+        )
 
-        if not job_embeddings:
+        # Postings without an SBERT row yet (e.g. its fill failed) are written by a later run
+        missing = len(job_posting_ids) - len(positions)
+        if missing:
+            raise RuntimeError(f"{missing} reduced embeddings have no SBERT row to reference yet")
+    finally:
+        db_session.close()
+
+def fetch_unfilled_posting_ids(db_session):
+    """Job posting ids whose SBERT embedding has no reduced row in the database"""
+    rows = (
+        db_session.query(models.JobEmbeddingSBERT.job_posting_id)
+        .outerjoin(models.ReducedEmbedding, models.ReducedEmbedding.job_embedding_id == models.JobEmbeddingSBERT.id)
+        .filter(models.ReducedEmbedding.job_embedding_id.is_(None))
+        .all()
+    )
+    return np.array([r.job_posting_id for r in rows], dtype=np.int64)
+
+def run(db_session):
+    # Reduce job embeddings with UMAP, reading from and writing to snapshots, then fill the database
+    try:
+        sbert_snapshot = ensure_sbert_snapshot(db_session)
+        reduced_snapshot = ensure_reduced_snapshot(db_session)
+
+        if sbert_snapshot is None:
             print("No SBERT embeddings found that need to be reduced.")
-        
-        else:
-            job_embedding_ids = [je.id for je in job_embeddings]
-            job_embeddings_embeddings = [je.embedding for je in job_embeddings]
+            return
+
+        reduced_ids = reduced_snapshot.ids if reduced_snapshot is not None else np.array([], dtype=np.int64)
 
-            print(f"Reducing {len(job_embeddings_embeddings)} job embeddings using UMAP...")
-            umap_embeddings = reduce_dimensions_umap(job_embeddings_embeddings)
+        # Postings already reduced in the snapshot but missing from the database only need their rows written
+        in_snapshot = np.isin(reduced_ids, fetch_unfilled_posting_ids(db_session))
+        pending_ids = np.asarray(reduced_ids[in_snapshot])
+        pending_embeddings = np.asarray(reduced_snapshot.embeddings[in_snapshot]) if len(pending_ids) else None
+
+        # Find SBERT embeddings that have not yet been reduced
+        new_mask = ~np.isin(sbert_snapshot.ids, reduced_ids)
+
+        if not np.any(new_mask) and not len(pending_ids):
+            print("No SBERT embeddings found that need to be reduced.")
+            return
 
-            print("Saving UMAP-reduced embeddings to database...")
-            save_reduced_embeddings(job_embedding_ids, umap_embeddings, EMBEDDING_MODEL, "UMAP", db_session)
+        if np.any(new_mask):
+            job_posting_ids = np.asarray(sbert_snapshot.ids[new_mask])
+            job_embeddings_embeddings = np.asarray(sbert_snapshot.embeddings[new_mask])
+
+            # Project new embeddings with the persisted reducer if one exists, otherwise fit from scratch
+            reducer = load_reducer()
+            if reducer is not None:
+                print(f"Projecting {len(job_embeddings_embeddings)} new job embeddings with the saved UMAP reducer...")
+                umap_embeddings = reducer.transform(job_embeddings_embeddings)
+            else:
+                print(f"Reducing {len(job_embeddings_embeddings)} job embeddings using UMAP...")
+                umap_embeddings, reducer = reduce_dimensions_umap(job_embeddings_embeddings)
+                save_reducer(reducer)
+            umap_embeddings = np.asarray(umap_embeddings, dtype=np.float32)
+
+            # Clustering reads the snapshot, so the database is filled in the background
+            metadata = {"model_version": EMBEDDING_MODEL, "reduction_method": "UMAP"}
+            if reduced_snapshot is not None and len(reduced_ids):
+                append_snapshot(REDUCED_SNAPSHOT, job_posting_ids, umap_embeddings, metadata=metadata)
+            else:
+                save_snapshot(REDUCED_SNAPSHOT, job_posting_ids, umap_embeddings, metadata=metadata)
+        else:
+            job_posting_ids = np.array([], dtype=np.int64)
+            umap_embeddings = None
+
+        fill_ids = np.concatenate([pending_ids, job_posting_ids])
+        fill_embeddings = np.concatenate([e for e in (pending_embeddings, umap_embeddings) if e is not None])
+        print(f"Saving {len(fill_ids)} UMAP-reduced embeddings to database in the background...")
+        fill_async(
+            REDUCED_SNAPSHOT, _fill_reduced_embeddings, fill_ids.tolist(), fill_embeddings,
+            wait_for=(SBERT_SNAPSHOT,),
+        )
 
     except Exception as e:
+        db_session.rollback()
         print("Exception reducing job embeddings:", e)
+        raise
     finally:
-        db_session.close()
\ No newline at end of file
+        db_session.close()
@@ -10,13 +10,19 @@
 #   Run a specific step: 
 #       ./run_pipeline.sh --step "Embed Jobs" (see all steps in app/scripts/run_pipeline.py)
 #
+#   Force steps to run even if their inputs are unchanged:
+#       ./run_pipeline.sh --force
+#
 #   Show help:
 #       ./run_pipeline.sh --help
 #
 # NOTES:
 # - Make sure your virtual environment is activated before running
 # - Ensure all environmental variables are set (see README for details)
-# - Script will stop if any step fails
+# - Steps whose inputs are unchanged since their last successful run are skipped
+# - Independent steps (e.g. SBERT and TF-IDF job embedding) run in parallel
+# - A JSON run report with per-step timings is written to artifacts/pipeline_runs/
+# - Steps that depend on a failed step are not run
 
 # Exit immediately if a command exits with a non-zero status set -e
 set -e
@@ -29,6 +35,7 @@ show_help() {
     echo "Usage:" 
     echo " ./run_pipeline.sh Run full pipeline" 
     echo " ./run_pipeline.sh --step \"NAME\" Run a specific step" 
+    echo " ./run_pipeline.sh --force Run steps even if inputs are unchanged" 
     echo " ./run_pipeline.sh --help Show this help message" 
     echo "" 
     echo "Example:" 
@@ -38,6 +45,7 @@ show_help() {
 
 # Parse arguments
 STEP="" 
+FORCE=""
 
 while [[ "$#" -gt 0 ]]; do 
     case $1 in 
@@ -45,6 +53,10 @@ while [[ "$#" -gt 0 ]]; do
             STEP="$2" 
             shift 2 
             ;; 
+        --force) 
+            FORCE="--force" 
+            shift 
+            ;; 
         --help) 
             show_help 
             exit 0 
@@ -62,10 +74,10 @@ echo "Starting pipeline..."
 
 if [ -z "$STEP" ]; then
     echo "Running full pipeline..."
-    python -m backend.pipelines.run_pipeline
+    python -m backend.pipelines.run_pipeline $FORCE
 else
     echo "Running step: $STEP"
-    python -m backend.pipelines.run_pipeline --step "$STEP"
+    python -m backend.pipelines.run_pipeline --step "$STEP" $FORCE
 fi
 
 echo "Pipeline execution complete."
\ No newline at end of file
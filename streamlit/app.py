@@ -2,15 +2,19 @@ import os
 import streamlit as st
 import requests
 import sys
-from pathlib import Path
 from dotenv import load_dotenv
 
 load_dotenv()
 
-ROOT = Path(__file__).resolve().parents[1]
-sys.path.insert(0, str(ROOT))
-
-from backend.app.services.file_reader import parse_with_llama
+from backend_client import (
+    parse_resume,
+    hybrid_match,
+    downstream_match,
+    start_request,
+    pending_request,
+    pop_result,
+    render_request_progress
+)
 from ui.styles import load_styles
 from ui.components import (
     render_page_header,
@@ -43,6 +47,9 @@ render_page_header()
 if "resume_text" not in st.session_state:
     st.session_state.resume_text = None
 
+if "resume_hash" not in st.session_state:
+    st.session_state.resume_hash = None
+
 if "uploaded_file_id" not in st.session_state:       
     st.session_state.uploaded_file_id = None
 
@@ -81,16 +88,34 @@ if uploaded_file:
     file_id = (uploaded_file.name, uploaded_file.size)
 
     if file_id != st.session_state.uploaded_file_id:
+        # Record the attempt even if it fails, so a bad file isn't re-posted on every rerun;
+        # removing and re-adding the file retries it
+        st.session_state.uploaded_file_id = file_id
 
         with st.spinner("Parsing resume..."):
-            st.session_state.resume_text = parse_with_llama(uploaded_file)
-            st.session_state.uploaded_file_id = file_id # Update the uploaded file ID to prevent re-parsing on reruns
+            try:
+                parsed = parse_resume(st.session_state.BACKEND_URL, uploaded_file)
+                st.session_state.resume_text = parsed["resume_text"]
+                st.session_state.resume_hash = parsed["resume_hash"]
+
+            except requests.exceptions.RequestException as e:
+                # Don't keep matching against the previously uploaded resume
+                st.session_state.resume_text = None
+                st.session_state.resume_hash = None
+                if isinstance(e, requests.exceptions.HTTPError):
+                    st.error("Something went wrong while parsing your resume. Please try another file.")
+                    print(f"Error details: {e.response.text}")
+                else:
+                    st.error("Could not connect to the server. Please try again later.")
+                    print("Connection error:", sys.exc_info())
 
         # Reset downstream state on new upload
         st.session_state.analysis_done = False
         st.session_state.downstream_done = False
         st.session_state.hybrid_data = None
         st.session_state.posting_data = None
+else:
+    st.session_state.uploaded_file_id = None
 
 if st.session_state.resume_text:
     # ── View my parsed resume button ────────────────────────────────────────────────────────────
@@ -110,30 +135,33 @@ if st.session_state.resume_text:
         ]
     )
 
-    if st.button("Analyze my resume"):
+    if st.button("Analyze my resume", disabled=pending_request("hybrid_request")):
         if not uploaded_file:
             st.error("Please upload your resume first.")
         else:
-            with st.spinner("Analyzing your resume…"):
-                try:
-                    response = requests.post(
-                        f"{st.session_state.BACKEND_URL}/api/hybrid-match-resume/",
-                        json={
-                            "resume_text": st.session_state.resume_text,
-                            "llm_model": st.session_state.llm_model
-                        },
-                        timeout=120
-                    )
-                    response.raise_for_status()
-                    st.session_state.hybrid_data = response.json()
-                    st.session_state.analysis_done = True
-
-                except requests.exceptions.HTTPError:
-                    st.error("Something went wrong while analyzing your resume. Please try again.")
-                    print(f"Error details: {response.text}")
-                except requests.exceptions.RequestException:
-                    st.error("Could not connect to the server. Please try again later.")
-                    print("Connection error:", sys.exc_info())
+            # Runs in the background (and is served from cache for a repeated resume + model)
+            start_request(
+                "hybrid_request",
+                hybrid_match,
+                st.session_state.BACKEND_URL,
+                st.session_state.resume_hash,
+                st.session_state.llm_model
+            )
+
+    try:
+        result = pop_result("hybrid_request")
+        if result is not None:
+            st.session_state.hybrid_data = result
+            st.session_state.analysis_done = True
+    except requests.exceptions.HTTPError as e:
+        st.error("Something went wrong while analyzing your resume. Please try again.")
+        print(f"Error details: {e.response.text}")
+    except requests.exceptions.RequestException:
+        st.error("Could not connect to the server. Please try again later.")
+        print("Connection error:", sys.exc_info())
+
+    if pending_request("hybrid_request"):
+        render_request_progress("hybrid_request", "Analyzing your resume…", expected_seconds=30)
 
 # ── Render main results ───────────────────────────────────────────────────────
 
@@ -162,28 +190,31 @@ if st.session_state.analysis_done and st.session_state.hybrid_data:
 
         if st.button(
             "Continue analysis with job postings",
+            disabled=pending_request("downstream_request"),
         ):
-            with st.spinner("Analyzing job postings…"):
-                try:
-                    response = requests.post(
-                        f"{st.session_state.BACKEND_URL}/api/downstream-match-resume/",
-                        json={
-                            "resume_text": st.session_state.resume_text,
-                            "hybrid_matches": hybrid_matches,
-                            "llm_model": st.session_state.llm_model
-                        },
-                        timeout=480
-                    )
-                    response.raise_for_status()
-                    st.session_state.posting_data = response.json()
-                    st.session_state.downstream_done = True
-
-                except requests.exceptions.HTTPError:
-                    st.error("Something went wrong while analyzing your resume. Please try again.")
-                    print(f"Error details: {response.text}")
-                except requests.exceptions.RequestException:
-                    st.error("Could not connect to the server. Please try again later.")
-                    print("Connection error:", sys.exc_info())
+            start_request(
+                "downstream_request",
+                downstream_match,
+                st.session_state.BACKEND_URL,
+                st.session_state.resume_hash,
+                hybrid_matches,
+                st.session_state.llm_model
+            )
+
+        try:
+            result = pop_result("downstream_request")
+            if result is not None:
+                st.session_state.posting_data = result
+                st.session_state.downstream_done = True
+        except requests.exceptions.HTTPError as e:
+            st.error("Something went wrong while analyzing your resume. Please try again.")
+            print(f"Error details: {e.response.text}")
+        except requests.exceptions.RequestException:
+            st.error("Could not connect to the server. Please try again later.")
+            print("Connection error:", sys.exc_info())
+
+        if pending_request("downstream_request"):
+            render_request_progress("downstream_request", "Analyzing job postings…", expected_seconds=90)
 
         # ── Show downstream results if available ────────────────────────────
 
@@ -0,0 +1,81 @@
+"""
+HTTP client for the backend API: one keep-alive session shared by every Streamlit
+session, cached analysis responses, and background requests the UI polls for progress.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Identical (resume, model) analyses are served from the cache for this long
+ANALYSIS_CACHE_TTL = 60 * 60
+
+@st.cache_resource
+def get_http_session() -> requests.Session:
+    """Shared across sessions and reruns, so TCP/TLS connections to the backend are reused"""
+    session = requests.Session()
+    # Retry only failed connects: the analysis calls are too expensive to repeat blindly
+    adapter = HTTPAdapter(pool_maxsize=32, max_retries=Retry(total=2, connect=2, read=0, status=0, other=0, backoff_factor=0.5))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip"
+    return session
+
+@st.cache_resource
+def get_request_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="backend-request")
+
+def post(backend_url: str, path: str, timeout: float, **kwargs) -> dict:
+    response = get_http_session().post(f"{backend_url}{path}", timeout=timeout, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+def parse_resume(backend_url: str, file) -> dict:
+    """Upload a resume (Streamlit UploadedFile); returns {resume_hash, resume_text}"""
+    return post(backend_url, "/api/resumes/parse", 300, files={"file": (file.name, file.getvalue(), file.type)})
+
+@st.cache_data(ttl=ANALYSIS_CACHE_TTL, show_spinner=False)
+def hybrid_match(backend_url: str, resume_hash: str, llm_model: str) -> dict:
+    return post(backend_url, "/api/hybrid-match-resume/", 120, json={
+        "resume_hash": resume_hash,
+        "llm_model": llm_model
+    })
+
+@st.cache_data(ttl=ANALYSIS_CACHE_TTL, show_spinner=False)
+def downstream_match(backend_url: str, resume_hash: str, hybrid_matches: list, llm_model: str) -> dict:
+    return post(backend_url, "/api/downstream-match-resume/", 480, json={
+        "resume_hash": resume_hash,
+        "hybrid_matches": hybrid_matches,
+        "llm_model": llm_model
+    })
+
+def start_request(key: str, fn, *args):
+    """Run fn(*args) in the background. The future is kept in session state, so it survives reruns."""
+    st.session_state[key] = {"future": get_request_executor().submit(fn, *args), "started": time.monotonic()}
+
+def pending_request(key: str) -> bool:
+    return key in st.session_state and not st.session_state[key]["future"].done()
+
+def pop_result(key: str):
+    """Result of a finished background request (re-raising its exception), or None if there is none"""
+    request = st.session_state.get(key)
+    if request is None or not request["future"].done():
+        return None
+    del st.session_state[key]
+    return request["future"].result()
+
+@st.fragment(run_every=0.5)
+def render_request_progress(key: str, label: str, expected_seconds: float):
+    """Progress bar that reruns on its own every 0.5s, then reruns the app once the request is done"""
+    request = st.session_state.get(key)
+    if request is None:
+        return
+    if request["future"].done():
+        st.rerun()
+    elapsed = time.monotonic() - request["started"]
+    # The backend gives no progress, so approach (but never reach) 100% over the expected time
+    st.progress(min(elapsed / expected_seconds, 0.95), text=f"{label} ({elapsed:.0f}s)")